@@ -2,23 +2,16 @@
 # -*- coding:utf-8 -*-
 import time
 import math
+import ustruct as struct
+from array import array
 from usr.libs.i2c import I2CIOWrapper
+from usr.libs.common import Storage
 
-Gyro  = [0,0,0]
-Accel = [0,0,0]
-Mag   = [0,0,0]
 pitch = 0.0
 roll  = 0.0
 yaw   = 0.0
-pu8data=[0,0,0,0,0,0,0,0]
-U8tempX=[0,0,0,0,0,0,0,0,0]
-U8tempY=[0,0,0,0,0,0,0,0,0]
-U8tempZ=[0,0,0,0,0,0,0,0,0]
-GyroOffset=[0,0,0]
 Ki = 1.0
 Kp = 4.50
-q0 = 1.0
-q1=q2=q3=0.0
 angles=[0.0,0.0,0.0]
 true                                 =0x01
 false                                =0x00
@@ -42,8 +35,15 @@ REG_ADD_PWR_MIGMT_1                  = 0x06
 REG_VAL_ALL_RGE_RESET                = 0x80
 REG_VAL_RUN_MODE                     = 0x01 # Non low-power mode
 REG_ADD_LP_CONFIG                    = 0x05
+REG_VAL_BIT_ACCEL_CYCLE              = 0x20
 REG_ADD_PWR_MGMT_1                   = 0x06
+REG_VAL_BIT_LP_EN                    = 0x20
 REG_ADD_PWR_MGMT_2                   = 0x07
+REG_VAL_DISABLE_GYRO                 = 0x07  # bit[2:0]
+REG_ADD_INT_ENABLE                   = 0x10
+REG_VAL_BIT_WOM_INT_EN               = 0x08
+REG_ADD_INT_STATUS                   = 0x19
+REG_VAL_BIT_WOM_INT                  = 0x08
 REG_ADD_ACCEL_XOUT_H                 = 0x2D
 REG_ADD_ACCEL_XOUT_L                 = 0x2E
 REG_ADD_ACCEL_YOUT_H                 = 0x2F
@@ -56,7 +56,23 @@ REG_ADD_GYRO_YOUT_H                  = 0x35
 REG_ADD_GYRO_YOUT_L                  = 0x36
 REG_ADD_GYRO_ZOUT_H                  = 0x37
 REG_ADD_GYRO_ZOUT_L                  = 0x38
+REG_ADD_TEMP_OUT_H                   = 0x39
+REG_ADD_TEMP_OUT_L                   = 0x3A
 REG_ADD_EXT_SENS_DATA_00             = 0x3B
+REG_ADD_FIFO_EN_1                    = 0x66
+REG_ADD_FIFO_EN_2                    = 0x67
+REG_VAL_BIT_ACCEL_FIFO_EN            = 0x10
+REG_VAL_BIT_GYRO_Z_FIFO_EN           = 0x08
+REG_VAL_BIT_GYRO_Y_FIFO_EN           = 0x04
+REG_VAL_BIT_GYRO_X_FIFO_EN           = 0x02
+REG_VAL_BIT_TEMP_FIFO_EN             = 0x01
+REG_ADD_FIFO_RST                     = 0x68
+REG_VAL_FIFO_RST_ALL                 = 0x1F
+REG_ADD_FIFO_MODE                    = 0x69
+REG_VAL_FIFO_MODE_STREAM             = 0x00
+REG_ADD_FIFO_COUNTH                  = 0x70
+REG_ADD_FIFO_COUNTL                  = 0x71
+REG_ADD_FIFO_R_W                     = 0x72
 REG_ADD_REG_BANK_SEL                 = 0x7F
 REG_VAL_REG_BANK_0                   = 0x00
 REG_VAL_REG_BANK_1                   = 0x10
@@ -75,7 +91,12 @@ REG_VAL_BIT_GYRO_FS_500DPS           = 0x02  # bit[2:1]
 REG_VAL_BIT_GYRO_FS_1000DPS          = 0x04  # bit[2:1]
 REG_VAL_BIT_GYRO_FS_2000DPS          = 0x06  # bit[2:1]
 REG_VAL_BIT_GYRO_DLPF                = 0x01  # bit[0]
+REG_ADD_ACCEL_SMPLRT_DIV_1           = 0x10
 REG_ADD_ACCEL_SMPLRT_DIV_2           = 0x11
+REG_ADD_ACCEL_INTEL_CTRL             = 0x12
+REG_VAL_BIT_ACCEL_INTEL_EN           = 0x02
+REG_VAL_BIT_ACCEL_INTEL_MODE_INT     = 0x01  # compare each sample with the previous one
+REG_ADD_ACCEL_WOM_THR                = 0x13  # 4mg/LSB, 0-1020mg
 REG_ADD_ACCEL_CONFIG                 = 0x14
 REG_VAL_BIT_ACCEL_DLPCFG_2           = 0x10  # bit[5:3]
 REG_VAL_BIT_ACCEL_DLPCFG_4           = 0x20  # bit[5:3]
@@ -87,6 +108,9 @@ REG_VAL_BIT_ACCEL_FS_16g             = 0x06  # bit[2:1]
 REG_VAL_BIT_ACCEL_DLPF               = 0x01  # bit[0]
 
 # user bank 3 register
+REG_ADD_I2C_MST_ODR_CONFIG           = 0x00
+REG_ADD_I2C_MST_CTRL                 = 0x01
+REG_VAL_I2C_MST_CLK_345KHZ           = 0x07  # bit[3:0], recommended clock
 REG_ADD_I2C_SLV0_ADDR                = 0x03
 REG_ADD_I2C_SLV0_REG                 = 0x04
 REG_ADD_I2C_SLV0_CTRL                = 0x05
@@ -106,6 +130,9 @@ REG_VAL_MAG_WIA1                     = 0x48
 REG_ADD_MAG_WIA2                     = 0x01
 REG_VAL_MAG_WIA2                     = 0x09
 REG_ADD_MAG_ST2                      = 0x10
+REG_ADD_MAG_ST1                      = 0x10  # ST1, HXL..HZH, TMPS, ST2 follow
+REG_VAL_MAG_ST1_DRDY                 = 0x01
+REG_VAL_MAG_ST2_HOFL                 = 0x08
 REG_ADD_MAG_DATA                     = 0x11
 REG_ADD_MAG_CNTL2                    = 0x31
 REG_VAL_MAG_MODE_PD                  = 0x00
@@ -118,35 +145,226 @@ REG_VAL_MAG_MODE_ST                  = 0x10
 # define ICM-20948 MAG Register  end
 
 MAG_DATA_LEN                         =6
+MAG_AUTO_READ_LEN                    = 9  # ST1 + 6 data + TMPS + ST2, reading ST2 releases the data lock
+
+# ACCEL_XOUT_H..GYRO_ZOUT_L, TEMP_OUT_H/L, then EXT_SENS_DATA_00.. in one burst
+NINE_AXIS_READ_LEN                   = 12 + 2 + MAG_AUTO_READ_LEN
+NINE_AXIS_MAG_OFFSET                 = 12 + 2
+
+# FIFO frame with accel and gyro enabled: ACCEL_X/Y/Z, GYRO_X/Y/Z, big endian int16
+FIFO_FRAME_LEN                       = 12
+FIFO_COUNT_MASK                      = 0x1FFF
+FIFO_READ_CHUNK                      = 20 * FIFO_FRAME_LEN  # bytes per I2C read
+GYRO_RAW_TO_RADS                     = math.pi / 180 / 32.8  # ±1000dps: 32.8 LSB/dps
+RAD_TO_DEG                           = 180 / math.pi
+GYRO_RATE_BASE_HZ                    = 1100.0  # ODR = base / (1 + SMPLRT_DIV)
+ACCEL_RATE_BASE_HZ                   = 1125.0
+ACCEL_LSB_PER_G                      = 16384  # ±2g
+TEMP_SENSITIVITY                     = 333.87  # LSB/°C, 21 °C offset
+RESET_TIMEOUT_MS                     = 100
+
+# Stillness detection for background gyro bias refinement (raw LSB, ±1000dps / ±2g)
+STILL_GYRO_LIMIT                     = 16    # ~0.5 dps after bias removal
+STILL_ACCEL_TOLERANCE                = 820   # ~5% of 1g
+STILL_SAMPLES                        = 256
+CALIBRATION_SAVE_LSB                 = 3     # refined gyro bias is only worth a flash write beyond this
+RTC_VALID_YEAR                       = 2020  # earlier RTC dates mean network time has not arrived yet
+
+
+def _rtc_time(t=None):
+  """``t`` (default now) if the RTC was set when it was taken, None before network time"""
+  if t is None:
+    t = time.time()
+  return t if time.localtime(t)[0] >= RTC_VALID_YEAR else None
+
+class ImuCalibration(object):
+  """ICM20948 calibration record persisted through Storage.
+
+  A record is only used when it was taken within ``max_temp_delta`` °C of the current die
+  temperature and is younger than ``max_age`` seconds. The age is only checked when both the
+  record and the current RTC time are valid, at cold boot the clock is often unsynced.
+  """
+
+  def __init__(self, path='/usr/icm20948_calibration.json', max_age=7 * 24 * 3600, max_temp_delta=10.0):
+    self.storage = Storage()
+    self.storage.init(path)
+    self.max_age = max_age
+    self.max_temp_delta = max_temp_delta
+
+  def load(self, temperature):
+    """Return the stored record if still valid at ``temperature``, else None"""
+    with self.storage:
+      record = self.storage.get('icm20948')
+    if not record:
+      return None
+    saved = _rtc_time(record['time']) if record.get('time') else None
+    now = _rtc_time()
+    if saved is not None and now is not None:
+      age = now - saved
+      if age < 0 or age > self.max_age:
+        return None
+    if abs(temperature - record.get('temp', -273)) > self.max_temp_delta:
+      return None
+    return record
+
+  def last(self):
+    """Stored record regardless of validity, accel/mag terms age far slower than gyro bias"""
+    with self.storage:
+      return self.storage.get('icm20948')
+
+  def save(self, record):
+    with self.storage:
+      self.storage['icm20948'] = record
+      self.storage.save()
+
 
 class ICM20948(I2CIOWrapper):
-  def __init__(self, i2c, address=I2C_ADD_ICM20948):
+  def __init__(self, i2c, address=I2C_ADD_ICM20948, calibration=None):
+    """``calibration`` (ImuCalibration) enables fast init: reset completion is polled instead
+    of fixed waits, and gyro calibration is skipped when a valid stored record exists."""
     super().__init__(i2c, address)
+    self.Accel = array('h', [0, 0, 0])
+    self.Gyro = array('h', [0, 0, 0])
+    self.Mag = [0, 0, 0]
+    self.GyroOffset = [0, 0, 0]
+    self.AccelOffset = [0, 0, 0]
+    self.AccelScale = [1.0, 1.0, 1.0]
+    self.MagOffset = [0, 0, 0]
+    self.MagScale = [1.0, 1.0, 1.0]
+    self.calibration = calibration
+    self.calibration_dirty = False
+    self._saved_gyro_offset = [0, 0, 0]
+    self._still_sum = [0, 0, 0]
+    self._still_count = 0
+    self.pu8data = bytearray(8)
+    self.U8tempX = [0] * 8
+    self.U8tempY = [0] * 8
+    self.U8tempZ = [0] * 8
+    self.fifo_enabled = False
+    self.mag_auto_read = False
+    self.wake_on_motion = False
+    self.sample_rate_hz = GYRO_RATE_BASE_HZ / 8  # SMPLRT_DIV 0x07 set below
+    self._bank = None  # unknown until first select
+    self.ahrs = AHRS()
     
     bRet=self.icm20948Check()             #Initialization of the device multiple times after power on will result in a return error
     # while true != bRet:
     #   print("ICM-20948 Error\n" )
     #   time.sleep(0.5)
     # print("ICM-20948 OK\n" )
-    time.sleep(0.5)                       #We can skip this detection by delaying it by 500 milliseconds
+    if calibration is None:
+      time.sleep(0.5)                     #We can skip this detection by delaying it by 500 milliseconds
     # user bank 0 register 
-    self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_0)
+    self._select_bank(REG_VAL_REG_BANK_0)
     self._write_byte( REG_ADD_PWR_MIGMT_1 , REG_VAL_ALL_RGE_RESET)
-    time.sleep(0.1)
+    if calibration is None:
+      time.sleep(0.1)
+    else:
+      self._wait_reset()
+    self._bank = REG_VAL_REG_BANK_0  # device reset selects bank 0
     self._write_byte( REG_ADD_PWR_MIGMT_1 , REG_VAL_RUN_MODE)  
     #user bank 2 register
-    self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_2)
+    self._select_bank(REG_VAL_REG_BANK_2)
     self._write_byte( REG_ADD_GYRO_SMPLRT_DIV , 0x07)
     self._write_byte( REG_ADD_GYRO_CONFIG_1 , REG_VAL_BIT_GYRO_DLPCFG_6 | REG_VAL_BIT_GYRO_FS_1000DPS | REG_VAL_BIT_GYRO_DLPF)
     self._write_byte( REG_ADD_ACCEL_SMPLRT_DIV_2 ,  0x07)
     self._write_byte( REG_ADD_ACCEL_CONFIG , REG_VAL_BIT_ACCEL_DLPCFG_6 | REG_VAL_BIT_ACCEL_FS_2g | REG_VAL_BIT_ACCEL_DLPF)
     #user bank 0 register
-    self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_0) 
+    self._select_bank(REG_VAL_REG_BANK_0)
+    if calibration is None:
+      time.sleep(0.1)
+      self.icm20948GyroOffset()
+    else:
+      self._load_or_calibrate()
+    self.icm20948MagCheck()
+    self.startMagAutoRead(REG_VAL_MAG_MODE_20HZ)
+
+
+  def _wait_reset(self):
+    """Poll PWR_MGMT_1.DEVICE_RESET until it self-clears instead of sleeping a fixed 100ms"""
+    start = time.ticks_ms()
+    while time.ticks_diff(time.ticks_ms(), start) < RESET_TIMEOUT_MS:
+      time.sleep_ms(1)
+      try:
+        if not self._read_byte(REG_ADD_PWR_MIGMT_1) & REG_VAL_ALL_RGE_RESET:
+          return
+      except self.I2CReadError:
+        pass  # device NACKs while resetting
+
+  def readTemperature(self):
+    self._select_bank(REG_VAL_REG_BANK_0)
+    raw = struct.unpack_from('>h', self._read_block(REG_ADD_TEMP_OUT_H, 2))[0]
+    return raw / TEMP_SENSITIVITY + 21.0
+
+  def getCalibration(self):
+    return {
+      'gyro_offset': list(self.GyroOffset),
+      'accel_offset': list(self.AccelOffset),
+      'accel_scale': list(self.AccelScale),
+      'mag_offset': list(self.MagOffset),
+      'mag_scale': list(self.MagScale),
+      'temp': self.readTemperature(),
+      'time': _rtc_time(),
+    }
+
+  def applyCalibration(self, record, gyro=True):
+    if gyro:
+      self.GyroOffset[:] = record['gyro_offset']
+      self._saved_gyro_offset[:] = self.GyroOffset
+    self.AccelOffset[:] = record.get('accel_offset', self.AccelOffset)
+    self.AccelScale[:] = record.get('accel_scale', self.AccelScale)
+    self.MagOffset[:] = record.get('mag_offset', self.MagOffset)
+    self.MagScale[:] = record.get('mag_scale', self.MagScale)
+
+  def saveCalibration(self):
+    if self.calibration is not None:
+      self.calibration.save(self.getCalibration())
+    self._saved_gyro_offset[:] = self.GyroOffset
+    self.calibration_dirty = False
+
+  def _load_or_calibrate(self):
+    record = self.calibration.load(self.readTemperature())
+    if record is not None:
+      self.applyCalibration(record)
+      return
+    last = self.calibration.last()
+    if last:
+      self.applyCalibration(last, gyro=False)
     time.sleep(0.1)
     self.icm20948GyroOffset()
-    self.icm20948MagCheck()
-    self.icm20948WriteSecondary( I2C_ADD_ICM20948_AK09916|I2C_ADD_ICM20948_AK09916_WRITE,REG_ADD_MAG_CNTL2, REG_VAL_MAG_MODE_20HZ)
+    self.saveCalibration()
+
+  def refineCalibration(self, accel, gyro):
+    """Background gyro bias refinement, feed bias-corrected raw samples.
 
+    Averages the residual gyro output over STILL_SAMPLES consecutive still samples and folds
+    it into GyroOffset; sets ``calibration_dirty`` once the bias moved more than
+    CALIBRATION_SAVE_LSB from the persisted one, the caller decides when to saveCalibration().
+    """
+    gx, gy, gz = gyro[0], gyro[1], gyro[2]
+    ax, ay, az = accel[0], accel[1], accel[2]
+    # |a|^2 within ~±10% of 1g^2 is |a| within ~±5% of 1g
+    norm2 = ax * ax + ay * ay + az * az
+    if abs(gx) > STILL_GYRO_LIMIT or abs(gy) > STILL_GYRO_LIMIT or abs(gz) > STILL_GYRO_LIMIT \
+        or abs(norm2 - ACCEL_LSB_PER_G * ACCEL_LSB_PER_G) > 2 * STILL_ACCEL_TOLERANCE * ACCEL_LSB_PER_G:
+      self._still_count = 0
+      self._still_sum[0] = self._still_sum[1] = self._still_sum[2] = 0
+      return False
+    still_sum = self._still_sum
+    still_sum[0] += gx
+    still_sum[1] += gy
+    still_sum[2] += gz
+    self._still_count += 1
+    if self._still_count < STILL_SAMPLES:
+      return False
+    n = self._still_count
+    for i in range(3):
+      self.GyroOffset[i] += int(round(still_sum[i] / n))
+      still_sum[i] = 0
+      if abs(self.GyroOffset[i] - self._saved_gyro_offset[i]) > CALIBRATION_SAVE_LSB:
+        self.calibration_dirty = True
+    self._still_count = 0
+    return True
 
   def _convert_twos_complement(self, value):
       """处理16位有符号数转换"""
@@ -157,40 +375,220 @@ class ICM20948(I2CIOWrapper):
           value += 65536
       return value
   
-  def icm20948_Gyro_Accel_Read(self):
-    
-    self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_0)
+  @staticmethod
+  def _clamp16(value):
+    if value > 32767:
+      return 32767
+    if value < -32768:
+      return -32768
+    return value
+
+  def _unpack_frames(self, data, count, accel, gyro, offset=0):
+    """Decode ``count`` 12-byte accel+gyro frames into array('h') buffers starting at sample ``offset``"""
+    unpack_from = struct.unpack_from
+    clamp = self._clamp16
+    gox, goy, goz = self.GyroOffset
+    j = offset * 3
+    for i in range(0, count * FIFO_FRAME_LEN, FIFO_FRAME_LEN):
+      ax, ay, az, gx, gy, gz = unpack_from('>6h', data, i)
+      accel[j] = ax
+      accel[j + 1] = ay
+      accel[j + 2] = az
+      # 陀螺仪数据处理（减去偏移量）
+      gyro[j] = clamp(gx - gox)
+      gyro[j + 1] = clamp(gy - goy)
+      gyro[j + 2] = clamp(gz - goz)
+      j += 3
+
+  def icm20948_Gyro_Accel_Read(self, accel=None, gyro=None):
+    """Read one accel/gyro snapshot into ``accel``/``gyro`` (array('h') of 3), default the instance buffers"""
+    if accel is None:
+      accel = self.Accel
+    if gyro is None:
+      gyro = self.Gyro
+    self._select_bank(REG_VAL_REG_BANK_0)
     data =self._read_block(REG_ADD_ACCEL_XOUT_H, 12)
-    self._write_byte( REG_ADD_REG_BANK_SEL , REG_VAL_REG_BANK_2)
-    # 加速度数据处理
-    Accel[0] = self._convert_twos_complement((data[0]<<8)|data[1])
-    Accel[1] = self._convert_twos_complement((data[2]<<8)|data[3])
-    Accel[2] = self._convert_twos_complement((data[4]<<8)|data[5])
-    
-    # 陀螺仪数据处理（减去偏移量）
-    Gyro[0] = self._convert_twos_complement((data[6]<<8)|data[7]) - GyroOffset[0]
-    Gyro[1] = self._convert_twos_complement((data[8]<<8)|data[9]) - GyroOffset[1]
-    Gyro[2] = self._convert_twos_complement((data[10]<<8)|data[11]) - GyroOffset[2]
+    self._unpack_frames(data, 1, accel, gyro)
+    return accel, gyro
+
+  def start_measurement(self):
+    """Accel and gyro sample continuously at the configured ODR, there is nothing to trigger
+    and nothing to wait for"""
+    return 0
+
+  def collect(self):
+    """Latest (accel, gyro) raw snapshot into the instance buffers"""
+    return self.icm20948_Gyro_Accel_Read()
+
+  def setSampleRate(self, rate_hz):
+    """Set accel and gyro ODR, the FIFO fills at this rate"""
+    gyro_div = max(0, min(255, int(GYRO_RATE_BASE_HZ / rate_hz + 0.5) - 1))
+    accel_div = max(0, min(4095, int(ACCEL_RATE_BASE_HZ / rate_hz + 0.5) - 1))
+    self._select_bank(REG_VAL_REG_BANK_2)
+    self._write_byte( REG_ADD_GYRO_SMPLRT_DIV , gyro_div)
+    self._write_byte( REG_ADD_ACCEL_SMPLRT_DIV_1 , accel_div >> 8)
+    self._write_byte( REG_ADD_ACCEL_SMPLRT_DIV_2 , accel_div & 0xFF)
+    self.sample_rate_hz = GYRO_RATE_BASE_HZ / (1 + gyro_div)
+    return self.sample_rate_hz
+
+  def enableWakeOnMotion(self, threshold_mg=100, rate_hz=17):
+    """Park the IMU: gyro off, accelerometer duty-cycled at ``rate_hz`` and raising WOM_INT when
+    any axis moves more than ``threshold_mg`` between samples. Poll motionDetected()."""
+    rate = self.sample_rate_hz
+    self._select_bank(REG_VAL_REG_BANK_0)
+    self._write_byte( REG_ADD_PWR_MGMT_2, REG_VAL_DISABLE_GYRO)
+    u8Temp = self._read_byte(REG_ADD_INT_ENABLE)
+    self._write_byte( REG_ADD_INT_ENABLE, u8Temp | REG_VAL_BIT_WOM_INT_EN)
+    accel_div = max(0, min(4095, int(ACCEL_RATE_BASE_HZ / rate_hz + 0.5) - 1))
+    self._select_bank(REG_VAL_REG_BANK_2)
+    self._write_byte( REG_ADD_ACCEL_SMPLRT_DIV_1 , accel_div >> 8)
+    self._write_byte( REG_ADD_ACCEL_SMPLRT_DIV_2 , accel_div & 0xFF)
+    self._write_byte( REG_ADD_ACCEL_WOM_THR, max(1, min(255, threshold_mg // 4)))
+    self._write_byte( REG_ADD_ACCEL_INTEL_CTRL, REG_VAL_BIT_ACCEL_INTEL_EN | REG_VAL_BIT_ACCEL_INTEL_MODE_INT)
+    self._select_bank(REG_VAL_REG_BANK_0)
+    self._write_byte( REG_ADD_LP_CONFIG, REG_VAL_BIT_ACCEL_CYCLE)
+    self._write_byte( REG_ADD_PWR_MIGMT_1, REG_VAL_RUN_MODE | REG_VAL_BIT_LP_EN)
+    self._read_byte(REG_ADD_INT_STATUS)  # drop a stale event
+    self.sample_rate_hz = rate
+    self.wake_on_motion = True
+
+  def disableWakeOnMotion(self):
+    """Back to full-rate accel+gyro at the previous sample rate"""
+    self._select_bank(REG_VAL_REG_BANK_0)
+    self._write_byte( REG_ADD_PWR_MIGMT_1, REG_VAL_RUN_MODE)
+    self._write_byte( REG_ADD_LP_CONFIG, 0x00)
+    self._write_byte( REG_ADD_PWR_MGMT_2, 0x00)
+    u8Temp = self._read_byte(REG_ADD_INT_ENABLE)
+    self._write_byte( REG_ADD_INT_ENABLE, u8Temp & ~REG_VAL_BIT_WOM_INT_EN)
+    self._select_bank(REG_VAL_REG_BANK_2)
+    self._write_byte( REG_ADD_ACCEL_INTEL_CTRL, 0x00)
+    self.setSampleRate(self.sample_rate_hz)
+    self.wake_on_motion = False
+
+  def motionDetected(self):
+    """Read INT_STATUS (clears it), True when a wake-on-motion event happened"""
+    self._select_bank(REG_VAL_REG_BANK_0)
+    return bool(self._read_byte(REG_ADD_INT_STATUS) & REG_VAL_BIT_WOM_INT)
+
+  def startFifo(self, rate_hz=100):
+    """Stream accel+gyro frames into the FIFO at ``rate_hz``, drain with readFifo()"""
+    self.setSampleRate(rate_hz)
+    self._select_bank(REG_VAL_REG_BANK_0)
+    self._write_byte( REG_ADD_FIFO_MODE , REG_VAL_FIFO_MODE_STREAM)
+    self._write_byte( REG_ADD_FIFO_EN_2 , REG_VAL_BIT_ACCEL_FIFO_EN | REG_VAL_BIT_GYRO_Z_FIFO_EN | REG_VAL_BIT_GYRO_Y_FIFO_EN | REG_VAL_BIT_GYRO_X_FIFO_EN)
+    self._write_byte( REG_ADD_FIFO_RST , REG_VAL_FIFO_RST_ALL)
+    self._write_byte( REG_ADD_FIFO_RST , 0x00)
+    u8Temp = self._read_byte(REG_ADD_USER_CTRL)
+    self._write_byte( REG_ADD_USER_CTRL, u8Temp | REG_VAL_BIT_FIFO_EN)
+    self.fifo_enabled = True
+
+  def stopFifo(self):
+    self._select_bank(REG_VAL_REG_BANK_0)
+    u8Temp = self._read_byte(REG_ADD_USER_CTRL)
+    self._write_byte( REG_ADD_USER_CTRL, u8Temp & ~REG_VAL_BIT_FIFO_EN)
+    self._write_byte( REG_ADD_FIFO_EN_2 , 0x00)
+    self._write_byte( REG_ADD_FIFO_RST , REG_VAL_FIFO_RST_ALL)
+    self._write_byte( REG_ADD_FIFO_RST , 0x00)
+    self.fifo_enabled = False
+
+  def getFifoCount(self):
+    """Bytes currently in the FIFO"""
+    self._select_bank(REG_VAL_REG_BANK_0)
+    data = self._read_block(REG_ADD_FIFO_COUNTH, 2)
+    return ((data[0] << 8) | data[1]) & FIFO_COUNT_MASK
+
+  def readFifo(self, accel, gyro, offset=0):
+    """Drain whole frames from the FIFO into ``accel``/``gyro`` (array('h'), 3 values per sample)
+    starting at sample ``offset``.
+
+    Reads as many samples as are pending and fit into the buffers, FIFO_READ_CHUNK
+    bytes per transaction. Returns the number of samples written.
+    """
+    count = min(self.getFifoCount() // FIFO_FRAME_LEN, len(accel) // 3 - offset, len(gyro) // 3 - offset)
+    frames_per_chunk = FIFO_READ_CHUNK // FIFO_FRAME_LEN
+    done = 0
+    while done < count:
+      n = min(frames_per_chunk, count - done)
+      data = self._read_block(REG_ADD_FIFO_R_W, n * FIFO_FRAME_LEN)
+      self._unpack_frames(data, n, accel, gyro, offset + done)
+      done += n
+    return max(count, 0)
+
+  def startMagAutoRead(self, mode=REG_VAL_MAG_MODE_100HZ):
+    """Put the AK09916 in continuous ``mode`` and leave SLV0 copying ST1..ST2 into
+    EXT_SENS_DATA every sample, so magnetometer data comes with the accel/gyro burst"""
+    self.icm20948WriteSecondary( I2C_ADD_ICM20948_AK09916|I2C_ADD_ICM20948_AK09916_WRITE,REG_ADD_MAG_CNTL2, mode)
+    self._select_bank(REG_VAL_REG_BANK_3)
+    self._write_byte( REG_ADD_I2C_SLV1_CTRL, 0x00)  # one-off CNTL2 write done, stop repeating it
+    self._write_byte( REG_ADD_I2C_MST_CTRL, REG_VAL_I2C_MST_CLK_345KHZ)
+    self._write_byte( REG_ADD_I2C_SLV0_ADDR, I2C_ADD_ICM20948_AK09916|I2C_ADD_ICM20948_AK09916_READ)
+    self._write_byte( REG_ADD_I2C_SLV0_REG, REG_ADD_MAG_ST1)
+    self._write_byte( REG_ADD_I2C_SLV0_CTRL, REG_VAL_BIT_SLV0_EN|MAG_AUTO_READ_LEN)
+    self._select_bank(REG_VAL_REG_BANK_0)
+    u8Temp = self._read_byte(REG_ADD_USER_CTRL)
+    self._write_byte( REG_ADD_USER_CTRL, u8Temp | REG_VAL_BIT_I2C_MST_EN)
+    self.mag_auto_read = True
+
+  def stopMagAutoRead(self):
+    self._select_bank(REG_VAL_REG_BANK_0)
+    u8Temp = self._read_byte(REG_ADD_USER_CTRL)
+    self._write_byte( REG_ADD_USER_CTRL, u8Temp & ~REG_VAL_BIT_I2C_MST_EN)
+    self._select_bank(REG_VAL_REG_BANK_3)
+    self._write_byte( REG_ADD_I2C_SLV0_CTRL, 0x00)
+    self.mag_auto_read = False
+
+  def _unpack_mag(self, data, offset, mag):
+    """Decode an auto-read ST1..ST2 block, keep the previous value when not ready or overflowed"""
+    if not data[offset] & REG_VAL_MAG_ST1_DRDY or data[offset + MAG_AUTO_READ_LEN - 1] & REG_VAL_MAG_ST2_HOFL:
+      return False
+    mx, my, mz = struct.unpack_from('<3h', data, offset + 1)
+    off = self.MagOffset
+    scale = self.MagScale
+    clamp = self._clamp16
+    # align to the accel/gyro axes, same as icm20948MagRead, then hard/soft-iron correction
+    mag[0] = clamp(int((mx - off[0]) * scale[0]))
+    mag[1] = clamp(int((-my - off[1]) * scale[1]))
+    mag[2] = clamp(int((-mz - off[2]) * scale[2]))
+    return True
 
-    return Accel,Gyro
+  def read9Axis(self, accel=None, gyro=None, mag=None):
+    """Accel, gyro and magnetometer in one 23-byte transaction, needs startMagAutoRead()"""
+    if accel is None:
+      accel = self.Accel
+    if gyro is None:
+      gyro = self.Gyro
+    if mag is None:
+      mag = self.Mag
+    self._select_bank(REG_VAL_REG_BANK_0)
+    data = self._read_block(REG_ADD_ACCEL_XOUT_H, NINE_AXIS_READ_LEN)
+    self._unpack_frames(data, 1, accel, gyro)
+    self._unpack_mag(data, NINE_AXIS_MAG_OFFSET, mag)
+    return accel, gyro, mag
 
   def icm20948MagRead(self):
+    if self.mag_auto_read:
+      self._select_bank(REG_VAL_REG_BANK_0)
+      self._unpack_mag(self._read_block(REG_ADD_EXT_SENS_DATA_00, MAG_AUTO_READ_LEN), 0, self.Mag)
+      return
     counter=20
     while(counter>0):
       time.sleep(0.01)
       self.icm20948ReadSecondary( I2C_ADD_ICM20948_AK09916|I2C_ADD_ICM20948_AK09916_READ , REG_ADD_MAG_ST2, 1)
-      if ((pu8data[0] & 0x01)!= 0):
+      if ((self.pu8data[0] & 0x01)!= 0):
         break
       counter-=1
     if counter!=0:
       for i in range(0,8):
         self.icm20948ReadSecondary( I2C_ADD_ICM20948_AK09916|I2C_ADD_ICM20948_AK09916_READ , REG_ADD_MAG_DATA , MAG_DATA_LEN)
-        U8tempX[i] = (pu8data[1]<<8)|pu8data[0]
-        U8tempY[i] = (pu8data[3]<<8)|pu8data[2]
-        U8tempZ[i] = (pu8data[5]<<8)|pu8data[4]
-      Mag[0]=(U8tempX[0]+U8tempX[1]+U8tempX[2]+U8tempX[3]+U8tempX[4]+U8tempX[5]+U8tempX[6]+U8tempX[7])/8
-      Mag[1]=-(U8tempY[0]+U8tempY[1]+U8tempY[2]+U8tempY[3]+U8tempY[4]+U8tempY[5]+U8tempY[6]+U8tempY[7])/8
-      Mag[2]=-(U8tempZ[0]+U8tempZ[1]+U8tempZ[2]+U8tempZ[3]+U8tempZ[4]+U8tempZ[5]+U8tempZ[6]+U8tempZ[7])/8
+        pu8data = self.pu8data
+        self.U8tempX[i] = (pu8data[1]<<8)|pu8data[0]
+        self.U8tempY[i] = (pu8data[3]<<8)|pu8data[2]
+        self.U8tempZ[i] = (pu8data[5]<<8)|pu8data[4]
+      Mag = self.Mag
+      Mag[0]=sum(self.U8tempX)/8
+      Mag[1]=-sum(self.U8tempY)/8
+      Mag[2]=-sum(self.U8tempZ)/8
+    Mag = self.Mag
     if Mag[0]>=32767:            #Solve the problem that Python shift will not overflow
       Mag[0]=Mag[0]-65535
     elif Mag[0]<=-32767:
@@ -205,12 +603,12 @@ class ICM20948(I2CIOWrapper):
       Mag[2]=Mag[2]+65535
   def icm20948ReadSecondary(self,u8I2CAddr,u8RegAddr,u8Len):
     u8Temp=0
-    self._write_byte( REG_ADD_REG_BANK_SEL,  REG_VAL_REG_BANK_3) #swtich bank3
+    self._select_bank(REG_VAL_REG_BANK_3)  #swtich bank3
     self._write_byte( REG_ADD_I2C_SLV0_ADDR, u8I2CAddr)
     self._write_byte( REG_ADD_I2C_SLV0_REG,  u8RegAddr)
     self._write_byte( REG_ADD_I2C_SLV0_CTRL, REG_VAL_BIT_SLV0_EN|u8Len)
 
-    self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0) #swtich bank0
+    self._select_bank(REG_VAL_REG_BANK_0)  #swtich bank0
     
     u8Temp = self._read_byte(REG_ADD_USER_CTRL)
     u8Temp |= REG_VAL_BIT_I2C_MST_EN
@@ -219,26 +617,23 @@ class ICM20948(I2CIOWrapper):
     u8Temp &= ~REG_VAL_BIT_I2C_MST_EN
     self._write_byte( REG_ADD_USER_CTRL, u8Temp)
     
-    for i in range(0,u8Len):
-      pu8data[i]= self._read_byte( REG_ADD_EXT_SENS_DATA_00+i)
+    self.pu8data[0:u8Len] = self._read_block(REG_ADD_EXT_SENS_DATA_00, u8Len)
 
-    self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_3) #swtich bank3
+    self._select_bank(REG_VAL_REG_BANK_3)  #swtich bank3
     
     u8Temp = self._read_byte(REG_ADD_I2C_SLV0_CTRL)
     u8Temp &= ~((REG_VAL_BIT_I2C_MST_EN)&(REG_VAL_BIT_MASK_LEN))
     self._write_byte( REG_ADD_I2C_SLV0_CTRL,  u8Temp)
     
-    self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0) #swtich bank0
-    
   def icm20948WriteSecondary(self,u8I2CAddr,u8RegAddr,u8data):
     u8Temp=0
-    self._write_byte( REG_ADD_REG_BANK_SEL,  REG_VAL_REG_BANK_3) #swtich bank3
+    self._select_bank(REG_VAL_REG_BANK_3)  #swtich bank3
     self._write_byte( REG_ADD_I2C_SLV1_ADDR, u8I2CAddr)
     self._write_byte( REG_ADD_I2C_SLV1_REG,  u8RegAddr)
     self._write_byte( REG_ADD_I2C_SLV1_DO,   u8data)
     self._write_byte( REG_ADD_I2C_SLV1_CTRL, REG_VAL_BIT_SLV0_EN|1)
 
-    self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0) #swtich bank0
+    self._select_bank(REG_VAL_REG_BANK_0)  #swtich bank0
 
     u8Temp = self._read_byte(REG_ADD_USER_CTRL)
     u8Temp |= REG_VAL_BIT_I2C_MST_EN
@@ -247,23 +642,23 @@ class ICM20948(I2CIOWrapper):
     u8Temp &= ~REG_VAL_BIT_I2C_MST_EN
     self._write_byte( REG_ADD_USER_CTRL, u8Temp)
 
-    self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_3) #swtich bank3
+    self._select_bank(REG_VAL_REG_BANK_3)  #swtich bank3
 
     u8Temp = self._read_byte(REG_ADD_I2C_SLV0_CTRL)
     u8Temp &= ~((REG_VAL_BIT_I2C_MST_EN)&(REG_VAL_BIT_MASK_LEN))
     self._write_byte( REG_ADD_I2C_SLV0_CTRL,  u8Temp)
 
-    self._write_byte( REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0) #swtich bank0
-
   def icm20948GyroOffset(self):
     s32TempGx = 0
     s32TempGy = 0
     s32TempGz = 0
+    GyroOffset = self.GyroOffset
+    GyroOffset[0] = GyroOffset[1] = GyroOffset[2] = 0
     for i in range(0,32):
-      self.icm20948_Gyro_Accel_Read()
-      s32TempGx += Gyro[0]
-      s32TempGy += Gyro[1]
-      s32TempGz += Gyro[2]
+      accel, gyro = self.icm20948_Gyro_Accel_Read()
+      s32TempGx += gyro[0]
+      s32TempGy += gyro[1]
+      s32TempGz += gyro[2]
       time.sleep(0.01)
     GyroOffset[0] = s32TempGx >> 5
     GyroOffset[1] = s32TempGy >> 5
@@ -281,103 +676,334 @@ class ICM20948(I2CIOWrapper):
   
   def _write_byte(self,cmd,val):
     self.write(bytes([cmd]), bytes([val]))
-    time.sleep(0.0001)
-
-  def imuAHRSupdate(self,gx, gy,gz,ax,ay,az,mx,my,mz):    
-    norm=0.0
-    hx = hy = hz = bx = bz = 0.0
-    vx = vy = vz = wx = wy = wz = 0.0
-    exInt = eyInt = ezInt = 0.0
-    ex=ey=ez=0.0 
-    halfT = 0.024
-    global q0
-    global q1
-    global q2
-    global q3
-    q0q0 = q0 * q0
-    q0q1 = q0 * q1
-    q0q2 = q0 * q2
-    q0q3 = q0 * q3
-    q1q1 = q1 * q1
-    q1q2 = q1 * q2
-    q1q3 = q1 * q3
-    q2q2 = q2 * q2   
-    q2q3 = q2 * q3
-    q3q3 = q3 * q3          
-
-    norm = float(1/math.sqrt(ax * ax + ay * ay + az * az))     
-    ax = ax * norm
-    ay = ay * norm
-    az = az * norm
-
-    norm = float(1/math.sqrt(mx * mx + my * my + mz * mz))      
-    mx = mx * norm
-    my = my * norm
-    mz = mz * norm
-
-    # compute reference direction of flux
-    hx = 2 * mx * (0.5 - q2q2 - q3q3) + 2 * my * (q1q2 - q0q3) + 2 * mz * (q1q3 + q0q2)
-    hy = 2 * mx * (q1q2 + q0q3) + 2 * my * (0.5 - q1q1 - q3q3) + 2 * mz * (q2q3 - q0q1)
-    hz = 2 * mx * (q1q3 - q0q2) + 2 * my * (q2q3 + q0q1) + 2 * mz * (0.5 - q1q1 - q2q2)         
-    bx = math.sqrt((hx * hx) + (hy * hy))
-    bz = hz     
-
-    # estimated direction of gravity and flux (v and w)
-    vx = 2 * (q1q3 - q0q2)
-    vy = 2 * (q0q1 + q2q3)
-    vz = q0q0 - q1q1 - q2q2 + q3q3
-    wx = 2 * bx * (0.5 - q2q2 - q3q3) + 2 * bz * (q1q3 - q0q2)
-    wy = 2 * bx * (q1q2 - q0q3) + 2 * bz * (q0q1 + q2q3)
-    wz = 2 * bx * (q0q2 + q1q3) + 2 * bz * (0.5 - q1q1 - q2q2)  
-
-    # error is sum of cross product between reference direction of fields and direction measured by sensors
-    ex = (ay * vz - az * vy) + (my * wz - mz * wy)
-    ey = (az * vx - ax * vz) + (mz * wx - mx * wz)
-    ez = (ax * vy - ay * vx) + (mx * wy - my * wx)
-
-    if (ex != 0.0 and ey != 0.0 and ez != 0.0):
-      exInt = exInt + ex * Ki * halfT
-      eyInt = eyInt + ey * Ki * halfT  
-      ezInt = ezInt + ez * Ki * halfT
-
-      gx = gx + Kp * ex + exInt
-      gy = gy + Kp * ey + eyInt
-      gz = gz + Kp * ez + ezInt
-
-    q0 = q0 + (-q1 * gx - q2 * gy - q3 * gz) * halfT
-    q1 = q1 + (q0 * gx + q2 * gz - q3 * gy) * halfT
-    q2 = q2 + (q0 * gy - q1 * gz + q3 * gx) * halfT
-    q3 = q3 + (q0 * gz + q1 * gy - q2 * gx) * halfT  
-
-    norm = float(1/math.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3))
-    q0 = q0 * norm
-    q1 = q1 * norm
-    q2 = q2 * norm
-    q3 = q3 * norm
+
+  def _select_bank(self, bank):
+    """Write REG_BANK_SEL only when ``bank`` differs from the cached selection"""
+    if bank != self._bank:
+      self.write(bytes([REG_ADD_REG_BANK_SEL]), bytes([bank]))
+      self._bank = bank
+
+  def imuAHRSupdate(self,gx, gy,gz,ax,ay,az,mx,my,mz):
+    """Feed one sample to the instance AHRS, dt measured between calls"""
+    self.ahrs.update(gx, gy, gz, ax, ay, az, mx, my, mz)
 
   def icm20948Check(self):
     bRet=false
+    self._select_bank(REG_VAL_REG_BANK_0)
     if REG_VAL_WIA == self._read_byte(REG_ADD_WIA):
       bRet = true
     return bRet
   
   def icm20948MagCheck(self):
     self.icm20948ReadSecondary( I2C_ADD_ICM20948_AK09916|I2C_ADD_ICM20948_AK09916_READ,REG_ADD_MAG_WIA1, 2)
-    if (pu8data[0] == REG_VAL_MAG_WIA1) and ( pu8data[1] == REG_VAL_MAG_WIA2) :
+    if (self.pu8data[0] == REG_VAL_MAG_WIA1) and ( self.pu8data[1] == REG_VAL_MAG_WIA2) :
         bRet = true
         return bRet
   def icm20948CalAvgValue(self):
-    MotionVal[0]=Gyro[0]/32.8
-    MotionVal[1]=Gyro[1]/32.8
-    MotionVal[2]=Gyro[2]/32.8
-    MotionVal[3]=Accel[0]
-    MotionVal[4]=Accel[1]
-    MotionVal[5]=Accel[2]
-    MotionVal[6]=Mag[0]
-    MotionVal[7]=Mag[1]
-    MotionVal[8]=Mag[2]
+    MotionVal[0]=self.Gyro[0]/32.8
+    MotionVal[1]=self.Gyro[1]/32.8
+    MotionVal[2]=self.Gyro[2]/32.8
+    MotionVal[3]=self.Accel[0]
+    MotionVal[4]=self.Accel[1]
+    MotionVal[5]=self.Accel[2]
+    MotionVal[6]=self.Mag[0]
+    MotionVal[7]=self.Mag[1]
+    MotionVal[8]=self.Mag[2]
     
     
+class AHRS(object):
+  """Orientation fusion (Mahony or Madgwick) with per-instance quaternion and integral state.
+
+  Gyro in rad/s; accel and mag in any unit (they are normalized). ``dt`` in seconds, when omitted
+  it is measured with ticks_us between calls.
+  """
+  MAHONY = 'mahony'
+  MADGWICK = 'madgwick'
+
+  def __init__(self, algorithm=MAHONY, kp=Kp, ki=Ki, beta=0.1, default_dt=0.01):
+    if algorithm not in (self.MAHONY, self.MADGWICK):
+      raise ValueError('unknown AHRS algorithm: {}'.format(algorithm))
+    self.algorithm = algorithm
+    self.kp = kp
+    self.ki = ki
+    self.beta = beta
+    self.default_dt = default_dt
+    self.reset()
+
+  def reset(self):
+    self.q0 = 1.0
+    self.q1 = self.q2 = self.q3 = 0.0
+    self.exInt = self.eyInt = self.ezInt = 0.0
+    self._last_us = None
+
+  def _measure_dt(self):
+    now = time.ticks_us()
+    last = self._last_us
+    self._last_us = now
+    if last is None:
+      return self.default_dt
+    return time.ticks_diff(now, last) / 1000000.0
+
+  def update(self, gx, gy, gz, ax, ay, az, mx=0.0, my=0.0, mz=0.0, dt=None):
+    if dt is None:
+      dt = self._measure_dt()
+    if self.algorithm == self.MAHONY:
+      self._mahony(gx, gy, gz, ax, ay, az, mx, my, mz, dt)
+    elif mx == 0.0 and my == 0.0 and mz == 0.0:
+      self._madgwick_imu(gx, gy, gz, ax, ay, az, dt)
+    else:
+      self._madgwick_marg(gx, gy, gz, ax, ay, az, mx, my, mz, dt)
+
+  def update_many(self, accel, gyro, count, dt, gyro_scale=GYRO_RAW_TO_RADS):
+    """Fuse ``count`` raw FIFO samples (array('h'), 3 values per sample) spaced ``dt`` seconds apart.
+
+    6-axis only, the FIFO carries no magnetometer data.
+    """
+    if self.algorithm == self.MADGWICK:
+      update = self._madgwick_imu
+      for j in range(0, count * 3, 3):
+        update(gyro[j] * gyro_scale, gyro[j + 1] * gyro_scale, gyro[j + 2] * gyro_scale,
+               accel[j], accel[j + 1], accel[j + 2], dt)
+      self._last_us = time.ticks_us()
+      return
+    # Mahony IMU update inlined, state kept in locals for the whole block
+    sqrt = math.sqrt
+    q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+    exInt, eyInt, ezInt = self.exInt, self.eyInt, self.ezInt
+    kp = self.kp
+    kidt = self.ki * dt
+    halfT = 0.5 * dt
+    for j in range(0, count * 3, 3):
+      ax = accel[j]
+      ay = accel[j + 1]
+      az = accel[j + 2]
+      gx = gyro[j] * gyro_scale
+      gy = gyro[j + 1] * gyro_scale
+      gz = gyro[j + 2] * gyro_scale
+      norm = ax * ax + ay * ay + az * az
+      if norm > 0:
+        norm = 1 / sqrt(norm)
+        ax *= norm
+        ay *= norm
+        az *= norm
+        vx = 2 * (q1 * q3 - q0 * q2)
+        vy = 2 * (q0 * q1 + q2 * q3)
+        vz = q0 * q0 - q1 * q1 - q2 * q2 + q3 * q3
+        ex = ay * vz - az * vy
+        ey = az * vx - ax * vz
+        ez = ax * vy - ay * vx
+        exInt += ex * kidt
+        eyInt += ey * kidt
+        ezInt += ez * kidt
+        gx += kp * ex + exInt
+        gy += kp * ey + eyInt
+        gz += kp * ez + ezInt
+      t0 = q0 + (-q1 * gx - q2 * gy - q3 * gz) * halfT
+      t1 = q1 + (q0 * gx + q2 * gz - q3 * gy) * halfT
+      t2 = q2 + (q0 * gy - q1 * gz + q3 * gx) * halfT
+      t3 = q3 + (q0 * gz + q1 * gy - q2 * gx) * halfT
+      norm = 1 / sqrt(t0 * t0 + t1 * t1 + t2 * t2 + t3 * t3)
+      q0 = t0 * norm
+      q1 = t1 * norm
+      q2 = t2 * norm
+      q3 = t3 * norm
+    self.q0, self.q1, self.q2, self.q3 = q0, q1, q2, q3
+    self.exInt, self.eyInt, self.ezInt = exInt, eyInt, ezInt
+    self._last_us = time.ticks_us()
+
+  def _mahony(self, gx, gy, gz, ax, ay, az, mx, my, mz, dt):
+    q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+    halfT = 0.5 * dt
+    norm = ax * ax + ay * ay + az * az
+    if norm > 0:
+      q0q0 = q0 * q0
+      q0q1 = q0 * q1
+      q0q2 = q0 * q2
+      q0q3 = q0 * q3
+      q1q1 = q1 * q1
+      q1q2 = q1 * q2
+      q1q3 = q1 * q3
+      q2q2 = q2 * q2
+      q2q3 = q2 * q3
+      q3q3 = q3 * q3
+
+      norm = 1 / math.sqrt(norm)
+      ax = ax * norm
+      ay = ay * norm
+      az = az * norm
+
+      # estimated direction of gravity
+      vx = 2 * (q1q3 - q0q2)
+      vy = 2 * (q0q1 + q2q3)
+      vz = q0q0 - q1q1 - q2q2 + q3q3
+      ex = ay * vz - az * vy
+      ey = az * vx - ax * vz
+      ez = ax * vy - ay * vx
+
+      norm = mx * mx + my * my + mz * mz
+      if norm > 0:
+        norm = 1 / math.sqrt(norm)
+        mx = mx * norm
+        my = my * norm
+        mz = mz * norm
+        # compute reference direction of flux
+        hx = 2 * mx * (0.5 - q2q2 - q3q3) + 2 * my * (q1q2 - q0q3) + 2 * mz * (q1q3 + q0q2)
+        hy = 2 * mx * (q1q2 + q0q3) + 2 * my * (0.5 - q1q1 - q3q3) + 2 * mz * (q2q3 - q0q1)
+        hz = 2 * mx * (q1q3 - q0q2) + 2 * my * (q2q3 + q0q1) + 2 * mz * (0.5 - q1q1 - q2q2)
+        bx = math.sqrt((hx * hx) + (hy * hy))
+        bz = hz
+        # estimated direction of flux
+        wx = 2 * bx * (0.5 - q2q2 - q3q3) + 2 * bz * (q1q3 - q0q2)
+        wy = 2 * bx * (q1q2 - q0q3) + 2 * bz * (q0q1 + q2q3)
+        wz = 2 * bx * (q0q2 + q1q3) + 2 * bz * (0.5 - q1q1 - q2q2)
+        # error is sum of cross product between reference direction of fields and direction measured by sensors
+        ex += my * wz - mz * wy
+        ey += mz * wx - mx * wz
+        ez += mx * wy - my * wx
+
+      kidt = self.ki * dt
+      self.exInt += ex * kidt
+      self.eyInt += ey * kidt
+      self.ezInt += ez * kidt
+      gx = gx + self.kp * ex + self.exInt
+      gy = gy + self.kp * ey + self.eyInt
+      gz = gz + self.kp * ez + self.ezInt
+
+    t0 = q0 + (-q1 * gx - q2 * gy - q3 * gz) * halfT
+    t1 = q1 + (q0 * gx + q2 * gz - q3 * gy) * halfT
+    t2 = q2 + (q0 * gy - q1 * gz + q3 * gx) * halfT
+    t3 = q3 + (q0 * gz + q1 * gy - q2 * gx) * halfT
+    self._set_normalized(t0, t1, t2, t3)
+
+  def _madgwick_imu(self, gx, gy, gz, ax, ay, az, dt):
+    q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+    qDot0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+    qDot1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+    qDot2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+    qDot3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+    norm = ax * ax + ay * ay + az * az
+    if norm > 0:
+      norm = 1 / math.sqrt(norm)
+      ax *= norm
+      ay *= norm
+      az *= norm
+      _2q0 = 2 * q0
+      _2q1 = 2 * q1
+      _2q2 = 2 * q2
+      _2q3 = 2 * q3
+      _4q0 = 4 * q0
+      _4q1 = 4 * q1
+      _4q2 = 4 * q2
+      _8q1 = 8 * q1
+      _8q2 = 8 * q2
+      q0q0 = q0 * q0
+      q1q1 = q1 * q1
+      q2q2 = q2 * q2
+      q3q3 = q3 * q3
+      # gradient descent corrective step
+      s0 = _4q0 * q2q2 + _2q2 * ax + _4q0 * q1q1 - _2q1 * ay
+      s1 = _4q1 * q3q3 - _2q3 * ax + 4 * q0q0 * q1 - _2q0 * ay - _4q1 + _8q1 * q1q1 + _8q1 * q2q2 + _4q1 * az
+      s2 = 4 * q0q0 * q2 + _2q0 * ax + _4q2 * q3q3 - _2q3 * ay - _4q2 + _8q2 * q1q1 + _8q2 * q2q2 + _4q2 * az
+      s3 = 4 * q1q1 * q3 - _2q1 * ax + 4 * q2q2 * q3 - _2q2 * ay
+      self._apply_step(qDot0, qDot1, qDot2, qDot3, s0, s1, s2, s3, dt)
+    else:
+      self._set_normalized(q0 + qDot0 * dt, q1 + qDot1 * dt, q2 + qDot2 * dt, q3 + qDot3 * dt)
+
+  def _madgwick_marg(self, gx, gy, gz, ax, ay, az, mx, my, mz, dt):
+    q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+    qDot0 = 0.5 * (-q1 * gx - q2 * gy - q3 * gz)
+    qDot1 = 0.5 * (q0 * gx + q2 * gz - q3 * gy)
+    qDot2 = 0.5 * (q0 * gy - q1 * gz + q3 * gx)
+    qDot3 = 0.5 * (q0 * gz + q1 * gy - q2 * gx)
+    norm = ax * ax + ay * ay + az * az
+    if norm == 0:
+      self._set_normalized(q0 + qDot0 * dt, q1 + qDot1 * dt, q2 + qDot2 * dt, q3 + qDot3 * dt)
+      return
+    norm = 1 / math.sqrt(norm)
+    ax *= norm
+    ay *= norm
+    az *= norm
+    norm = 1 / math.sqrt(mx * mx + my * my + mz * mz)
+    mx *= norm
+    my *= norm
+    mz *= norm
+
+    _2q0mx = 2 * q0 * mx
+    _2q0my = 2 * q0 * my
+    _2q0mz = 2 * q0 * mz
+    _2q1mx = 2 * q1 * mx
+    _2q0 = 2 * q0
+    _2q1 = 2 * q1
+    _2q2 = 2 * q2
+    _2q3 = 2 * q3
+    _2q0q2 = 2 * q0 * q2
+    _2q2q3 = 2 * q2 * q3
+    q0q0 = q0 * q0
+    q0q1 = q0 * q1
+    q0q2 = q0 * q2
+    q0q3 = q0 * q3
+    q1q1 = q1 * q1
+    q1q2 = q1 * q2
+    q1q3 = q1 * q3
+    q2q2 = q2 * q2
+    q2q3 = q2 * q3
+    q3q3 = q3 * q3
+
+    # reference direction of Earth's magnetic field
+    hx = mx * q0q0 - _2q0my * q3 + _2q0mz * q2 + mx * q1q1 + _2q1 * my * q2 + _2q1 * mz * q3 - mx * q2q2 - mx * q3q3
+    hy = _2q0mx * q3 + my * q0q0 - _2q0mz * q1 + _2q1mx * q2 - my * q1q1 + my * q2q2 + _2q2 * mz * q3 - my * q3q3
+    _2bx = math.sqrt(hx * hx + hy * hy)
+    _2bz = -_2q0mx * q2 + _2q0my * q1 + mz * q0q0 + _2q1mx * q3 - mz * q1q1 + _2q2 * my * q3 - mz * q2q2 + mz * q3q3
+    _4bx = 2 * _2bx
+    _4bz = 2 * _2bz
+
+    # gradient descent corrective step
+    fax = 2 * q1q3 - _2q0q2 - ax
+    fay = 2 * q0q1 + _2q2q3 - ay
+    faz = 1 - 2 * q1q1 - 2 * q2q2 - az
+    fmx = _2bx * (0.5 - q2q2 - q3q3) + _2bz * (q1q3 - q0q2) - mx
+    fmy = _2bx * (q1q2 - q0q3) + _2bz * (q0q1 + q2q3) - my
+    fmz = _2bx * (q0q2 + q1q3) + _2bz * (0.5 - q1q1 - q2q2) - mz
+    s0 = -_2q2 * fax + _2q1 * fay - _2bz * q2 * fmx + (-_2bx * q3 + _2bz * q1) * fmy + _2bx * q2 * fmz
+    s1 = _2q3 * fax + _2q0 * fay - 4 * q1 * faz + _2bz * q3 * fmx + (_2bx * q2 + _2bz * q0) * fmy + (_2bx * q3 - _4bz * q1) * fmz
+    s2 = -_2q0 * fax + _2q3 * fay - 4 * q2 * faz + (-_4bx * q2 - _2bz * q0) * fmx + (_2bx * q1 + _2bz * q3) * fmy + (_2bx * q0 - _4bz * q2) * fmz
+    s3 = _2q1 * fax + _2q2 * fay + (-_4bx * q3 + _2bz * q1) * fmx + (-_2bx * q0 + _2bz * q2) * fmy + _2bx * q1 * fmz
+    self._apply_step(qDot0, qDot1, qDot2, qDot3, s0, s1, s2, s3, dt)
+
+  def _apply_step(self, qDot0, qDot1, qDot2, qDot3, s0, s1, s2, s3, dt):
+    norm = s0 * s0 + s1 * s1 + s2 * s2 + s3 * s3
+    if norm > 0:
+      norm = self.beta / math.sqrt(norm)
+      qDot0 -= s0 * norm
+      qDot1 -= s1 * norm
+      qDot2 -= s2 * norm
+      qDot3 -= s3 * norm
+    self._set_normalized(self.q0 + qDot0 * dt, self.q1 + qDot1 * dt, self.q2 + qDot2 * dt, self.q3 + qDot3 * dt)
+
+  def _set_normalized(self, q0, q1, q2, q3):
+    norm = 1 / math.sqrt(q0 * q0 + q1 * q1 + q2 * q2 + q3 * q3)
+    self.q0 = q0 * norm
+    self.q1 = q1 * norm
+    self.q2 = q2 * norm
+    self.q3 = q3 * norm
+
+  def quaternion(self):
+    return self.q0, self.q1, self.q2, self.q3
+
+  def euler(self):
+    """(roll, pitch, yaw) in degrees"""
+    q0, q1, q2, q3 = self.q0, self.q1, self.q2, self.q3
+    sinp = -2 * q1 * q3 + 2 * q0 * q2
+    if sinp > 1:
+      sinp = 1
+    elif sinp < -1:
+      sinp = -1
+    pitch = math.asin(sinp) * RAD_TO_DEG
+    roll = math.atan2(2 * q2 * q3 + 2 * q0 * q1, -2 * q1 * q1 - 2 * q2 * q2 + 1) * RAD_TO_DEG
+    yaw = math.atan2(-2 * q1 * q2 - 2 * q0 * q3, 2 * q2 * q2 + 2 * q3 * q3 - 1) * RAD_TO_DEG
+    return roll, pitch, yaw
+
+
 if __name__ == '__main__':
   import time
   from machine import I2C
@@ -394,14 +1020,12 @@ if __name__ == '__main__':
         icm20948.imuAHRSupdate(MotionVal[0] * 0.0175, MotionVal[1] * 0.0175,MotionVal[2] * 0.0175,
                     MotionVal[3],MotionVal[4],MotionVal[5], 
                     MotionVal[6], MotionVal[7], MotionVal[8])
-        pitch = math.asin(-2 * q1 * q3 + 2 * q0* q2)* 57.3
-        roll  = math.atan2(2 * q2 * q3 + 2 * q0 * q1, -2 * q1 * q1 - 2 * q2* q2 + 1)* 57.3
-        yaw   = math.atan2(-2 * q1 * q2 - 2 * q0 * q3, 2 * q2 * q2 + 2 * q3 * q3 - 1) * 57.3
+        roll, pitch, yaw = icm20948.ahrs.euler()
         print("\r\n /-------------------------------------------------------------/ \r\n")
         print('\r\n Roll = %.2f , Pitch = %.2f , Yaw = %.2f\r\n'%(roll,pitch,yaw))
-        print('\r\nAcceleration:  X = %d , Y = %d , Z = %d\r\n'%(Accel[0],Accel[1],Accel[2]))  
-        print('\r\nGyroscope:     X = %d , Y = %d , Z = %d\r\n'%(Gyro[0],Gyro[1],Gyro[2]))
-        print('\r\nMagnetic:      X = %d , Y = %d , Z = %d'%((Mag[0]),Mag[1],Mag[2]))
+        print('\r\nAcceleration:  X = %d , Y = %d , Z = %d\r\n'%(icm20948.Accel[0],icm20948.Accel[1],icm20948.Accel[2]))  
+        print('\r\nGyroscope:     X = %d , Y = %d , Z = %d\r\n'%(icm20948.Gyro[0],icm20948.Gyro[1],icm20948.Gyro[2]))
+        print('\r\nMagnetic:      X = %d , Y = %d , Z = %d'%((icm20948.Mag[0]),icm20948.Mag[1],icm20948.Mag[2]))
     except(KeyboardInterrupt):
         print("\n")
         break
@@ -32,15 +32,71 @@ LPS_TEMP_OUT_L        =  b"\x2B"  # Temperature output registers
 LPS_TEMP_OUT_H        =  b"\x2C"
 LPS_RES               =  b"\x33"  # Filter reset register
 
+# CTRL_REG1 output data rate, bit[6:4]
+LPS_ODR_ONESHOT       =  0x00  # Power down / one-shot mode
+LPS_ODR_1HZ           =  0x10
+LPS_ODR_10HZ          =  0x20
+LPS_ODR_25HZ          =  0x30
+LPS_ODR_50HZ          =  0x40
+LPS_ODR_75HZ          =  0x50
+LPS_CTRL_REG1_BDU     =  0x02  # Block data update
+LPS_ONESHOT_TIME_MS   =  12    # typical one-shot conversion, no low-current averaging
+
+# CTRL_REG2 bits
+LPS_CTRL_REG2_FIFO_EN =  0x40
+LPS_CTRL_REG2_ONE_SHOT = 0x01
+
+# FIFO_CTRL F_MODE, bit[7:5]
+LPS_FIFO_MODE_BYPASS  =  0x00
+LPS_FIFO_MODE_FIFO    =  0x20
+LPS_FIFO_MODE_STREAM  =  0x40
+LPS_FIFO_DEPTH        =  32
+LPS_FIFO_FSS_MASK     =  0x3F  # FIFO_STATUS unread sample count
+LPS_FIFO_OVR          =  0x40  # FIFO_STATUS overrun flag
+
+LPS_SAMPLE_LEN        =  5     # PRESS_OUT_XL..TEMP_OUT_H
+
+# INT_CFG bits
+LPS_INT_CFG_AUTORIFP  =  0x80  # Reference = current pressure, output registers stay absolute
+LPS_INT_CFG_RESET_ARP =  0x40
+LPS_INT_CFG_DIFF_EN   =  0x08  # Interrupt generation enable
+LPS_INT_CFG_LIR       =  0x04  # Latch interrupt request to INT_SOURCE
+LPS_INT_CFG_PLE       =  0x02  # Interrupt on differential pressure low event
+LPS_INT_CFG_PHE       =  0x01  # Interrupt on differential pressure high event
+
+# CTRL_REG3 INT_S, bit[1:0]: route pressure high OR low event to INT_DRDY pin
+LPS_CTRL_REG3_INT_S_HL = 0x03
+
+# INT_SOURCE bits
+LPS_INT_SOURCE_IA     =  0x04  # Interrupt active
+LPS_INT_SOURCE_PL     =  0x02
+LPS_INT_SOURCE_PH     =  0x01
+
+
+def decodeSample(data, offset=0):
+    """Decode one PRESS_OUT_XL..TEMP_OUT_H block into (pressure hPa, temperature °C)."""
+    press = data[offset] | (data[offset + 1] << 8) | (data[offset + 2] << 16)
+    if press & 0x800000:
+        press -= 0x1000000
+    temp = data[offset + 3] | (data[offset + 4] << 8)
+    if temp & 0x8000:
+        temp -= 0x10000
+    return press / 4096.0, temp / 100.0
+
 
 class Lps22hb(I2CIOWrapper):
 
+    Odr_t = LPS_ODR_ONESHOT
+    Fifo_t = False
+
     def init(self):
         chip_id = self.getChipId()
         if chip_id != LPS22HB_CHIP_ID:
             raise ValueError("{} got Wrong chip id: 0x{:02X}".format(type(self).__name__, chip_id))
         self.reset()  # Wait for reset to complete
         self.write(LPS_CTRL_REG1, b"\x02")  # Low-pass filter disabled , output registers not updated until MSB and LSB have been read , Enable Block Data Update , Set Output Data Rate to 0 
+        self.Odr_t = LPS_ODR_ONESHOT
+        self.Fifo_t = False
 
     def getChipId(self):
         return self.read(LPS_WHO_AM_I)[0]
@@ -54,27 +110,139 @@ class Lps22hb(I2CIOWrapper):
             data &= 0x04
 
     def __startOneshot(self):
-        data = self.read(LPS_CTRL_REG3)[0]
         data = self.read(LPS_CTRL_REG2)[0]
-        data |= 0x01  # ONE_SHOT Set 1
+        data |= LPS_CTRL_REG2_ONE_SHOT  # ONE_SHOT Set 1
         self.write(LPS_CTRL_REG2, bytes([data]))
 
+    def readSample(self):
+        """Burst read PRESS_OUT_XL..TEMP_OUT_H (register auto-increment) in one transaction."""
+        press_data, temp_data = decodeSample(self.read(LPS_PRESS_OUT_XL, LPS_SAMPLE_LEN))
+        return round(press_data, 2), round(temp_data, 2)
+
     def getTempAndPressure(self):
+        if self.Odr_t != LPS_ODR_ONESHOT:
+            # continuous mode, output registers always hold the latest sample
+            return self.readSample()
         self.__startOneshot()
         for _ in range(10):
             status = self.read(LPS_STATUS)[0]
             if not (status & 0x01 and status & 0x02):
+                utime.sleep_ms(1)
                 continue
-            press_out_xl = self.read(LPS_PRESS_OUT_XL)[0]
-            press_out_l = self.read(LPS_PRESS_OUT_L)[0]
-            press_out_h = self.read(LPS_PRESS_OUT_H)[0]
-            press_data = ((press_out_h << 16) + (press_out_l << 8) + press_out_xl) / 4096.0
-            temp_out_l = self.read(LPS_TEMP_OUT_L)[0]
-            temp_out_h = self.read(LPS_TEMP_OUT_H)[0]
-            temp_data =((temp_out_h << 8) + temp_out_l) / 100.0
-            return round(press_data, 2), round(temp_data, 2)
+            return self.readSample()
         else:
             return 0, 0
+
+    def start_measurement(self):
+        """Trigger a one-shot conversion, continuous mode needs no trigger. Fetch with collect().
+        Returns the ms until the result is expected."""
+        if self.Odr_t == LPS_ODR_ONESHOT:
+            self.__startOneshot()
+            return LPS_ONESHOT_TIME_MS
+        return 0
+
+    def collect(self):
+        """(pressure, temperature) once available, None while a one-shot conversion is running."""
+        if self.Odr_t == LPS_ODR_ONESHOT:
+            status = self.read(LPS_STATUS)[0]
+            if not (status & 0x01 and status & 0x02):
+                return None
+        return self.readSample()
+
+    def startContinuous(self, odr=LPS_ODR_25HZ, fifo=True):
+        """Sample continuously at ``odr``; with ``fifo`` samples queue up in the 32-level FIFO (stream mode)."""
+        if odr == LPS_ODR_ONESHOT:
+            raise ValueError("{} continuous mode needs a non-zero ODR".format(type(self).__name__))
+        data = self.read(LPS_CTRL_REG2)[0]
+        if fifo:
+            self.write(LPS_CTRL_REG2, bytes([data | LPS_CTRL_REG2_FIFO_EN]))
+            # switch through bypass to empty the FIFO before stream mode
+            self.write(LPS_FIFO_CTRL, bytes([LPS_FIFO_MODE_BYPASS]))
+            self.write(LPS_FIFO_CTRL, bytes([LPS_FIFO_MODE_STREAM]))
+        else:
+            self.write(LPS_CTRL_REG2, bytes([data & ~LPS_CTRL_REG2_FIFO_EN]))
+        self.write(LPS_CTRL_REG1, bytes([odr | LPS_CTRL_REG1_BDU]))
+        self.Odr_t = odr
+        self.Fifo_t = bool(fifo)
+
+    def stopContinuous(self):
+        """Back to power down / one-shot mode."""
+        self.write(LPS_CTRL_REG1, bytes([LPS_ODR_ONESHOT | LPS_CTRL_REG1_BDU]))
+        if self.Fifo_t:
+            self.write(LPS_FIFO_CTRL, bytes([LPS_FIFO_MODE_BYPASS]))
+            data = self.read(LPS_CTRL_REG2)[0]
+            self.write(LPS_CTRL_REG2, bytes([data & ~LPS_CTRL_REG2_FIFO_EN]))
+        self.Odr_t = LPS_ODR_ONESHOT
+        self.Fifo_t = False
+
+    def getFifoCount(self):
+        return self.read(LPS_FIFO_STATUS)[0] & LPS_FIFO_FSS_MASK
+
+    def readFifo(self, max_samples=LPS_FIFO_DEPTH):
+        """Drain pending FIFO samples in one burst read.
+
+        In FIFO mode the register address rolls back from TEMP_OUT_H to
+        PRESS_OUT_XL, so n samples are one 5*n byte read.
+        Returns a list of (pressure hPa, temperature °C), oldest first.
+        """
+        count = min(self.getFifoCount(), max_samples)
+        if count == 0:
+            return []
+        data = self.read(LPS_PRESS_OUT_XL, LPS_SAMPLE_LEN * count)
+        return [decodeSample(data, i * LPS_SAMPLE_LEN) for i in range(count)]
+
+    def setReferencePressure(self, hpa):
+        value = int(hpa * 4096) & 0xFFFFFF
+        self.write(LPS_REF_P_XL, bytes([value & 0xFF, (value >> 8) & 0xFF, (value >> 16) & 0xFF]))
+
+    def enablePressureInterrupt(self, threshold_hpa, reference_hpa=None, high=True, low=True, latch=True):
+        """Raise an interrupt when |pressure - reference| exceeds ``threshold_hpa``.
+
+        Without ``reference_hpa`` the chip takes the next conversion as reference
+        (AUTORIFP). Comparisons run on every conversion, so in steady state use
+        startContinuous() and check pressureEventPending() or the INT_DRDY pin.
+        """
+        ths = int(threshold_hpa * 16)  # THS_P LSB is 1/16 hPa
+        if not 0 < ths <= 0x7FFF:
+            raise ValueError("{} threshold out of range: {}".format(type(self).__name__, threshold_hpa))
+        self.write(LPS_THS_P_L, bytes([ths & 0xFF, ths >> 8]))
+        cfg = LPS_INT_CFG_DIFF_EN
+        if latch:
+            cfg |= LPS_INT_CFG_LIR
+        if high:
+            cfg |= LPS_INT_CFG_PHE
+        if low:
+            cfg |= LPS_INT_CFG_PLE
+        if reference_hpa is None:
+            cfg |= LPS_INT_CFG_AUTORIFP
+        else:
+            self.setReferencePressure(reference_hpa)
+        self.write(LPS_INT_CFG, bytes([cfg]))
+        self.write(LPS_CTRL_REG3, bytes([LPS_CTRL_REG3_INT_S_HL]))
+        self.getInterruptSource()  # drop any stale latched event
+
+    def disablePressureInterrupt(self):
+        self.write(LPS_INT_CFG, bytes([LPS_INT_CFG_RESET_ARP]))
+        self.write(LPS_INT_CFG, b"\x00")
+        self.write(LPS_CTRL_REG3, b"\x00")
+
+    def rearmReference(self, reference_hpa=None):
+        """Move the interrupt reference to ``reference_hpa``, or to the next conversion."""
+        cfg = self.read(LPS_INT_CFG)[0] & ~(LPS_INT_CFG_AUTORIFP | LPS_INT_CFG_RESET_ARP)
+        if reference_hpa is None:
+            self.write(LPS_INT_CFG, bytes([cfg | LPS_INT_CFG_RESET_ARP]))
+            self.write(LPS_INT_CFG, bytes([cfg | LPS_INT_CFG_AUTORIFP]))
+        else:
+            self.write(LPS_INT_CFG, bytes([cfg]))
+            self.setReferencePressure(reference_hpa)
+        self.getInterruptSource()
+
+    def getInterruptSource(self):
+        """Read INT_SOURCE, which also clears a latched interrupt."""
+        return self.read(LPS_INT_SOURCE)[0]
+
+    def pressureEventPending(self):
+        return bool(self.getInterruptSource() & LPS_INT_SOURCE_IA)
         
 
 if __name__ == '__main__':
@@ -0,0 +1,115 @@
+"""I2C sensor registry.
+
+Every entry declares where the sensor sits on the bus, a chip-ID probe that costs a single
+register read, a rough init cost and the TSL ids its samples feed. ``scan`` probes the bus
+once so callers only construct (and pay the init time of) the drivers that answered.
+"""
+
+import utime
+from usr.libs.i2c import I2CIOWrapper
+from usr.libs.tsl_model import TSL_TEMP1, TSL_HUMI, TSL_TEMP2, TSL_PRESS, TSL_RGB, TSL_GYRO, \
+    TSL_ACCEL, TSL_VIBRATION
+from usr.drivers.shtc3 import Shtc3, SHTC3_SLAVE_ADDR, SHTC3_ID, SHTC3_WAKEUP, SHTC3_WAKEUP_TIME_MS
+from usr.drivers.lps22hb import Lps22hb, LPS22HB_SLAVE_ADDRESS, LPS22HB_CHIP_ID, LPS_WHO_AM_I
+from usr.drivers.tcs34725 import Tcs34725, TCS34725_SLAVE_ADDR
+from usr.drivers.icm20948 import ICM20948, I2C_ADD_ICM20948, REG_ADD_WIA, REG_VAL_WIA, \
+  REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0
+
+
+class SensorSpec(object):
+
+    def __init__(self, name, address, probe, open, fields, init_cost_ms):
+        """
+        :param probe: ``probe(dev)`` -> bool, ``dev`` is a bare I2CIOWrapper at ``address``
+        :param open: ``open(i2c, address, **options)`` -> ready driver instance
+        :param fields: TSL ids fed by this sensor
+        :param init_cost_ms: typical time spent in ``open``, cheaper sensors are opened first
+        """
+        self.name = name
+        self.address = address
+        self.probe = probe
+        self.open = open
+        self.fields = fields
+        self.init_cost_ms = init_cost_ms
+
+    def __str__(self):
+        return '{}@0x{:02X}'.format(self.name, self.address)
+
+    def detect(self, i2c):
+        try:
+            return bool(self.probe(I2CIOWrapper(i2c, self.address)))
+        except Exception:
+            return False
+
+
+def _probe_shtc3(dev):
+    # a sleeping SHTC3 ignores everything but the wakeup command
+    try:
+        dev.write(SHTC3_WAKEUP, b'')
+    except I2CIOWrapper.I2CWriteError:
+        pass
+    utime.sleep_ms(SHTC3_WAKEUP_TIME_MS)
+    return int.from_bytes(dev.read(SHTC3_ID, 2), 'big') & 0x0807 == 0x0807
+
+
+def _open_shtc3(i2c, address, **options):
+    sensor = Shtc3(i2c, address)
+    sensor.init()
+    return sensor
+
+
+def _probe_lps22hb(dev):
+    return dev.read(LPS_WHO_AM_I)[0] == LPS22HB_CHIP_ID
+
+
+def _open_lps22hb(i2c, address, **options):
+    sensor = Lps22hb(i2c, address)
+    sensor.init()
+    return sensor
+
+
+def _probe_tcs34725(dev):
+    return dev.readByte(Tcs34725.TCS34725_CMD_BIT | Tcs34725.TCS34725_ID) in (0x44, 0x4D)
+
+
+def _open_tcs34725(i2c, address, **options):
+    sensor = Tcs34725(i2c, address)
+    sensor.init()
+    return sensor
+
+
+def _probe_icm20948(dev):
+    dev.writeByte(REG_ADD_REG_BANK_SEL, REG_VAL_REG_BANK_0)
+    return dev.readByte(REG_ADD_WIA) == REG_VAL_WIA
+
+
+def _open_icm20948(i2c, address, calibration=None, **options):
+    return ICM20948(i2c, address, calibration=calibration)
+
+
+SENSORS = []
+
+
+def register(spec):
+    """Add a sensor, keeping the registry ordered by init cost"""
+    SENSORS.append(spec)
+    SENSORS.sort(key=lambda s: s.init_cost_ms)
+
+
+def get(name):
+    for spec in SENSORS:
+        if spec.name == name:
+            return spec
+
+
+def scan(i2c):
+    """Probe every registered address once, return the specs that answered"""
+    return [spec for spec in SENSORS if spec.detect(i2c)]
+
+
+register(SensorSpec('lps22hb', LPS22HB_SLAVE_ADDRESS, _probe_lps22hb, _open_lps22hb, (TSL_TEMP2, TSL_PRESS), 10))
+register(SensorSpec('tcs34725', TCS34725_SLAVE_ADDR, _probe_tcs34725, _open_tcs34725, (TSL_RGB,), 10))
+register(SensorSpec('shtc3', SHTC3_SLAVE_ADDR, _probe_shtc3, _open_shtc3, (TSL_TEMP1, TSL_HUMI), 35))
+# ~1 s with a fresh gyro calibration, ~50 ms when a stored one is reused
+register(SensorSpec('icm20948', I2C_ADD_ICM20948, _probe_icm20948, _open_icm20948,
+                    (TSL_GYRO, TSL_ACCEL, TSL_VIBRATION), 1000))
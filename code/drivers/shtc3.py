@@ -23,9 +23,47 @@ SHTC3_LM_CD_READ_RH     =	b"\x40\x1A"
 SHTC3_SOFTWARE_RESET    =	b"\x40\x1A"
 SHTC3_ID                = 	b"\xEF\xC8"
 
+# Measurement modes
+SHTC3_MODE_NORMAL       =   0
+SHTC3_MODE_LOW_POWER    =   1
+
+# Single-shot commands, temperature first so one 6-byte frame carries T, CRC, RH, CRC
+_MEASURE_CMDS = {
+    # (mode, clock stretching): command
+    (SHTC3_MODE_NORMAL, False): SHTC3_NM_CD_READ_TH,
+    (SHTC3_MODE_NORMAL, True): SHTC3_NM_CE_READ_TH,
+    (SHTC3_MODE_LOW_POWER, False): SHTC3_LM_CD_READ_TH,
+    (SHTC3_MODE_LOW_POWER, True): SHTC3_LM_CE_READ_TH,
+}
+
+# Datasheet timings (ms): typical conversion time before first poll, and max conversion time
+_MEASURE_TIMES = {
+    SHTC3_MODE_NORMAL: (11, 13),
+    SHTC3_MODE_LOW_POWER: (1, 2),
+}
+SHTC3_WAKEUP_TIME_MS    =   1   # tWakeup max 240us
+
+
+def _build_crc8_table(poly=0x31):
+    table = bytearray(256)
+    for i in range(256):
+        crc = i
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ poly) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+        table[i] = crc
+    return bytes(table)
+
+
+_CRC8_TABLE = _build_crc8_table()
+
 
 class Shtc3(I2CIOWrapper):
 
+    _ready_ms = None  # earliest result time of a start_measurement() conversion
+
     def init(self):
         chip_id = self.getChipId()
         if chip_id != 0x0807:
@@ -36,9 +74,9 @@ class Shtc3(I2CIOWrapper):
         id = int.from_bytes(self.read(SHTC3_ID, 2), "big")
         return id & 0x0807
 
-    def wakeup(self):
+    def wakeup(self, delay_ms=30):
         self.write(SHTC3_WAKEUP, b'')
-        utime.sleep_ms(30)
+        utime.sleep_ms(delay_ms)
 
     def sleep(self):
         self.write(SHTC3_SLEEP, b'')
@@ -50,13 +88,9 @@ class Shtc3(I2CIOWrapper):
     @staticmethod
     def checkCrc(data, checksum):
         crc = 0xFF
+        table = _CRC8_TABLE
         for one in data:
-            crc ^= one
-            for _ in range(8):
-                if(crc & 0x80):
-                    crc = (crc << 1) ^ 0x131
-                else:
-                    crc = crc << 1
+            crc = table[crc ^ one]
         return crc == checksum
 
     def __getValue(self):
@@ -83,13 +117,71 @@ class Shtc3(I2CIOWrapper):
             return round(value, 2)
         return 0
     
-    def getTempAndHumi(self):
-        self.wakeup()
-        temp = self.getTempValue()
-        humi = self.getHumiValue()
-        self.sleep()
+    def __readFrame(self, mode, clock_stretching):
+        """Read the 6-byte T/RH frame of a measurement already triggered."""
+        if clock_stretching:
+            # the sensor holds SCL low until conversion completes
+            return self.read(b'', 6)
+        first, last = _MEASURE_TIMES[mode]
+        utime.sleep_ms(first)
+        # sensor NACKs its read header until the result is ready
+        for _ in range(last - first):
+            try:
+                return self.read(b'', 6)
+            except self.I2CReadError:
+                utime.sleep_ms(1)
+        return self.read(b'', 6)
+
+    def measure(self, mode=SHTC3_MODE_NORMAL, clock_stretching=False):
+        """Single-shot temperature and humidity measurement.
+
+        One command and one 6-byte read replace the two separate conversions of
+        getTempValue/getHumiValue. ``SHTC3_MODE_LOW_POWER`` trades repeatability
+        for a ~1ms conversion. Returns (temp, humi); a value failing CRC is 0.
+        """
+        self.write(b'', _MEASURE_CMDS[(mode, bool(clock_stretching))])
+        return self.__decodeFrame(self.__readFrame(mode, clock_stretching))
+
+    def __decodeFrame(self, data):
+        temp = humi = 0
+        if self.checkCrc(data[0:2], data[2]):
+            temp = round(175 * (data[0] << 8 | data[1]) / 65536.0 - 45.0, 2)
+        if self.checkCrc(data[3:5], data[5]):
+            humi = round(100 * (data[3] << 8 | data[4]) / 65536.0, 2)
         return temp, humi
 
+    def getTempAndHumi(self, mode=SHTC3_MODE_NORMAL, clock_stretching=False):
+        self.wakeup(SHTC3_WAKEUP_TIME_MS)
+        try:
+            return self.measure(mode, clock_stretching)
+        finally:
+            self.sleep()
+
+    def getTempAndHumiFast(self):
+        """Low-power mode reading, roughly 1ms conversion per sample."""
+        return self.getTempAndHumi(SHTC3_MODE_LOW_POWER)
+
+    def start_measurement(self, mode=SHTC3_MODE_NORMAL):
+        """Wake the sensor and trigger a conversion, fetch the result with collect().
+        Returns the ms until the result is expected."""
+        self.wakeup(SHTC3_WAKEUP_TIME_MS)
+        self.write(b'', _MEASURE_CMDS[(mode, False)])
+        self._ready_ms = utime.ticks_add(utime.ticks_ms(), _MEASURE_TIMES[mode][0])
+        return _MEASURE_TIMES[mode][0]
+
+    def collect(self):
+        """(temp, humi) once the triggered conversion is done, None while it is still running."""
+        if self._ready_ms is None or utime.ticks_diff(utime.ticks_ms(), self._ready_ms) < 0:
+            return None
+        try:
+            data = self.read(b'', 6)
+        except self.I2CReadError:
+            # NACK, still converting
+            return None
+        self._ready_ms = None
+        self.sleep()
+        return self.__decodeFrame(data)
+
 
 if __name__ == "__main__":
     from machine import I2C
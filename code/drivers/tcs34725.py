@@ -83,6 +83,23 @@ class Tcs34725(I2CIOWrapper):
     TCS34725_GAIN_4X                = 0x01   #<  4x gain  */
     TCS34725_GAIN_16X               = 0x02   #<  16x gain */
     TCS34725_GAIN_60X               = 0x03   #<  60x gain */
+
+    TCS34725_CMD_Auto_Inc   = 0x20    # Auto-increment protocol, same bits as TCS34725_CMD_Read_Word
+
+    # Auto-ranging ladders, least to most sensitive
+    GAIN_STEPS = (TCS34725_GAIN_1X, TCS34725_GAIN_4X, TCS34725_GAIN_16X, TCS34725_GAIN_60X)
+    INTEGRATIONTIME_STEPS = (
+        TCS34725_INTEGRATIONTIME_2_4MS,
+        TCS34725_INTEGRATIONTIME_24MS,
+        TCS34725_INTEGRATIONTIME_50MS,
+        TCS34725_INTEGRATIONTIME_101MS,
+        TCS34725_INTEGRATIONTIME_154MS,
+        TCS34725_INTEGRATIONTIME_700MS,
+    )
+    # Keep the clear channel between these fractions of full scale
+    AUTO_RANGE_LOW  = 0.10
+    AUTO_RANGE_HIGH = 0.85
+    _range_steps = 0  # adjustRange() steps left for the pending collect()
     
 
     def __init__(self, i2c, slaveaddr=0x29, debug=False):
@@ -181,26 +198,123 @@ class Tcs34725(I2CIOWrapper):
         
         return 0
 
+    def armChangeDetection(self, clear, margin=0.2, persistence=TCS34725_PERS_2_CYCLE):
+        """Program clear-channel thresholds at ``clear`` +/- ``margin`` (fraction) so the
+        chip raises AINT only once the light level leaves that band for ``persistence`` cycles.
+        """
+        delta = max(int(clear * margin), 1)
+        self.setInterruptThreshold(min(clear + delta, 0xFFFF), max(clear - delta, 0))
+        self.Set_Interrupt_Persistence_Reg(persistence)
+        self.clearInterruptFlag()
+        self.interruptEnable()
+
+    def changeDetected(self, use_pin=True):
+        """True once the armed threshold band was left. The INT pin (active low) costs no
+        bus traffic; ``use_pin=False`` checks STATUS AINT instead."""
+        if use_pin:
+            return self.INT.read_level() == 0
+        return bool(self.readByte(self.TCS34725_STATUS) & self.TCS34725_STATUS_AINT)
+
     def getChipId(self):
         return self.readByte(self.TCS34725_ID)
 
+    def getIntegrationTimeMs(self):
+        return (256 - self.IntegrationTime_t) * 2.4
+
+    def getMaxCount(self):
+        return min(65535, (256 - self.IntegrationTime_t) * 1024)
+
+    def isDataValid(self):
+        return bool(self.readByte(self.TCS34725_STATUS) & self.TCS34725_STATUS_AVALID)
+
+    def waitDataValid(self, timeout_ms=None):
+        """Poll AVALID instead of sleeping a fixed integration time, return False on timeout"""
+        if timeout_ms is None:
+            timeout_ms = int(self.getIntegrationTimeMs()) + 10
+        start = time.ticks_ms()
+        while not self.isDataValid():
+            if time.ticks_diff(time.ticks_ms(), start) >= timeout_ms:
+                return False
+            time.sleep_ms(2)
+        return True
+
+    def restartIntegration(self):
+        """Drop the running RGBC cycle so the next AVALID reflects current settings"""
+        reg = self.readByte(self.TCS34725_ENABLE)
+        self.writeByte(self.TCS34725_ENABLE, reg & ~self.TCS34725_ENABLE_AEN)
+        self.writeByte(self.TCS34725_ENABLE, reg | self.TCS34725_ENABLE_PON | self.TCS34725_ENABLE_AEN)
+
+    def readCRGB(self):
+        """Read CDATAL..BDATAH in one 8-byte auto-increment transaction"""
+        data = self.read(bytes([self.TCS34725_CMD_BIT | self.TCS34725_CMD_Auto_Inc | self.TCS34725_CDATAL]), size=8)
+        self.C = data[0] | (data[1] << 8)
+        self.R = data[2] | (data[3] << 8)
+        self.G = data[4] | (data[5] << 8)
+        self.B = data[6] | (data[7] << 8)
+        return self.C, self.R, self.G, self.B
+
     def getRGBData(self):
-        self.C = self.readWord(self.TCS34725_CDATAL | self.TCS34725_CMD_Read_Word)
-        self.R = self.readWord(self.TCS34725_RDATAL | self.TCS34725_CMD_Read_Word)
-        self.G = self.readWord(self.TCS34725_GDATAL | self.TCS34725_CMD_Read_Word)
-        self.B = self.readWord(self.TCS34725_BDATAL | self.TCS34725_CMD_Read_Word)
-        if(self.IntegrationTime_t == self.TCS34725_INTEGRATIONTIME_2_4MS):
-            time.sleep(0.01)
-        elif(self.IntegrationTime_t == self.TCS34725_INTEGRATIONTIME_24MS):
-            time.sleep(0.04)
-        elif(self.IntegrationTime_t == self.TCS34725_INTEGRATIONTIME_50MS):
-            time.sleep(0.05)
-        elif(self.IntegrationTime_t == self.TCS34725_INTEGRATIONTIME_101MS):
-            time.sleep(0.1)
-        elif(self.IntegrationTime_t == self.TCS34725_INTEGRATIONTIME_154MS):
-            time.sleep(0.2)
-        elif(self.IntegrationTime_t == self.TCS34725_INTEGRATIONTIME_700MS):
-            time.sleep(0.7)  
+        # The ADC integrates continuously, once AVALID is set the data registers always hold the last complete cycle
+        self.waitDataValid()
+        return self.readCRGB()
+
+    def adjustRange(self, crgb, max_integration_time=TCS34725_INTEGRATIONTIME_154MS):
+        """Take one gain (then integration time) step toward keeping the clear channel inside
+        [AUTO_RANGE_LOW, AUTO_RANGE_HIGH] of full scale and restart integration. Integration time
+        is not raised past ``max_integration_time``. False when in band or already at a limit.
+        """
+        gains = self.GAIN_STEPS
+        atimes = self.INTEGRATIONTIME_STEPS
+        limit = atimes.index(max_integration_time)
+        full_scale = self.getMaxCount()
+        gain_index = gains.index(self.Gain_t) if self.Gain_t in gains else len(gains) - 1
+        atime_index = atimes.index(self.IntegrationTime_t) if self.IntegrationTime_t in atimes else limit
+        if crgb[0] >= full_scale * self.AUTO_RANGE_HIGH:
+            if gain_index > 0:
+                self.setGain(gains[gain_index - 1])
+            elif atime_index > 0:
+                self.setIntegrationTime(atimes[atime_index - 1])
+            else:
+                return False
+        elif crgb[0] <= full_scale * self.AUTO_RANGE_LOW:
+            if gain_index < len(gains) - 1:
+                self.setGain(gains[gain_index + 1])
+            elif atime_index < limit:
+                self.setIntegrationTime(atimes[atime_index + 1])
+            else:
+                return False
+        else:
+            return False
+        self.restartIntegration()
+        return True
+
+    def autoRange(self, max_steps=4, max_integration_time=TCS34725_INTEGRATIONTIME_154MS):
+        """Blocking adjustRange() loop, returns the last (C, R, G, B)."""
+        crgb = self.getRGBData()
+        for _ in range(max_steps):
+            if not self.adjustRange(crgb, max_integration_time):
+                break
+            crgb = self.getRGBData()
+        return crgb
+
+    def start_measurement(self, auto_range=0, restart=False):
+        """Arm a non-blocking read for collect(). ``auto_range`` allows that many adjustRange()
+        steps, each costing one more integration cycle. ``restart`` drops the running cycle.
+        Returns the ms until a complete cycle is expected, one integration time at most."""
+        self._range_steps = auto_range
+        if restart:
+            self.restartIntegration()
+        return int(self.getIntegrationTimeMs()) + 1
+
+    def collect(self):
+        """(C, R, G, B) of a complete integration cycle, None while the ADC is still integrating."""
+        if not self.isDataValid():
+            return None
+        crgb = self.readCRGB()
+        if self._range_steps > 0 and self.adjustRange(crgb):
+            self._range_steps -= 1
+            return None
+        return crgb
 
     #Convert read data to RGB888 format
     def getRGB888(self):
@@ -199,27 +199,17 @@ class GnssService(object):
                 logger.debug("lat_and_lng: {}".format((lat, lng)))
                 if prev_lat_and_lng is None:
                     # 首次定位
-                    for _ in range(3):
-                        with CurrentApp().qth_client:
-                            if CurrentApp().qth_client.sendGnss(nmea_data):
-                                prev_lat_and_lng = (lat, lng)
-                                logger.error("send gnss to qth server success")
-                                break
-                    else:
-                        logger.error("send gnss to qth server fail")
+                    CurrentApp().qth_client.queueGnss(nmea_data)
+                    prev_lat_and_lng = (lat, lng)
+                    logger.debug("gnss fix queued for upload")
                 else:
                     # 或者位移超过 50m，则上报
                     distance = gps_distance(prev_lat_and_lng[0], prev_lat_and_lng[1], lat, lng)
                     logger.debug('distance delta: {:f}'.format(distance))
                     if distance >= 0.05:
-                        for _ in range(3):
-                            with CurrentApp().qth_client:
-                                if CurrentApp().qth_client.sendGnss(nmea_data):
-                                    prev_lat_and_lng = (lat, lng)
-                                    logger.error("send gnss to qth server success")
-                                    break
-                        else:
-                            logger.error("send gnss to qth server fail")
+                        CurrentApp().qth_client.queueGnss(nmea_data)
+                        prev_lat_and_lng = (lat, lng)
+                        logger.debug("gnss fix queued for upload")
             utime.sleep(3)
 
 
@@ -1,17 +1,23 @@
 import net
 import utime
 from usr.libs import CurrentApp
-from usr.libs.threading import Thread
+from usr.libs.threading import Thread, Event
 from usr.libs.logging import getLogger
+from usr.libs.txwindow import TX_URGENT, TX_NORMAL
 import _thread  
 
 logger = getLogger(__name__)
 
 
+LBS_REPORT_INTERVAL_S = 1800
+LBS_RETRY_S = 2
+
+
 class LbsService(object):
 
     def __init__(self, app=None):
         self.__net = net
+        self.__refresh = Event()
         if app is not None:
             self.init_app(app)
 
@@ -39,43 +45,30 @@ class LbsService(object):
             )
             return lbs_data
 
+    def refresh(self):
+        """Ask start_update for an LBS report now instead of at the next interval, does not block"""
+        self.__refresh.set()
+
     def start_update(self):
+        urgency = TX_NORMAL
         while True:
             lbs_data = self.read()
             if lbs_data is None:
-                utime.sleep(2)
+                utime.sleep(LBS_RETRY_S)
                 continue
 
-            for _ in range(3):
-                with CurrentApp().qth_client:
-                    if CurrentApp().qth_client.sendLbs(lbs_data):
-                        break
-            else:
-                logger.debug("send lbs data to qth server fail, next report will be after 2 seconds")
-                utime.sleep(2)
-                continue
-            
-            logger.debug("send lbs data to qth server success, next report will be after 1800 seconds")
-            utime.sleep(1800)
-            
+            CurrentApp().qth_client.queueLbs(lbs_data, urgency)
+            logger.debug("lbs data queued for upload, next report will be after {} seconds".format(LBS_REPORT_INTERVAL_S))
+            # a report asked for by the cloud goes out right away, periodic ones wait for a window
+            urgency = TX_URGENT if self.__refresh.wait(LBS_REPORT_INTERVAL_S, clear=True) else TX_NORMAL
+
     def put_lbs(self):
             while True:
                 lbs_data = self.read()
                 if lbs_data is None:
-                    utime.sleep(2)
+                    utime.sleep(LBS_RETRY_S)
                     continue
 
-                for _ in range(3):
-                    with CurrentApp().qth_client:
-                        if CurrentApp().qth_client.sendLbs(lbs_data):
-                            break
-                else:
-                    logger.debug("send lbs data to qth server fail, next report will be after 2 seconds")
-                    utime.sleep(2)
-                    continue
-                
-                logger.debug("send LBS data to qth server success")
+                CurrentApp().qth_client.queueLbs(lbs_data)
+                logger.debug("LBS data queued for upload")
                 break
-            
-
-                
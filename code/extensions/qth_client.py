@@ -1,15 +1,109 @@
-from usr.libs.threading import Lock
+import utime
+import ujson
+from usr.libs.threading import Lock, Queue, Thread
 from usr.libs.logging import getLogger
+from usr.libs.outbox import Outbox
+from usr.libs.retry import Backoff, CircuitBreaker
+from usr.libs.budget import BudgetManager
+from usr.libs.txwindow import TxWindow, TxScheduler, TX_URGENT, TX_NORMAL, TX_BACKGROUND
+from usr.libs.tsl import BinaryEncoder, JsonEncoder
 from usr import Qth
 from usr.libs import CurrentApp
-from . import lbs_service
+from usr.libs.tsl_model import MODEL, TSL_VIBRATION
 logger = getLogger(__name__)
 
 
+# outbox record kinds
+OUTBOX_TSL = 1
+OUTBOX_LBS = 2
+OUTBOX_GNSS = 3
+# store-and-forward defaults, overridable with app.config OUTBOX_PATH / OUTBOX_MAX_BYTES / OUTBOX_SEGMENT_BYTES
+OUTBOX_PATH = '/usr/outbox'
+OUTBOX_MAX_BYTES = 64 * 1024
+OUTBOX_SEGMENT_BYTES = 4 * 1024
+# records read from flash per drain pass, and the connection re-check period while offline
+OUTBOX_BATCH = 10
+OUTBOX_RETRY_S = 5
+# TSL fields queued within this window are merged into one sendTsl, unless the merged payload
+# reaches the size limit first; app.config UPLINK_MAX_LATENCY_MS / UPLINK_MAX_PAYLOAD override
+UPLINK_MAX_LATENCY_MS = 1000
+UPLINK_MAX_PAYLOAD = 1024
+UPLINK_QUEUE_SIZE = 32
+# devEvent codes tracked for the connection state
+QTH_EVENT_ACCESS = 2  # result 0: connected to the platform, otherwise access failed
+QTH_EVENT_SEND = 4  # result != 0: an uplink was not delivered
+QTH_EVENT_LOGOUT = 6
+# send retry policy, app.config SEND_BACKOFF_BASE_MS / SEND_BACKOFF_MAX_MS / SEND_BREAKER_FAILURES / SEND_BREAKER_RESET_MS
+SEND_BACKOFF_BASE_MS = 1000
+SEND_BACKOFF_MAX_MS = 5 * 60 * 1000
+SEND_BREAKER_FAILURES = 3
+SEND_BREAKER_RESET_MS = 60 * 1000
+# oldest sample readTsl answers with, app.config READ_TSL_MAX_AGE_S; the LPS22HB is only read on change or once a minute
+READ_TSL_MAX_AGE_S = 120
+# TSL uplink format, app.config UPLINK_ENCODING: 'tsl' hands dicts to Qth.sendTsl, 'binary' (fixed point)
+# and 'json' send frames encoded from the TSL model via Qth.sendTrans; ids outside the model use sendTsl
+UPLINK_ENCODING = 'tsl'
+# uplink data classes, each with hourly/daily byte and message budgets (libs.budget), app.config
+# BUDGET = {"<class>" or "total": {"bytes_per_day": n, ...}} overrides single limits, 0 lifts one
+BUDGET_TELEMETRY = 'telemetry'
+BUDGET_LOCATION = 'location'
+BUDGET_DIAGNOSTICS = 'diagnostics'
+BUDGET = {
+    'total': {'bytes_per_day': 1024 * 1024, 'bytes_per_hour': 64 * 1024, 'messages_per_day': 24000, 'messages_per_hour': 1800},
+    BUDGET_TELEMETRY: {'bytes_per_day': 768 * 1024, 'bytes_per_hour': 48 * 1024, 'messages_per_day': 20000, 'messages_per_hour': 1500},
+    BUDGET_LOCATION: {'bytes_per_day': 128 * 1024, 'bytes_per_hour': 16 * 1024, 'messages_per_day': 2000, 'messages_per_hour': 200},
+    BUDGET_DIAGNOSTICS: {'bytes_per_day': 128 * 1024, 'bytes_per_hour': 16 * 1024, 'messages_per_day': 2000, 'messages_per_hour': 200},
+}
+# suppressed from the highest number down when the total budget runs low
+BUDGET_PRIORITIES = {BUDGET_LOCATION: 0, BUDGET_TELEMETRY: 1, BUDGET_DIAGNOSTICS: 2}
+# TSL ids charged to another class than telemetry, app.config BUDGET_TSL_CLASSES = {"<tsl id>": "<class>"}
+BUDGET_TSL_CLASSES = {TSL_VIBRATION: BUDGET_DIAGNOSTICS}
+# byte accounting is logged this often, app.config BUDGET_LOG_INTERVAL_S
+BUDGET_LOG_INTERVAL_S = 3600
+# aligned transmission windows (libs.txwindow), app.config TX_WINDOW overrides single keys; eDRX cycle
+# or PSM TAU round the period up to the modem's own wake-ups, open_s is how long the radio stays up after a send
+TX_WINDOW = {'period_s': 60, 'offset_s': 0, 'open_s': 5, 'edrx_cycle_s': 0, 'psm_tau_s': 0, 'background_hold_s': 300}
+# urgency of TSL ids other than TX_NORMAL, app.config TX_TSL_URGENCY = {"<tsl id>": 0 urgent, 1 normal or 2 background}
+TX_TSL_URGENCY = {TSL_VIBRATION: TX_BACKGROUND}
+
+
+def _int_keys(value):
+    """JSON turned TSL ids into strings, restore them for replay"""
+    if isinstance(value, dict):
+        return {(int(k) if isinstance(k, str) and k.isdigit() else k): _int_keys(v) for k, v in value.items()}
+    return value
+
+
+def _tsl_size(value):
+    """Approximate JSON size of a TSL dict"""
+    return len(ujson.dumps(value))
+
+
 class QthClient(object):
 
     def __init__(self, app=None):
         self.opt_lock = Lock()
+        self.outbox = None
+        self._uplink = Queue(UPLINK_QUEUE_SIZE)
+        self._tsl_pending = {}
+        self._tsl_pending_size = 0
+        self._tsl_pending_ms = None
+        self._next_drain_ms = None
+        self._dropped_logged = 0
+        self.max_latency_ms = UPLINK_MAX_LATENCY_MS
+        self.max_payload = UPLINK_MAX_PAYLOAD
+        self.backoff = Backoff(SEND_BACKOFF_BASE_MS, SEND_BACKOFF_MAX_MS)
+        self.breaker = CircuitBreaker(SEND_BREAKER_FAILURES, SEND_BREAKER_RESET_MS)
+        self.connected = None  # from devEvent, None until the first access event
+        self.read_max_age_ms = READ_TSL_MAX_AGE_S * 1000
+        self.encoder = None
+        self.budget = BudgetManager(BUDGET, BUDGET_PRIORITIES)
+        self.tsl_classes = dict(BUDGET_TSL_CLASSES)
+        self.budget_log_ms = BUDGET_LOG_INTERVAL_S * 1000
+        self._budget_logged_ms = utime.ticks_ms()
+        self.tx = self._make_tx(TX_WINDOW)
+        self.tsl_urgency = dict(TX_TSL_URGENCY)
+        self._tsl_pending_urgency = TX_BACKGROUND
         if app:
             self.init_app(app)
     
@@ -23,6 +117,49 @@ class QthClient(object):
     def init_app(self, app):
         app.register("qth_client", self)
 
+        self.outbox = Outbox(
+            app.config.get('OUTBOX_PATH', OUTBOX_PATH),
+            segment_bytes=app.config.get('OUTBOX_SEGMENT_BYTES', OUTBOX_SEGMENT_BYTES),
+            max_bytes=app.config.get('OUTBOX_MAX_BYTES', OUTBOX_MAX_BYTES)
+        )
+        tx_window = dict(TX_WINDOW)
+        tx_window.update(app.config.get('TX_WINDOW', {}))
+        try:
+            self.tx = self._make_tx(tx_window)
+        except Exception as e:
+            logger.error("invalid TX_WINDOW, using defaults: {}".format(e))
+        for tsl_id, urgency in app.config.get('TX_TSL_URGENCY', {}).items():
+            self.tsl_urgency[int(tsl_id)] = urgency
+        if len(self.outbox):
+            logger.info("outbox holds {} records from before reboot".format(len(self.outbox)))
+            self.tx.queued(TX_NORMAL)
+        self.max_latency_ms = app.config.get('UPLINK_MAX_LATENCY_MS', UPLINK_MAX_LATENCY_MS)
+        self.max_payload = app.config.get('UPLINK_MAX_PAYLOAD', UPLINK_MAX_PAYLOAD)
+        self.backoff = Backoff(
+            app.config.get('SEND_BACKOFF_BASE_MS', SEND_BACKOFF_BASE_MS),
+            app.config.get('SEND_BACKOFF_MAX_MS', SEND_BACKOFF_MAX_MS)
+        )
+        self.breaker = CircuitBreaker(
+            app.config.get('SEND_BREAKER_FAILURES', SEND_BREAKER_FAILURES),
+            app.config.get('SEND_BREAKER_RESET_MS', SEND_BREAKER_RESET_MS)
+        )
+        self.read_max_age_ms = app.config.get('READ_TSL_MAX_AGE_S', READ_TSL_MAX_AGE_S) * 1000
+        self.encoder = self._make_encoder(app.config.get('UPLINK_ENCODING', UPLINK_ENCODING))
+        try:
+            self.budget.load(app.config.get('BUDGET'))
+        except Exception as e:
+            logger.error("invalid BUDGET, using defaults: {}".format(e))
+        for tsl_id, data_class in app.config.get('BUDGET_TSL_CLASSES', {}).items():
+            # an unknown class would make every queueTsl raise on the sensor thread
+            if data_class not in self.budget:
+                logger.error("invalid BUDGET_TSL_CLASSES class {} for TSL {}, using {}".format(data_class, tsl_id, BUDGET_TELEMETRY))
+                data_class = BUDGET_TELEMETRY
+            try:
+                self.tsl_classes[int(tsl_id)] = data_class
+            except ValueError:
+                logger.error("invalid BUDGET_TSL_CLASSES TSL id {}, ignored".format(tsl_id))
+        self.budget_log_ms = app.config.get('BUDGET_LOG_INTERVAL_S', BUDGET_LOG_INTERVAL_S) * 1000
+
         Qth.init()
      
         
@@ -44,6 +181,7 @@ class QthClient(object):
     
     def load(self):
         self.start()
+        Thread(target=self.run_sender).start()
 
     def start(self):
         Qth.start()
@@ -53,6 +191,9 @@ class QthClient(object):
     def sendTsl(self, mode, value):
         return Qth.sendTsl(mode, value)
 
+    def sendTrans(self, mode, data):
+        return Qth.sendTrans(mode, data)
+
     def isStatusOk(self):
         return Qth.state()
 
@@ -62,10 +203,256 @@ class QthClient(object):
     def sendGnss(self, nmea_data):
         return Qth.sendOutsideLocation(nmea_data)
 
+    def queueTsl(self, value, urgency=None):
+        """``urgency`` None takes the most urgent of the fields' TX_TSL_URGENCY"""
+        # fields of a class over budget are dropped here, before they cost flash or airtime
+        admits = {}
+        admitted = {}
+        for tsl_id, val in value.items():
+            data_class = self.tslClass(tsl_id)
+            if data_class not in admits:
+                admits[data_class] = self.budget.admits(data_class)
+            if admits[data_class]:
+                admitted[tsl_id] = val
+            else:
+                self.budget.drop(data_class)
+        if admitted:
+            if urgency is None:
+                urgency = min([self.tsl_urgency.get(int(tsl_id), TX_NORMAL) for tsl_id in admitted])
+            self._enqueue(OUTBOX_TSL, admitted, urgency)
+
+    def queueLbs(self, lbs_data, urgency=TX_NORMAL):
+        if self._admit(BUDGET_LOCATION):
+            self._enqueue(OUTBOX_LBS, lbs_data, urgency)
+
+    def queueGnss(self, nmea_data, urgency=TX_NORMAL):
+        if self._admit(BUDGET_LOCATION):
+            self._enqueue(OUTBOX_GNSS, nmea_data, urgency)
+
+    def tslClass(self, tsl_id):
+        return self.tsl_classes.get(int(tsl_id), BUDGET_TELEMETRY)
+
+    def _admit(self, data_class):
+        if self.budget.admits(data_class):
+            return True
+        self.budget.drop(data_class)
+        return False
+
+    def metrics(self):
+        """Uplink byte/message accounting per data class since boot, with budget fill and level"""
+        return self.budget.metrics()
+
+    def _charge_tsl(self, value, nbytes):
+        """One message, its bytes split over the data classes by field count"""
+        counts = {}
+        for tsl_id in value:
+            data_class = self.tslClass(tsl_id)
+            counts[data_class] = counts.get(data_class, 0) + 1
+        for data_class, count in counts.items():
+            self.budget.charge(data_class, nbytes * count // len(value), total=False)
+        self.budget.charge(None, nbytes)
+
+    def _enqueue(self, kind, payload, urgency=TX_NORMAL):
+        """Hand a record to the sender thread, never blocks on the network"""
+        try:
+            self._uplink.put((kind, payload, urgency), block=False)
+        except Queue.Full:
+            # sender busy on a slow send, keep the record anyway
+            self.outbox.put(kind, payload)
+            self.tx.queued(urgency)
+
+    def _make_tx(self, config):
+        window = TxWindow.from_config(
+            config['period_s'], config.get('offset_s', 0), config.get('open_s', 0),
+            config.get('edrx_cycle_s', 0), config.get('psm_tau_s', 0)
+        )
+        return TxScheduler(window, int(config.get('background_hold_s', 0) * 1000))
+
+    def _merge_tsl(self, value, urgency=TX_NORMAL):
+        size = _tsl_size(value)
+        if self._tsl_pending and self._tsl_pending_size + size > self.max_payload:
+            self._flush_tsl()
+        if not self._tsl_pending:
+            self._tsl_pending_ms = utime.ticks_ms()
+        # newer values of the same id win within a window
+        self._tsl_pending.update(value)
+        self._tsl_pending_size = _tsl_size(self._tsl_pending)
+        self._tsl_pending_urgency = min(self._tsl_pending_urgency, urgency)
+
+    def _flush_tsl(self):
+        if self._tsl_pending:
+            self.outbox.put(OUTBOX_TSL, self._tsl_pending)
+            self.tx.queued(self._tsl_pending_urgency)
+            self._tsl_pending = {}
+            self._tsl_pending_size = 0
+            self._tsl_pending_ms = None
+            self._tsl_pending_urgency = TX_BACKGROUND
+
+    def _make_encoder(self, encoding):
+        if encoding == 'binary':
+            return BinaryEncoder(MODEL, self.max_payload)
+        if encoding == 'json':
+            return JsonEncoder(MODEL, self.max_payload)
+        if encoding != 'tsl':
+            logger.warn("unknown UPLINK_ENCODING {}, using tsl".format(encoding))
+        return None
+
+    def _send_tsl(self, value):
+        if self.encoder is not None and MODEL.covers(value):
+            try:
+                frame = self.encoder.encode(value)
+            except ValueError as e:
+                logger.warn("TSL frame not encodable, sending as TSL: {}".format(e))
+            else:
+                # frame is a view into the encoder's reusable buffer, the SDK may still hold
+                # on to what it is given after sendTrans returns
+                if not self.sendTrans(1, bytes(frame)):
+                    return False
+                self._charge_tsl(value, len(frame))
+                return True
+        if not self.sendTsl(1, value):
+            return False
+        self._charge_tsl(value, _tsl_size(value))
+        return True
+
+    def _send_record(self, kind, payload):
+        with self:
+            if kind == OUTBOX_TSL:
+                return self._send_tsl(_int_keys(payload))
+            elif kind in (OUTBOX_LBS, OUTBOX_GNSS):
+                sent = self.sendLbs(payload) if kind == OUTBOX_LBS else self.sendGnss(payload)
+                if sent:
+                    self.budget.charge(BUDGET_LOCATION, len(str(payload)))
+                return sent
+        logger.error("outbox record of unknown kind {} dropped".format(kind))
+        return True
+
+    def _next_batch(self):
+        """Next send from the outbox head as (kind, payload, cursor). Consecutive TSL records
+        with distinct ids are coalesced up to max_payload, so a backlog replays in few messages."""
+        records = self.outbox.peek(OUTBOX_BATCH)
+        if not records:
+            return None
+        kind, payload, cursor = records[0]
+        if kind != OUTBOX_TSL:
+            return kind, payload, cursor
+        merged = dict(payload)
+        size = _tsl_size(payload)
+        for kind, payload, record_cursor in records[1:]:
+            if kind != OUTBOX_TSL:
+                break
+            record_size = _tsl_size(payload)
+            # an id already in the batch means a later sample, keep it for the next message
+            if size + record_size > self.max_payload or [k for k in payload if k in merged]:
+                break
+            merged.update(payload)
+            size += record_size
+            cursor = record_cursor
+        return OUTBOX_TSL, merged, cursor
+
+    def linkUp(self):
+        """devEvent connection state (when known) and Qth.state() both healthy"""
+        return self.connected is not False and self.isStatusOk()
+
+    def drain_outbox(self):
+        """Send outbox records oldest first while the link is up and the breaker closed.
+        False when a send failed, the caller backs off before the next attempt."""
+        while len(self.outbox):
+            # short-circuit: no send call at all while disconnected or tripped
+            if not self.linkUp() or not self.breaker.allow():
+                break
+            batch = self._next_batch()
+            if batch is None:
+                # whatever is left was unreadable, peek accounted it as dropped
+                break
+            kind, payload, cursor = batch
+            if not self._send_record(kind, payload):
+                self.breaker.record_failure()
+                return False
+            self.breaker.record_success()
+            self.backoff.reset()
+            self.outbox.commit(cursor)
+        if self.outbox.dropped != self._dropped_logged:
+            self._dropped_logged = self.outbox.dropped
+            logger.warn("{} outbox records dropped so far, evicted when full or unreadable".format(self.outbox.dropped))
+        return True
+
+    def run_sender(self):
+        """Single uplink thread: merge queued TSL fields per window, persist, then drain in order
+        once a transmission window opens"""
+        while True:
+            now = utime.ticks_ms()
+            # a tight telemetry budget stretches the merge window, fewer and fuller messages
+            latency_ms = self.max_latency_ms * self.budget.widen(BUDGET_TELEMETRY)
+            if self._tsl_pending_ms is not None:
+                timeout_ms = latency_ms - utime.ticks_diff(now, self._tsl_pending_ms)
+            else:
+                timeout_ms = OUTBOX_RETRY_S * 1000
+            if not self.tx.pending() and len(self.outbox):
+                # put by a producer while the queue was full
+                self.tx.queued(TX_NORMAL, now)
+            tx_wait_ms = self.tx.wait_ms(now)
+            if tx_wait_ms is not None:
+                if self._next_drain_ms is not None:
+                    # a retry waits for both the backoff and a window
+                    tx_wait_ms = max(tx_wait_ms, utime.ticks_diff(self._next_drain_ms, now))
+                timeout_ms = min(timeout_ms, tx_wait_ms)
+            try:
+                # Queue timeouts run on utime.time(), whole seconds
+                kind, payload, urgency = self._uplink.get(timeout=max(1, (timeout_ms + 999) // 1000))
+                if kind == OUTBOX_TSL:
+                    self._merge_tsl(payload, urgency)
+                    if urgency == TX_URGENT:
+                        self._flush_tsl()
+                elif kind is not None:
+                    # keep the order producers queued in
+                    self._flush_tsl()
+                    self.outbox.put(kind, payload)
+                    self.tx.queued(urgency)
+            except Queue.Empty:
+                pass
+
+            now = utime.ticks_ms()
+            if self._tsl_pending_ms is not None and utime.ticks_diff(now, self._tsl_pending_ms) >= latency_ms:
+                self._flush_tsl()
+            # the radio is only woken inside a transmission window, retries wait for the backoff too
+            backoff_done = self._next_drain_ms is None or utime.ticks_diff(now, self._next_drain_ms) >= 0
+            if backoff_done and self.tx.due(now):
+                if self.drain_outbox():
+                    self._next_drain_ms = None
+                    if not len(self.outbox):
+                        self.tx.released()
+                else:
+                    delay_ms = self.backoff.next_delay_ms()
+                    self._next_drain_ms = utime.ticks_add(now, delay_ms)
+                    logger.debug("uplink send failed, retry in {} ms".format(delay_ms))
+            if self.budget_log_ms and utime.ticks_diff(now, self._budget_logged_ms) >= self.budget_log_ms:
+                self._budget_logged_ms = now
+                logger.info("uplink budget: {}".format(self.metrics()))
+
+    def _wake_sender(self):
+        try:
+            self._uplink.put((None, None, None), block=False)
+        except Queue.Full:
+            pass
+
     def eventCallback(self, event, result):
         logger.info("dev event:{} result:{}".format(event, result))
-        if(2== event and 0 == result):
-            Qth.otaRequest()
+        if QTH_EVENT_ACCESS == event:
+            self.connected = 0 == result
+            if self.connected:
+                # fresh connection, retry the backlog right away
+                self.breaker.reset()
+                self.backoff.reset()
+                self._next_drain_ms = None
+                # the radio is up anyway
+                self.tx.window.open()
+                self._wake_sender()
+                Qth.otaRequest()
+        elif QTH_EVENT_LOGOUT == event:
+            self.connected = False
+        elif QTH_EVENT_SEND == event and 0 != result:
+            self.breaker.record_failure()
 
     def recvTransCallback(self, value):
         ret = Qth.sendTrans(1, value)
@@ -77,39 +464,16 @@ class QthClient(object):
             logger.info("recvTsl {}:{}".format(cmdId, val))
     def readTslCallback(self, ids, pkgId):
         logger.info("readTsl ids:{} pkgId:{}".format(ids, pkgId))
-        value=dict()
-        
-        temp1, humi =CurrentApp().sensor_service.get_temp1_and_humi()
-        press, temp2 = CurrentApp().sensor_service.get_press_and_temp2()
-        r,g,b = CurrentApp().sensor_service.get_rgb888()
-
-        value={
-            3:temp1,
-            4:humi,
-            5:temp2,
-            6:press,
-            7:{1:r, 2:g, 3:b},
-    
-        }
-        lbs=lbs_service.LbsService()
-        lbs.put_lbs()
-
+        # runs on the SDK callback thread: answer from the last samples, never touch the bus here
+        value = CurrentApp().sensor_service.snapshot.read(ids or None, self.read_max_age_ms)
+        missing = [id for id in (ids or ()) if id not in value]
+        if missing:
+            logger.debug("readTsl ids:{} not sampled within {} ms".format(missing, self.read_max_age_ms))
+        CurrentApp().lbs_service.refresh()
+        # answers are never held back, but they count
+        if Qth.ackTsl(1, value, pkgId):
+            self.budget.charge(BUDGET_DIAGNOSTICS, _tsl_size(value))
 
-        
-        for id in ids:
-            if 3 == id:
-                value[3]=temp1
-            elif 4 == id:
-                value[4]=humi
-            elif 5 == id:
-                value[5]=temp2
-            elif 6 == id:
-                value[6]=press
-            elif 7 == id:
-                value[7]={1:r, 2:g, 3:b}
-        Qth.ackTsl(1, value, pkgId)
-       
-        
     def recvTslServerCallback(self, serverId, value, pkgId):
         logger.info("recvTslServer serverId:{} value:{} pkgId:{}".format(serverId, value, pkgId))
         Qth.ackTslServer(1, serverId, value, pkgId)
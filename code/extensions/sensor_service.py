@@ -1,31 +1,145 @@
 import utime
+from array import array
 from machine import I2C
 from usr.libs import CurrentApp
 from usr.libs.threading import Thread
+from usr.libs.scheduler import RateScheduler
+from usr.libs.reporting import ReportPolicy, Aggregator
+from usr.libs.snapshot import Snapshot
 from usr.libs.logging import getLogger
-from usr.drivers.shtc3 import Shtc3, SHTC3_SLAVE_ADDR
-from usr.drivers.lps22hb import Lps22hb, LPS22HB_SLAVE_ADDRESS
-from usr.drivers.tcs34725 import Tcs34725, TCS34725_SLAVE_ADDR
-from usr.drivers.icm20948 import ICM20948, I2C_ADD_ICM20948
+from usr.libs.vibration import VibrationAnalyzer
+from usr.drivers import registry
+from usr.libs.tsl_model import MODEL, TSL_TEMP1, TSL_HUMI, TSL_TEMP2, TSL_PRESS, TSL_RGB, TSL_GYRO, \
+    TSL_ACCEL, TSL_VIBRATION
+from usr.extensions.qth_client import BUDGET_TELEMETRY
+from usr.drivers.lps22hb import LPS_ODR_1HZ
+from usr.drivers.icm20948 import ImuCalibration
 
 
 
 logger = getLogger(__name__)
 
 
+# LPS22HB hardware change detection, same threshold as the pressure deadband and widened with it
+LPS22HB_THRESHOLD_HPA = 1
+# temperature has no hardware threshold, so still read the LPS22HB this often
+LPS22HB_FALLBACK_READ_MS = 60 * 1000
+# TCS34725 clear-channel band (fraction of last value) before a full CRGB read
+TCS34725_CHANGE_MARGIN = 0.2
+# ICM20948 motion-triggered sampling, defaults for app.config IMU_MOTION_HOLD_S / IMU_WOM_THRESHOLD_MG
+IMU_MOTION_HOLD_S = 10
+IMU_WOM_THRESHOLD_MG = 100
+# a refined gyro bias is written to flash at most this often, app.config IMU_CALIBRATION_SAVE_S
+IMU_CALIBRATION_SAVE_S = 3600
+# Vibration features from ICM20948 FIFO windows, replace raw accel/gyro uploads when
+# app.config VIBRATION_ENABLE is set; rate/window/interval/TSL id overridable from config too
+VIBRATION_TSL_ID = TSL_VIBRATION
+VIBRATION_RATE_HZ = 200
+VIBRATION_WINDOW = 256
+VIBRATION_INTERVAL_S = 60
+VIBRATION_DRAIN_MS = 50  # FIFO drain step while a window fills
+# per-sensor sample rates in Hz, app.config SENSOR_RATES_HZ overrides them by sensor name at runtime
+SENSOR_RATES_HZ = {
+    'icm20948': 50,
+    'lps22hb': 1,
+    'tcs34725': 1,
+    'shtc3': 0.1,
+}
+# changed values are collected between uploads, defaults for app.config SENSOR_UPLOAD_INTERVAL_MS
+SENSOR_UPLOAD_INTERVAL_MS = 1000
+# reporting policy per TSL id (see libs/reporting.py), app.config REPORT_POLICY overrides entries by id;
+# quantization defaults to the TSL model scale
+REPORT_POLICY = {
+    TSL_TEMP1: {'mode': 'abs', 'threshold': 1},   # °C
+    TSL_HUMI: {'mode': 'abs', 'threshold': 1},    # %RH
+    TSL_TEMP2: {'mode': 'abs', 'threshold': 1},   # °C
+    TSL_PRESS: {'mode': 'abs', 'threshold': 1},   # hPa
+    TSL_RGB: {'mode': 'norm', 'norm': 'l2', 'threshold': 200},
+    TSL_GYRO: {'mode': 'norm', 'norm': 'l1', 'threshold': 0.1},   # rad/s
+    TSL_ACCEL: {'mode': 'norm', 'norm': 'l1', 'threshold': 0.5},  # m/s²
+}
+# windowed aggregation, app.config AGGREGATION = {"interval_s": 60, "fields": {"<tsl id>": <summary tsl id>}};
+# listed ids are reported as one min/max/mean/last/count struct per interval instead of instantaneous values
+AGGREGATION_INTERVAL_S = 60
+# a conversion not ready at its expected time is polled again after this (a quarter of the
+# expected time when longer), and given up after the timeout (plus conversion time)
+SENSOR_COLLECT_POLL_MS = 2
+SENSOR_COLLECT_TIMEOUT_MS = 1000
+# reconnect attempts, status log, rate and report policy reload
+SENSOR_MAINTENANCE_INTERVAL_MS = 30 * 1000
+
+
+def _report_defaults():
+    """REPORT_POLICY with the TSL model scale of every declared id"""
+    defaults = {}
+    for field in MODEL:
+        defaults[field.id] = {'scale': field.scale}
+    for tsl_id, entry in REPORT_POLICY.items():
+        defaults.setdefault(tsl_id, {}).update(entry)
+    return defaults
+
+
 class SensorService(object):
 
     def __init__(self, app=None):
         # i2c channel 0 
         self.i2c_channel0 = I2C(I2C.I2C1, I2C.STANDARD_MODE)
         
-        # Sensor availability tracking
-        self.sensor_available = {
-            'shtc3': False,
-            'lps22hb': False,
-            'tcs34725': False,
-            'icm20948': False
+        # caller-owned ICM20948 sample buffers, reused every read
+        self._accel_raw = array('h', [0, 0, 0])
+        self._gyro_raw = array('h', [0, 0, 0])
+
+        # persisted ICM20948 calibration, lets boot and hot-plug skip gyro calibration
+        self.imu_calibration = ImuCalibration()
+        # the driver stores a fresh calibration itself while opening
+        self._imu_saved_ms = utime.ticks_ms()
+        self._imu_save_ms = IMU_CALIBRATION_SAVE_S * 1000
+
+        # extra ``open`` keyword arguments per registry entry
+        self.sensor_options = {
+            'icm20948': {'calibration': self.imu_calibration},
+        }
+        # called with the driver after every successful (re)open
+        self._on_open = {
+            'lps22hb': self._arm_lps22hb,
         }
+        # two-phase sampling per sensor: the starter triggers a conversion and returns its
+        # collect callable (None when nothing needs reading), the reporter turns the sample into TSL data
+        self._starters = {
+            'icm20948': self._start_icm20948,
+            'shtc3': self._start_shtc3,
+            'lps22hb': self._start_lps22hb,
+            'tcs34725': self._start_tcs34725,
+        }
+        self._reporters = {
+            'icm20948': self._report_icm20948,
+            'shtc3': self._report_shtc3,
+            'lps22hb': self._report_lps22hb,
+            'tcs34725': self._report_tcs34725,
+        }
+        # sensor name -> (collect, started ms, timeout ms) of conversions not harvested yet
+        self._in_flight = {}
+        # change detection per TSL id
+        self.report_policy = ReportPolicy(_report_defaults())
+        self.aggregator = Aggregator(interval_s=AGGREGATION_INTERVAL_S)
+        # deadband / window factor from the telemetry budget, 1 while it has room
+        self._widen = 1
+        # changed values waiting for the next upload
+        self._pending = {}
+        # latest value of every TSL id regardless of the report policy, for cloud reads
+        self.snapshot = Snapshot()
+        self._latest = {}
+        # LPS22HB threshold programmed into the chip, and whether the current read was its event
+        self._lps_threshold = None
+        self._lps_event = False
+        # per-sensor sampling deadlines, filled by start_update
+        self.scheduler = RateScheduler()
+
+        # Sensor availability tracking, driver instances only exist for sensors found on the bus
+        self.sensors = {}
+        self.sensor_available = {}
+        for spec in registry.SENSORS:
+            self.sensor_available[spec.name] = False
         
         # Initialize sensors with hot-plug support
         self._init_sensors()
@@ -36,75 +150,50 @@ class SensorService(object):
             self.init_app(app)
 
     def _init_sensors(self):
-        """Initialize sensors with error handling for hot-plug support"""
-        # SHTC3
-        try:
-            self.shtc3 = Shtc3(self.i2c_channel0, SHTC3_SLAVE_ADDR)
-            self.shtc3.init()
-            self.sensor_available['shtc3'] = True
-            logger.info("SHTC3 sensor initialized successfully")
-        except Exception as e:
-            self.shtc3 = None
-            self.sensor_available['shtc3'] = False
-        
-        # LPS22HB
-        try:
-            self.lps22hb = Lps22hb(self.i2c_channel0, LPS22HB_SLAVE_ADDRESS)
-            self.lps22hb.init()
-            self.sensor_available['lps22hb'] = True
-            logger.info("LPS22HB sensor initialized successfully")
-        except Exception as e:
-            self.lps22hb = None
-            self.sensor_available['lps22hb'] = False
-        
-        # TCS34725
-        try:
-            self.tcs34725 = Tcs34725(self.i2c_channel0, TCS34725_SLAVE_ADDR)
-            self.tcs34725.init()
-            self.sensor_available['tcs34725'] = True
-            logger.info("TCS34725 sensor initialized successfully")
-        except Exception as e:
-            self.tcs34725 = None
-            self.sensor_available['tcs34725'] = False
-        
-        # ICM20948
+        """Scan the bus once and open only the sensors that answered"""
+        found = registry.scan(self.i2c_channel0)
+        logger.info("I2C scan found: {}".format(', '.join([str(spec) for spec in found])))
+        for spec in found:
+            self._open_sensor(spec)
+
+    def _open_sensor(self, spec):
         try:
-            self.icm20948 = ICM20948(self.i2c_channel0)
-            self.sensor_available['icm20948'] = True
-            logger.info("ICM20948 sensor initialized successfully")
+            sensor = spec.open(self.i2c_channel0, spec.address, **self.sensor_options.get(spec.name, {}))
+            on_open = self._on_open.get(spec.name)
+            if on_open is not None:
+                on_open(sensor)
         except Exception as e:
-            self.icm20948 = None
-            self.sensor_available['icm20948'] = False
+            logger.debug("{} open failed: {}".format(spec, e))
+            self.sensors.pop(spec.name, None)
+            self.sensor_available[spec.name] = False
+            return False
+        self.sensors[spec.name] = sensor
+        self.sensor_available[spec.name] = True
+        # a (re)plugged sensor reports its first sample whatever was reported before the gap
+        for tsl_id in spec.fields:
+            self.report_policy.reset(tsl_id)
+        logger.info("{} sensor initialized successfully".format(spec.name.upper()))
+        return True
+
+    def _arm_lps22hb(self, lps22hb):
+        """Let the LPS22HB compare pressure itself, so steady state costs one INT_SOURCE read"""
+        lps22hb.startContinuous(LPS_ODR_1HZ, fifo=False)
+        self._lps_threshold = LPS22HB_THRESHOLD_HPA * self.report_policy.widen
+        lps22hb.enablePressureInterrupt(self._lps_threshold)
 
     def _try_reconnect_sensor(self, sensor_name):
-        """Attempt to reconnect a specific sensor"""
-        try:
-            if sensor_name == 'shtc3' and not self.sensor_available['shtc3']:
-                self.shtc3 = Shtc3(self.i2c_channel0, SHTC3_SLAVE_ADDR)
-                self.shtc3.init()
-                self.sensor_available['shtc3'] = True
-                logger.info("SHTC3 sensor reconnected successfully")
-                return True
-            elif sensor_name == 'lps22hb' and not self.sensor_available['lps22hb']:
-                self.lps22hb = Lps22hb(self.i2c_channel0, LPS22HB_SLAVE_ADDRESS)
-                self.lps22hb.init()
-                self.sensor_available['lps22hb'] = True
-                logger.info("LPS22HB sensor reconnected successfully")
-                return True
-            elif sensor_name == 'tcs34725' and not self.sensor_available['tcs34725']:
-                self.tcs34725 = Tcs34725(self.i2c_channel0, TCS34725_SLAVE_ADDR)
-                self.tcs34725.init()
-                self.sensor_available['tcs34725'] = True
-                logger.info("TCS34725 sensor reconnected successfully")
-                return True
-            elif sensor_name == 'icm20948' and not self.sensor_available['icm20948']:
-                self.icm20948 = ICM20948(self.i2c_channel0)
-                self.sensor_available['icm20948'] = True
-                logger.info("ICM20948 sensor reconnected successfully")
-                return True
-        except Exception as e:
-            pass
-        return False
+        """Attempt to reconnect a specific sensor, the chip-ID probe gates the full init"""
+        if self.sensor_available.get(sensor_name):
+            return False
+        spec = registry.get(sensor_name)
+        if spec is None or not spec.detect(self.i2c_channel0):
+            return False
+        return self._open_sensor(spec)
+
+    def _sensor(self, sensor_name):
+        if not self.sensor_available.get(sensor_name):
+            raise Exception("{} sensor not available".format(sensor_name.upper()))
+        return self.sensors[sensor_name]
 
     def __str__(self):
         return '{}'.format(type(self).__name__)
@@ -119,21 +208,22 @@ class SensorService(object):
 
     def get_temp1_and_humi(self):
         """Get temperature and humidity from SHTC3 sensor with hot-plug support"""
-        if not self.sensor_available['shtc3']:
-            raise Exception("SHTC3 sensor not available")
-        return self.shtc3.getTempAndHumi()
+        return self._sensor('shtc3').getTempAndHumi()
     
     def get_press_and_temp2(self):
         """Get pressure and temperature from LPS22HB sensor with hot-plug support"""
-        if not self.sensor_available['lps22hb']:
-            raise Exception("LPS22HB sensor not available")
-        return self.lps22hb.getTempAndPressure()
+        return self._sensor('lps22hb').getTempAndPressure()
     
     def get_rgb888(self):
         """Get RGB color values from TCS34725 sensor with hot-plug support"""
-        if not self.sensor_available['tcs34725']:
-            raise Exception("TCS34725 sensor not available")
-        rgb888 = self.tcs34725.getRGBValue()
+        tcs34725 = self._sensor('tcs34725')
+        # keep the clear channel off saturation/noise floor, then convert the last reading
+        tcs34725.autoRange(max_steps=1)
+        return self._rgb_of(tcs34725)
+
+    def _rgb_of(self, tcs34725):
+        tcs34725.getRGB888()
+        rgb888 = tcs34725.RGB888
 
         r = (rgb888 >> 16) & 0xFF
         g = (rgb888 >> 8) & 0xFF
@@ -146,19 +236,29 @@ class SensorService(object):
             accel: (x, y, z) acceleration in m/s²
             gyro: (x, y, z) angular velocity in rad/s
         """
-        if not self.sensor_available['icm20948']:
-            raise Exception("ICM20948 sensor not available")
+        icm20948 = self._sensor('icm20948')
         
         # Get raw ADC values
-        accel_raw, gyro_raw = self.icm20948.icm20948_Gyro_Accel_Read()
+        accel_raw, gyro_raw = icm20948.icm20948_Gyro_Accel_Read(self._accel_raw, self._gyro_raw)
+        return self._convert_accel_gyro(icm20948, accel_raw, gyro_raw)
+
+    def _convert_accel_gyro(self, icm20948, accel_raw, gyro_raw):
         
+        # Refine gyro bias while the device is still, persist a moved bias at a flash-friendly pace
+        icm20948.refineCalibration(accel_raw, gyro_raw)
+        if icm20948.calibration_dirty and utime.ticks_diff(utime.ticks_ms(), self._imu_saved_ms) >= self._imu_save_ms:
+            icm20948.saveCalibration()
+            self._imu_saved_ms = utime.ticks_ms()
+
         # Convert accelerometer from ADC to m/s²
         # ICM20948 configured for ±2g range: 16384 LSB/g
-        # Convert: raw_value / 16384 * 9.8 (m/s²)
+        # Convert: (raw_value - offset) * scale / 16384 * 9.8 (m/s²)
+        off = icm20948.AccelOffset
+        scale = icm20948.AccelScale
         accel_ms2 = [
-            (accel_raw[0] / 16384.0) * 9.8,
-            (accel_raw[1] / 16384.0) * 9.8,
-            (accel_raw[2] / 16384.0) * 9.8
+            ((accel_raw[0] - off[0]) * scale[0] / 16384.0) * 9.8,
+            ((accel_raw[1] - off[1]) * scale[1] / 16384.0) * 9.8,
+            ((accel_raw[2] - off[2]) * scale[2] / 16384.0) * 9.8
         ]
         
         # Convert gyroscope from ADC to rad/s
@@ -172,159 +272,316 @@ class SensorService(object):
         
         return accel_ms2, gyro_rads
     
-    def count_decimal_digits(self, value):
-        s = str(value)
-        if '.' not in s:
-            return 0
-        decimal_part = s.split('.')[1]
-        return len(decimal_part)
-    
-    def round_if_needed(self,value):
-        if self.count_decimal_digits(value) > 15:    
-            for precision in range(15, 7, -1):
-                rounded = round(value, precision)
-                digits = self.count_decimal_digits(rounded)
-                if digits <= 15:
-                    return rounded
-            return 0.0
-        else:
-            return value 
-
-
-    def start_update(self):
-        prev_temp1 = None
-        prev_humi = None
-        prev_press = None
-        prev_temp2 = None
-        prev_rgb888 = None
-        prev_accel = None
-        prev_gyro = None
-        reconnect_counter = 0
+    def _create_vibration_analyzer(self):
+        config = CurrentApp().config
+        if not config.get('VIBRATION_ENABLE', False):
+            return None
+        window = config.get('VIBRATION_WINDOW', VIBRATION_WINDOW)
+        self._vib_accel = array('h', [0] * (3 * window))
+        self._vib_gyro = array('h', [0] * (3 * window))
+        return VibrationAnalyzer(window, config.get('VIBRATION_RATE_HZ', VIBRATION_RATE_HZ), scale=9.8 / 16384)
+
+    def _start_vibration(self, analyzer):
+        icm = self._sensor('icm20948')
+        if icm.wake_on_motion:
+            icm.disableWakeOnMotion()
+        self._vib_count = 0
+        icm.startFifo(analyzer.sample_rate)
+
+    def _collect_vibration(self):
+        """Drain the FIFO, return the features once the window is full and None before"""
+        analyzer = self._vibration
+        icm = self._sensor('icm20948')
+        try:
+            self._vib_count += icm.readFifo(self._vib_accel, self._vib_gyro, self._vib_count)
+        except Exception:
+            icm.stopFifo()
+            raise
+        if self._vib_count < analyzer.size:
+            return None
+        icm.stopFifo()
+        return analyzer.compute(self._vib_accel, self._vib_count)
+
+    def _report(self, data, tsl_id, value):
+        """Add ``value`` to ``data`` when the reporting policy lets it through, aggregated ids
+        only fold the sample. Returns whether the policy saw a reportable change."""
+        self._latest[tsl_id] = self.report_policy.get(tsl_id).quantize(value)
+        reported = self.report_policy.offer(tsl_id, value)
+        if self.aggregator.wants(tsl_id):
+            self.aggregator.add(tsl_id, value)
+        elif reported is not None:
+            data[tsl_id] = reported
+        return reported is not None
+
+    def _flush_aggregates(self):
+        summaries = self.aggregator.flush(self.report_policy)
+        self._pending.update(summaries)
+        self.snapshot.update(summaries)
+
+    def _load_aggregation(self):
+        aggregation = CurrentApp().config.get('AGGREGATION', {})
+        try:
+            self.aggregator.load(aggregation.get('fields'), aggregation.get('interval_s', AGGREGATION_INTERVAL_S))
+        except Exception as e:
+            logger.error("invalid AGGREGATION, keeping previous fields: {}".format(e))
+        self.scheduler.set_period('aggregate', int(self.aggregator.interval_s * 1000 * self._widen))
+
+    def _start_icm20948(self):
+        icm20948 = self._sensor('icm20948')
+        # vibration features replace the raw accel/gyro triples when enabled
+        if self._vibration is not None:
+            if self._vib_ms is not None and utime.ticks_diff(utime.ticks_ms(), self._vib_ms) < self._vib_interval_ms:
+                return None
+            self._vib_ms = utime.ticks_ms()
+            self._start_vibration(self._vibration)
+            # the FIFO holds more than a window, drain it in steps while it fills
+            return self._collect_vibration, VIBRATION_DRAIN_MS, VIBRATION_DRAIN_MS
+
+        # parked in wake-on-motion: one INT_STATUS read per period until the chip sees motion
+        if icm20948.wake_on_motion:
+            # a send failure reset prev values, take a fresh reading as well
+            if self.report_policy.last(TSL_ACCEL) is None or self.report_policy.last(TSL_GYRO) is None or icm20948.motionDetected():
+                icm20948.disableWakeOnMotion()
+                self._imu_active_ms = utime.ticks_ms()
+                logger.debug("ICM20948 motion detected, full rate sampling")
+        if icm20948.wake_on_motion:
+            return None
+        # accel/gyro sample continuously, the read itself is the collect step
+        return self.get_accel_gyro, icm20948.start_measurement(), SENSOR_COLLECT_POLL_MS
+
+    def _report_icm20948(self, data, sample):
+        if self._vibration is not None:
+            self._report(data, self._vib_tsl_id, sample)
+            logger.debug("Vibration features: {}".format(sample))
+            return
+
+        accel, gyro = sample
+        if self._report(data, TSL_ACCEL, accel):
+            self._imu_active_ms = utime.ticks_ms()
+            logger.debug("Acceleration changed: X={:.3f}, Y={:.3f}, Z={:.3f} m/s²".format(accel[0], accel[1], accel[2]))
+        if self._report(data, TSL_GYRO, gyro):
+            self._imu_active_ms = utime.ticks_ms()
+            logger.debug("Gyroscope changed: X={:.3f}, Y={:.3f}, Z={:.3f} rad/s".format(gyro[0], gyro[1], gyro[2]))
+
+        # still for the whole hold time, park until the next motion event
+        if utime.ticks_diff(utime.ticks_ms(), self._imu_active_ms) >= self._imu_hold_ms:
+            self._sensor('icm20948').enableWakeOnMotion(self._imu_wom_mg)
+            logger.debug("ICM20948 still, wake-on-motion armed")
+
+    def _start_shtc3(self):
+        shtc3 = self._sensor('shtc3')
+        return shtc3.collect, shtc3.start_measurement(), SENSOR_COLLECT_POLL_MS
+
+    def _report_shtc3(self, data, sample):
+        temp1, humi = sample
+        if self._report(data, TSL_TEMP1, temp1):
+            logger.debug("Temperature1 changed: {:.2f}°C".format(temp1))
+        if self._report(data, TSL_HUMI, humi):
+            logger.debug("Humidity changed: {:.2f}%RH".format(humi))
+
+    def _start_lps22hb(self):
+        lps22hb = self._sensor('lps22hb')
+        threshold = LPS22HB_THRESHOLD_HPA * self.report_policy.widen
+        if threshold != self._lps_threshold:
+            # the budget moved the pressure deadband, the chip compares against the same one
+            lps22hb.enablePressureInterrupt(threshold)
+            self._lps_threshold = threshold
+        self._lps_event = False
+        # only read when the pressure threshold interrupt fired, on first run, or for the temperature fallback,
+        # aggregated fields need every sample
+        if self.report_policy.last(TSL_PRESS) is None or self.report_policy.last(TSL_TEMP2) is None \
+                or self.aggregator.wants(TSL_TEMP2) or self.aggregator.wants(TSL_PRESS) \
+                or self._lps_pressure_event(lps22hb) \
+                or utime.ticks_diff(utime.ticks_ms(), self._lps_read_ms) >= LPS22HB_FALLBACK_READ_MS:
+            self._lps_read_ms = utime.ticks_ms()
+            return lps22hb.collect, lps22hb.start_measurement(), SENSOR_COLLECT_POLL_MS
+        return None
+
+    def _lps_pressure_event(self, lps22hb):
+        self._lps_event = lps22hb.pressureEventPending()
+        return self._lps_event
+
+    def _report_lps22hb(self, data, sample):
+        press, temp2 = sample
+        if self._report(data, TSL_TEMP2, temp2):
+            logger.debug("Temperature2 changed: {:.2f}°C".format(temp2))
+        reported = self._report(data, TSL_PRESS, press)
+        if reported or self._lps_event:
+            # the hardware threshold follows the last read, an event the policy suppressed
+            # (min interval, widened deadband) must not stay latched and force a read every period
+            self._sensor('lps22hb').rearmReference()
+            self._lps_event = False
+        if reported:
+            logger.debug("Pressure changed: {:.2f} hPa".format(press))
+
+    def _start_tcs34725(self):
+        tcs34725 = self._sensor('tcs34725')
+        # only read full CRGB after the clear-channel threshold interrupt fired
+        if self.report_policy.last(TSL_RGB) is None or self.aggregator.wants(TSL_RGB) or tcs34725.changeDetected():
+            # one range step keeps the clear channel off saturation/noise floor
+            ready_ms = tcs34725.start_measurement(auto_range=1)
+            # a range step restarts integration, check a few times per cycle rather than every loop
+            return tcs34725.collect, ready_ms, max(SENSOR_COLLECT_POLL_MS, ready_ms // 4)
+        return None
+
+    def _report_tcs34725(self, data, sample):
+        tcs34725 = self._sensor('tcs34725')
+        r, g, b = self._rgb_of(tcs34725)
+        tcs34725.armChangeDetection(sample[0], TCS34725_CHANGE_MARGIN)
+        if self._report(data, TSL_RGB, (r, g, b)):
+            logger.debug("RGB color changed: R={}, G={}, B={}".format(r, g, b))
+
+    def _collect_timeout_ms(self, sensor_name):
+        timeout_ms = SENSOR_COLLECT_TIMEOUT_MS
+        if sensor_name == 'icm20948' and self._vibration is not None:
+            timeout_ms += int(self._vibration.size * 1000 / self._vibration.sample_rate)
+        elif sensor_name == 'tcs34725':
+            # one integration cycle plus one more per allowed range step
+            timeout_ms += 2 * int(self.sensors[sensor_name].getIntegrationTimeMs())
+        return timeout_ms
+
+    def _load_update_config(self):
+        config = CurrentApp().config
+        self._lps_read_ms = utime.ticks_ms()
+        self._imu_active_ms = utime.ticks_ms()
+        self._imu_hold_ms = config.get('IMU_MOTION_HOLD_S', IMU_MOTION_HOLD_S) * 1000
+        self._imu_wom_mg = config.get('IMU_WOM_THRESHOLD_MG', IMU_WOM_THRESHOLD_MG)
+        self._imu_save_ms = config.get('IMU_CALIBRATION_SAVE_S', IMU_CALIBRATION_SAVE_S) * 1000
+        self._vibration = self._create_vibration_analyzer()
+        self._vib_tsl_id = config.get('VIBRATION_TSL_ID', VIBRATION_TSL_ID)
+        self._vib_interval_ms = config.get('VIBRATION_INTERVAL_S', VIBRATION_INTERVAL_S) * 1000
+        self._vib_ms = None
+        self._load_report_policy()
+
+    def _load_report_policy(self):
+        defaults = _report_defaults()
+        # every vibration window is a fresh feature vector
+        defaults.setdefault(self._vib_tsl_id, {})['mode'] = 'always'
+        self.report_policy.defaults = defaults
+        try:
+            self.report_policy.load(CurrentApp().config.get('REPORT_POLICY'))
+        except Exception as e:
+            logger.error("invalid REPORT_POLICY, keeping previous table: {}".format(e))
 
-        while True:
-            data = {}
-
-            # Try to reconnect sensors every 30 seconds
-            if reconnect_counter % 30 == 0:
-                self._try_reconnect_all_sensors()
-                
-            # Log sensor status every 30 seconds (when not at startup)
-            if reconnect_counter > 0 and reconnect_counter % 30 == 0:
-                logger.info("Sensor status - SHTC3:{}, LPS22HB:{}, TCS34725:{}, ICM20948:{}".format(
-                    self.sensor_available['shtc3'], self.sensor_available['lps22hb'], 
-                    self.sensor_available['tcs34725'], self.sensor_available['icm20948']))
-                    
-            reconnect_counter += 1
-
-            # ICM20948 sensor (Accelerometer and Gyroscope)
+    def _make_sample_task(self, sensor_name, starter):
+        def task():
+            # a conversion still in flight is the previous period's, do not stack another
+            if not self.sensor_available[sensor_name] or sensor_name in self._in_flight:
+                return
             try:
-                accel, gyro = self.get_accel_gyro()           
-                
-                # Check for significant acceleration changes (>0.5 m/s² total change)
-                if prev_accel is None or abs(prev_accel[0] - accel[0]) + abs(prev_accel[1] - accel[1]) + abs(prev_accel[2] - accel[2]) > 0.5:
-                    data.update({10: {1: self.round_if_needed(accel[0]), 2: self.round_if_needed(accel[1]), 3: self.round_if_needed(accel[2])}})
-                    prev_accel = [accel[0], accel[1], accel[2]]
-                    logger.debug("Acceleration changed: X={:.3f}, Y={:.3f}, Z={:.3f} m/s²".format(accel[0], accel[1], accel[2]))
-                
-                # Check for significant gyroscope changes (>0.1 rad/s total change)
-                if prev_gyro is None or abs(prev_gyro[0] - gyro[0]) + abs(prev_gyro[1] - gyro[1]) + abs(prev_gyro[2] - gyro[2]) >= 0.1:
-                    data.update({9: {1: self.round_if_needed(gyro[0]), 2: self.round_if_needed(gyro[1]), 3: self.round_if_needed(gyro[2])}})
-                    prev_gyro = [gyro[0], gyro[1], gyro[2]]
-                    logger.debug("Gyroscope changed: X={:.3f}, Y={:.3f}, Z={:.3f} rad/s".format(gyro[0], gyro[1], gyro[2]))
-                    
+                started = starter()
             except Exception as e:
-                self._mark_sensor_disconnected('icm20948')
-
-            utime.sleep_ms(100)
-
-            # SHTC3 sensor (Temperature and Humidity)
+                logger.error("{} start failed, marking disconnected: {}".format(sensor_name.upper(), e))
+                self._mark_sensor_disconnected(sensor_name)
+                return
+            if started is not None:
+                collect, ready_ms, poll_ms = started
+                now = utime.ticks_ms()
+                self._in_flight[sensor_name] = [collect, now, self._collect_timeout_ms(sensor_name),
+                                                utime.ticks_add(now, ready_ms), poll_ms]
+        return task
+
+    def _harvest(self):
+        """Collect every conversion that is due, conversions of different sensors overlap.
+        Returns the ms until the next pending collect is due, None when nothing is in flight."""
+        wait = None
+        for sensor_name in list(self._in_flight):
+            flight = self._in_flight[sensor_name]
+            collect, started_ms, timeout_ms, due_ms, poll_ms = flight
+            now = utime.ticks_ms()
+            if utime.ticks_diff(due_ms, now) > 0:
+                wait = utime.ticks_diff(due_ms, now) if wait is None else min(wait, utime.ticks_diff(due_ms, now))
+                continue
             try:
-                temp1, humi = self.get_temp1_and_humi()
-
-                if prev_temp1 is None or abs(prev_temp1 - temp1) > 1:
-                    data.update({3: round(temp1, 2)})
-                    prev_temp1 = temp1
-                    logger.debug("Temperature1 changed: {:.2f}°C".format(temp1))
-
-                if prev_humi is None or abs(prev_humi - humi) > 1:
-                    data.update({4: round(humi, 2)})
-                    prev_humi = humi
-                    logger.debug("Humidity changed: {:.2f}%RH".format(humi))
-
+                sample = collect()
+                if sample is None:
+                    if utime.ticks_diff(utime.ticks_ms(), started_ms) < timeout_ms:
+                        flight[3] = utime.ticks_add(utime.ticks_ms(), poll_ms)
+                        wait = poll_ms if wait is None else min(wait, poll_ms)
+                        continue
+                    raise Exception("{} conversion timed out".format(sensor_name.upper()))
+                del self._in_flight[sensor_name]
+                self._latest = {}
+                self._reporters[sensor_name](self._pending, sample)
+                # publish the whole sample at once
+                self.snapshot.update(self._latest)
             except Exception as e:
-                self._mark_sensor_disconnected('shtc3')
-
-            utime.sleep_ms(100)
+                # a timeout or a reporter bug must not pass for a silent hot-unplug
+                logger.error("{} collect failed, marking disconnected: {}".format(sensor_name.upper(), e))
+                self._in_flight.pop(sensor_name, None)
+                self._mark_sensor_disconnected(sensor_name)
+        return wait
+
+    def _rate_period_ms(self, sensor_name):
+        rates = CurrentApp().config.get('SENSOR_RATES_HZ', {})
+        hz = rates.get(sensor_name, SENSOR_RATES_HZ.get(sensor_name, 1))
+        return max(1, int(1000 / hz))
+
+    def set_rate(self, sensor_name, hz):
+        """Change one sensor's sample rate while start_update is running"""
+        return self.scheduler.set_period(sensor_name, max(1, int(1000 / hz)))
+
+    def _reload_rates(self):
+        for spec in registry.SENSORS:
+            if self.scheduler.set_period(spec.name, self._rate_period_ms(spec.name)):
+                logger.info("{} sample period now {} ms".format(spec.name.upper(), self.scheduler.get(spec.name).period_ms))
+        self.scheduler.set_period('upload', CurrentApp().config.get('SENSOR_UPLOAD_INTERVAL_MS', SENSOR_UPLOAD_INTERVAL_MS) * self._widen)
+
+    def _apply_budget(self):
+        """Widen deadbands, aggregation and upload windows by the telemetry budget's factor"""
+        widen = CurrentApp().qth_client.budget.widen(BUDGET_TELEMETRY)
+        if widen != self._widen:
+            logger.info("telemetry budget: deadbands and report windows x{}".format(widen))
+            self._widen = widen
+        self.report_policy.widen = widen
+
+    def _maintain(self):
+        self._apply_budget()
+        self._try_reconnect_all_sensors()
+        self._reload_rates()
+        self._load_report_policy()
+        self._load_aggregation()
+        logger.info("Sensor status - {}".format(', '.join(
+            ['{}:{}'.format(spec.name.upper(), self.sensor_available[spec.name]) for spec in registry.SENSORS])))
+
+    def _upload(self):
+        # hand changed values to the store-and-forward outbox, it retries across coverage gaps
+        data = self._pending
+        if not data:
+            return
+        self._pending = {}
+        CurrentApp().qth_client.queueTsl(data)
 
-            # LPS22HB sensor (Pressure and Temperature)
-            try:
-                press, temp2 = self.get_press_and_temp2()
-
-                if prev_temp2 is None or abs(prev_temp2 - temp2) > 1:
-                    data.update({5: round(temp2, 2)})
-                    prev_temp2 = temp2
-                    logger.debug("Temperature2 changed: {:.2f}°C".format(temp2))
-
-                if prev_press is None or abs(prev_press - press) > 1:
-                    data.update({6: round(press, 2)})
-                    prev_press = press
-                    logger.debug("Pressure changed: {:.2f} hPa".format(press))
-
-            except Exception as e:
-                self._mark_sensor_disconnected('lps22hb')
-
-            utime.sleep_ms(100)
-
-            # TCS34725 sensor (RGB Color)
-            try:
-                r, g, b = self.get_rgb888()
-                rgb888 = (r << 16) | (g << 8) | b
-
-                if prev_rgb888 is None:
-                    data.update({7: {1: r, 2: g, 3: b}})
-                    prev_rgb888 = rgb888
-                    logger.debug("RGB color initial: R={}, G={}, B={}".format(r, g, b))
-                else:
-                    prev_r = (prev_rgb888 >> 16) & 0xFF
-                    dr = abs(r - prev_r)
-                    
-                    prev_g = (prev_rgb888 >> 8) & 0xFF
-                    dg = abs(g - prev_g)
-                    
-                    prev_b = prev_rgb888 & 0xFF
-                    db = abs(b - prev_b)
-
-                    # 色差超过 200 即认为颜色有变化
-                    if pow(sum((dr*dr, dg*dg, db*db)), 0.5) >= 200:
-                        # data.update({7: {1: r, 2: g, 3: b}})
-                        prev_rgb888 = rgb888
-                        logger.debug("RGB color changed: R={}, G={}, B={}".format(r, g, b))
+    def start_update(self):
+        self._load_update_config()
+        self._try_reconnect_all_sensors()
+
+        for spec in registry.SENSORS:
+            starter = self._starters.get(spec.name)
+            if starter is not None:
+                self.scheduler.add(spec.name, self._rate_period_ms(spec.name), self._make_sample_task(spec.name, starter))
+        self._load_aggregation()
+        self.scheduler.add('aggregate', int(self.aggregator.interval_s * 1000), self._flush_aggregates, int(self.aggregator.interval_s * 1000))
+        self.scheduler.add('upload', CurrentApp().config.get('SENSOR_UPLOAD_INTERVAL_MS', SENSOR_UPLOAD_INTERVAL_MS), self._upload)
+        self.scheduler.add('maintenance', SENSOR_MAINTENANCE_INTERVAL_MS, self._maintain, SENSOR_MAINTENANCE_INTERVAL_MS)
 
-            except Exception as e:
-                self._mark_sensor_disconnected('tcs34725')
-
-            # Send data to IoT platform if any sensor data is available
-            if data:
-                with CurrentApp().qth_client:
-                    for _ in range(3):
-                        if CurrentApp().qth_client.sendTsl(1, data):
-                            break
-                        else:
-                            # Reset previous values on transmission failure
-                            prev_temp1 = None
-                            prev_humi = None
-                            prev_press = None
-                            prev_temp2 = None
-                            prev_rgb888 = None
-                            prev_accel = None
-                            prev_gyro = None
-
-            utime.sleep(1)
+        while True:
+            # due conversions are triggered back to back, then harvested as each becomes ready
+            wait = self.scheduler.run_pending()
+            if self._in_flight:
+                # sleep until the earliest expected result instead of polling every collect
+                collect_wait = self._harvest()
+                if collect_wait is not None:
+                    wait = min(wait, collect_wait)
+            if wait > 0:
+                utime.sleep_ms(wait)
 
     def _mark_sensor_disconnected(self, sensor_name):
         """Mark a sensor as disconnected when communication fails"""
         if self.sensor_available[sensor_name]:
             self.sensor_available[sensor_name] = False
+            self.sensors.pop(sensor_name, None)
+        self._in_flight.pop(sensor_name, None)
 
     def _try_reconnect_all_sensors(self):
         """Try to reconnect all disconnected sensors"""
@@ -0,0 +1,219 @@
+"""Uplink data budget: token buckets per data class.
+
+Every class has up to four buckets, bytes and messages per hour and per day, refilled
+continuously; a ``total`` entry bounds all classes together. Sends are charged after the
+fact and may push a bucket into debt, new data is only admitted while the class has
+tokens left. The fill level of the emptiest bucket maps to a degradation level::
+
+    NORMAL     > 50 %  everything as configured
+    TIGHT      <= 50 % producers widen deadbands / windows by 2
+    CRITICAL   <= 20 % by 4, and only priority <= 1 classes are admitted (total budget)
+    EXHAUSTED  empty   class not admitted; on the total budget only priority 0 is
+"""
+
+import utime
+from usr.libs.threading import Lock
+
+
+LEVEL_NORMAL = 0
+LEVEL_TIGHT = 1
+LEVEL_CRITICAL = 2
+LEVEL_EXHAUSTED = 3
+
+BUDGET_TIGHT = 0.5
+BUDGET_CRITICAL = 0.2
+
+# highest class priority admitted at each level of the total budget
+_ADMITTED_PRIORITY = {
+    LEVEL_NORMAL: None,
+    LEVEL_TIGHT: None,
+    LEVEL_CRITICAL: 1,
+    LEVEL_EXHAUSTED: 0,
+}
+
+# limit key -> (metric, period seconds)
+BUDGET_LIMITS = {
+    'bytes_per_hour': ('bytes', 3600),
+    'bytes_per_day': ('bytes', 86400),
+    'messages_per_hour': ('messages', 3600),
+    'messages_per_day': ('messages', 86400),
+}
+
+
+class TokenBucket(object):
+
+    def __init__(self, capacity, period_s):
+        self.capacity = capacity
+        self.period_ms = period_s * 1000
+        self.tokens = capacity
+        self._ms = utime.ticks_ms()
+
+    def __refill(self, now):
+        elapsed = utime.ticks_diff(now, self._ms)
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + self.capacity * elapsed / self.period_ms)
+            self._ms = now
+
+    def take(self, n, now=None):
+        self.__refill(utime.ticks_ms() if now is None else now)
+        self.tokens -= n
+
+    def fill(self, now=None):
+        """Remaining fraction of the capacity, 0 when in debt"""
+        self.__refill(utime.ticks_ms() if now is None else now)
+        return max(0.0, self.tokens / self.capacity)
+
+
+class _Class(object):
+
+    def __init__(self, name, priority=0):
+        self.name = name
+        self.priority = priority
+        self.buckets = {}
+        self.bytes = 0
+        self.messages = 0
+        self.dropped = 0
+
+    def configure(self, limits):
+        """Keep the fill level of buckets whose limit changed, drop removed ones"""
+        buckets = {}
+        for key, limit in (limits or {}).items():
+            if key not in BUDGET_LIMITS:
+                raise ValueError('unknown budget limit: {}'.format(key))
+            if not limit:
+                continue
+            bucket = self.buckets.get(key)
+            fill = 1.0 if bucket is None else bucket.fill()
+            bucket = TokenBucket(limit, BUDGET_LIMITS[key][1])
+            bucket.tokens = limit * fill
+            buckets[key] = bucket
+        self.buckets = buckets
+
+    def charge(self, nbytes, messages, now):
+        self.bytes += nbytes
+        self.messages += messages
+        for key, bucket in self.buckets.items():
+            bucket.take(nbytes if BUDGET_LIMITS[key][0] == 'bytes' else messages, now)
+
+    def fill(self, now):
+        fill = 1.0
+        for bucket in self.buckets.values():
+            fill = min(fill, bucket.fill(now))
+        return fill
+
+
+class BudgetManager(object):
+    """``limits`` maps class name (and ``total``) to its BUDGET_LIMITS, ``priorities`` class
+    name to priority, 0 being the most important"""
+
+    TOTAL = 'total'
+
+    def __init__(self, limits=None, priorities=None):
+        self.limits = limits or {}
+        self.priorities = priorities or {}
+        self.__lock = Lock()
+        self.__classes = {}
+        self.__total = _Class(self.TOTAL)
+        self.load()
+
+    def load(self, overrides=None):
+        """Apply ``limits`` updated by ``overrides`` (e.g. app.config), per class and key"""
+        table = {}
+        for name, limits in self.limits.items():
+            table[name] = dict(limits)
+        for name, limits in (overrides or {}).items():
+            table.setdefault(name, {}).update(limits)
+        for name in self.priorities:
+            table.setdefault(name, {})
+        # classes without a priority go last
+        lowest = max(self.priorities.values()) if self.priorities else 0
+        with self.__lock:
+            self.__total.configure(table.pop(self.TOTAL, None))
+            for name, limits in table.items():
+                budget = self.__classes.get(name)
+                if budget is None:
+                    budget = self.__classes[name] = _Class(name)
+                budget.priority = self.priorities.get(name, lowest)
+                budget.configure(limits)
+
+    def __contains__(self, name):
+        return name in self.__classes
+
+    def __class(self, name):
+        budget = self.__classes.get(name)
+        if budget is None:
+            raise KeyError('unknown data class: {}'.format(name))
+        return budget
+
+    @staticmethod
+    def _level(fill):
+        if fill <= 0:
+            return LEVEL_EXHAUSTED
+        if fill <= BUDGET_CRITICAL:
+            return LEVEL_CRITICAL
+        if fill <= BUDGET_TIGHT:
+            return LEVEL_TIGHT
+        return LEVEL_NORMAL
+
+    def level(self, name, now=None):
+        """Degradation level of a class, its own or the total budget, whichever is tighter"""
+        if now is None:
+            now = utime.ticks_ms()
+        with self.__lock:
+            return self._level(min(self.__class(name).fill(now), self.__total.fill(now)))
+
+    def admits(self, name, now=None):
+        """Whether new data of the class should be queued at all"""
+        if now is None:
+            now = utime.ticks_ms()
+        with self.__lock:
+            budget = self.__class(name)
+            if budget.fill(now) <= 0:
+                return False
+            limit = _ADMITTED_PRIORITY[self._level(self.__total.fill(now))]
+            return limit is None or budget.priority <= limit
+
+    def widen(self, name, now=None):
+        """Factor producers of the class stretch deadbands and report windows by"""
+        return 1 << min(self.level(name, now), LEVEL_CRITICAL)
+
+    def charge(self, name, nbytes, messages=1, total=True, now=None):
+        """Account a send to a class and the total. A message shared by several classes is
+        charged per class with ``total=False`` and once to the total with ``name=None``."""
+        if now is None:
+            now = utime.ticks_ms()
+        with self.__lock:
+            if name is not None:
+                self.__class(name).charge(nbytes, messages, now)
+            if total:
+                self.__total.charge(nbytes, messages, now)
+
+    def drop(self, name, count=1):
+        """Count values refused by ``admits``"""
+        with self.__lock:
+            self.__class(name).dropped += count
+
+    def metrics(self, now=None):
+        """{class: {bytes, messages, dropped, fill, level}} since boot, ``total`` included"""
+        if now is None:
+            now = utime.ticks_ms()
+        result = {}
+        with self.__lock:
+            total_fill = self.__total.fill(now)
+            for budget in self.__classes.values():
+                fill = budget.fill(now)
+                result[budget.name] = {
+                    'bytes': budget.bytes,
+                    'messages': budget.messages,
+                    'dropped': budget.dropped,
+                    'fill': round(fill, 3),
+                    'level': self._level(min(fill, total_fill)),
+                }
+            result[self.TOTAL] = {
+                'bytes': self.__total.bytes,
+                'messages': self.__total.messages,
+                'dropped': sum([b.dropped for b in self.__classes.values()]),
+                'fill': round(total_fill, 3),
+                'level': self._level(total_fill),
+            }
+        return result
@@ -0,0 +1,226 @@
+"""Bounded flash-backed FIFO of uplink records (store-and-forward).
+
+Records are appended to numbered segment files in one directory, each framed as::
+
+    magic(1) kind(1) length(2, big endian) payload(length) crc16(2)
+
+The CRC-16/CCITT covers kind, length and payload, so a record torn by a power cut ends its
+segment on the next boot. Once the total size would exceed ``max_bytes`` the oldest segment
+is dropped. Delivery is at-least-once: the read position inside the head segment lives in
+RAM, segments are only deleted after all their records were committed.
+"""
+
+import uos
+import ujson
+import ql_fs
+from usr.libs.threading import Lock
+
+
+OUTBOX_MAGIC = 0xA5
+OUTBOX_HEADER_LEN = 4
+OUTBOX_CRC_LEN = 2
+OUTBOX_SEGMENT_SUFFIX = '.seg'
+
+
+def _build_crc16_table():
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+        table.append(crc)
+    return table
+
+
+_CRC16_TABLE = _build_crc16_table()
+
+
+def crc16(data, crc=0xFFFF):
+    table = _CRC16_TABLE
+    for one in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ one]
+    return crc
+
+
+def frame(kind, payload):
+    """Frame raw ``payload`` bytes of record type ``kind`` (0-255)"""
+    size = len(payload)
+    if size > 0xFFFF:
+        raise ValueError('record too large: {} bytes'.format(size))
+    head = bytes([kind, size >> 8, size & 0xFF])
+    crc = crc16(payload, crc16(head))
+    return bytes([OUTBOX_MAGIC]) + head + payload + bytes([crc >> 8, crc & 0xFF])
+
+
+class Outbox(object):
+
+    def __init__(self, path='/usr/outbox', segment_bytes=4096, max_bytes=64 * 1024):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.dropped = 0  # records lost to eviction since boot
+        self.__lock = Lock()
+        self.__segments = []  # [seq, size, records], oldest first
+        self.__read_offset = 0  # inside the head segment
+        self.__read_count = 0
+        self.__tail = None  # append handle, only for a segment created this boot
+        self.__next_seq = 0  # never reused, in-flight cursors name segments by seq
+        self.__open()
+
+    def __enter__(self):
+        self.__lock.acquire()
+        return self
+
+    def __exit__(self, *args, **kwargs):
+        self.__lock.release()
+
+    def __len__(self):
+        with self.__lock:
+            return sum([seg[2] for seg in self.__segments]) - self.__read_count
+
+    def size(self):
+        with self.__lock:
+            return sum([seg[1] for seg in self.__segments])
+
+    def __segment_path(self, seq):
+        return '{}/{:08d}{}'.format(self.path, seq, OUTBOX_SEGMENT_SUFFIX)
+
+    def __open(self):
+        if not ql_fs.path_exists(self.path):
+            ql_fs.mkdirs(self.path)
+        seqs = []
+        for name in uos.listdir(self.path):
+            if name.endswith(OUTBOX_SEGMENT_SUFFIX):
+                try:
+                    seqs.append(int(name[:-len(OUTBOX_SEGMENT_SUFFIX)]))
+                except ValueError:
+                    continue
+        seqs.sort()
+        if seqs:
+            self.__next_seq = seqs[-1] + 1
+        for seq in seqs:
+            size, records = self.__scan(seq)
+            if records:
+                self.__segments.append([seq, size, records])
+            else:
+                uos.remove(self.__segment_path(seq))
+
+    def __scan(self, seq):
+        """Return (valid bytes, valid records) of a segment"""
+        size = records = 0
+        with open(self.__segment_path(seq), 'rb') as f:
+            while True:
+                record = self.__read_record(f)
+                if record is None:
+                    break
+                size += OUTBOX_HEADER_LEN + len(record[1]) + OUTBOX_CRC_LEN
+                records += 1
+        return size, records
+
+    @staticmethod
+    def __read_record(f):
+        head = f.read(OUTBOX_HEADER_LEN)
+        if len(head) < OUTBOX_HEADER_LEN or head[0] != OUTBOX_MAGIC:
+            return None
+        size = (head[2] << 8) | head[3]
+        body = f.read(size + OUTBOX_CRC_LEN)
+        if len(body) < size + OUTBOX_CRC_LEN:
+            return None
+        payload = body[:size]
+        if crc16(payload, crc16(head[1:])) != (body[size] << 8) | body[size + 1]:
+            return None
+        return head[1], payload
+
+    def __close_tail(self):
+        if self.__tail is not None:
+            self.__tail.close()
+            self.__tail = None
+
+    def __drop_head(self):
+        seq, size, records = self.__segments.pop(0)
+        if self.__tail is not None and not self.__segments:
+            self.__close_tail()
+        uos.remove(self.__segment_path(seq))
+        self.dropped += records - self.__read_count
+        self.__read_offset = 0
+        self.__read_count = 0
+
+    def put(self, kind, payload):
+        """Append one record, ``payload`` is anything JSON serializable"""
+        data = frame(kind, ujson.dumps(payload).encode())
+        with self.__lock:
+            # oldest-first eviction, the record must fit with the remaining segments
+            while self.__segments and sum([seg[1] for seg in self.__segments]) + len(data) > self.max_bytes:
+                self.__drop_head()
+            tail = self.__segments[-1] if self.__segments else None
+            if self.__tail is None or tail is None or tail[1] + len(data) > self.segment_bytes:
+                # never append to a segment from a previous boot, its tail may be torn
+                self.__close_tail()
+                seq = self.__next_seq
+                self.__next_seq += 1
+                self.__tail = open(self.__segment_path(seq), 'wb')
+                tail = [seq, 0, 0]
+                self.__segments.append(tail)
+            self.__tail.write(data)
+            self.__tail.flush()
+            tail[1] += len(data)
+            tail[2] += 1
+
+    def peek(self, max_records=10, max_bytes=None):
+        """Oldest unsent records as [(kind, payload, cursor)], commit() a record's cursor once it
+        and everything before it was delivered"""
+        records = []
+        total = 0
+        with self.__lock:
+            if not self.__segments:
+                return records
+            index = 0
+            offset = self.__read_offset
+            count = self.__read_count
+            while len(records) < max_records:
+                seq, size, seg_records = self.__segments[index]
+                if count >= seg_records:
+                    if index + 1 == len(self.__segments):
+                        break
+                    index += 1
+                    offset = count = 0
+                    continue
+                with open(self.__segment_path(seq), 'rb') as f:
+                    f.seek(offset)
+                    while count < seg_records and len(records) < max_records:
+                        record = self.__read_record(f)
+                        if record is None:
+                            # unreadable since it was written: the rest of the segment is lost,
+                            # later appends would land behind the damage too
+                            self.dropped += seg_records - count
+                            self.__segments[index][2] = count
+                            if index + 1 == len(self.__segments):
+                                self.__close_tail()
+                            break
+                        length = OUTBOX_HEADER_LEN + len(record[1]) + OUTBOX_CRC_LEN
+                        if max_bytes is not None and records and total + length > max_bytes:
+                            return records
+                        total += length
+                        offset += length
+                        count += 1
+                        records.append((record[0], ujson.loads(record[1]), (seq, offset, count)))
+            return records
+
+    def commit(self, cursor):
+        """Mark everything up to the record of ``cursor`` (from peek) as delivered"""
+        seq, offset, count = cursor
+        with self.__lock:
+            while self.__segments and self.__segments[0][0] < seq:
+                self.__read_count = self.__segments[0][2]
+                self.__drop_head()
+            if not self.__segments or self.__segments[0][0] != seq:
+                return
+            self.__read_offset = offset
+            self.__read_count = count
+            head = self.__segments[0]
+            # a drained head is deleted unless it is still the append target
+            if count >= head[2] and (len(self.__segments) > 1 or self.__tail is None):
+                self.__drop_head()
@@ -0,0 +1,230 @@
+"""Per TSL id reporting policy: deadband, report interval bounds and quantization.
+
+A policy entry is a dict, every key optional::
+
+    {"mode": "abs", "threshold": 1, "min_interval_s": 0, "max_interval_s": 0, "scale": 100}
+
+``mode`` is ``abs`` (absolute change), ``percent`` (change relative to the last reported
+value), ``norm`` (vector distance, ``norm`` selects ``l1``/``l2``/``max``) or ``always``.
+``max_interval_s`` > 0 forces a heartbeat report even without change, ``min_interval_s``
+rate-limits reports. ``ReportPolicy.widen`` multiplies every deadband, e.g. while the uplink
+budget is tight. ``scale`` quantizes to ``round(value * scale) / scale`` with integer
+arithmetic, ``None`` leaves values untouched. Vectors (tuple/list) are reported as TSL
+structs ``{1: x, 2: y, ...}``.
+
+``Aggregator`` is the alternative to instantaneous reports: samples of selected ids are folded
+into min/max/mean/last/count accumulators and reported once per interval.
+"""
+
+import utime
+
+
+class FieldPolicy(object):
+
+    MODES = ('abs', 'percent', 'norm', 'always')
+    NORMS = ('l1', 'l2', 'max')
+
+    def __init__(self, mode='abs', threshold=0, min_interval_s=0, max_interval_s=0, scale=None, norm='l2'):
+        if mode not in self.MODES:
+            raise ValueError('unknown report mode: {}'.format(mode))
+        if norm not in self.NORMS:
+            raise ValueError('unknown norm: {}'.format(norm))
+        self.mode = mode
+        self.threshold = threshold
+        self.min_interval_ms = int(min_interval_s * 1000)
+        self.max_interval_ms = int(max_interval_s * 1000)
+        self.scale = scale
+        self.norm = norm
+
+    def __repr__(self):
+        return '{}(mode={}, threshold={}, scale={})'.format(type(self).__name__, self.mode, self.threshold, self.scale)
+
+    def distance(self, prev, value):
+        if isinstance(value, (tuple, list)):
+            if self.norm == 'l1':
+                return sum([abs(a - b) for a, b in zip(prev, value)])
+            if self.norm == 'max':
+                return max([abs(a - b) for a, b in zip(prev, value)])
+            return sum([(a - b) * (a - b) for a, b in zip(prev, value)]) ** 0.5
+        return abs(prev - value)
+
+    def changed(self, prev, value, widen=1):
+        if prev is None or self.mode == 'always':
+            return True
+        distance = self.distance(prev, value)
+        threshold = self.threshold * widen
+        if self.mode == 'percent':
+            ref = self.distance([0] * len(prev), prev) if isinstance(prev, (tuple, list)) else abs(prev)
+            return distance * 100 > threshold * ref
+        return distance > threshold
+
+    def quantize(self, value):
+        scale = self.scale
+        if isinstance(value, (tuple, list)):
+            struct = {}
+            for i, v in enumerate(value):
+                struct[i + 1] = self._quantize(v, scale)
+            return struct
+        return self._quantize(value, scale)
+
+    @staticmethod
+    def _quantize(value, scale):
+        if scale is None or not isinstance(value, (int, float)):
+            return value
+        if scale == 1:
+            return int(value + 0.5) if value >= 0 else -int(0.5 - value)
+        n = int(value * scale + 0.5) if value >= 0 else -int(0.5 - value * scale)
+        return n / scale
+
+
+class ReportPolicy(object):
+    """Decides per TSL id whether a new sample is worth uploading, and in which form"""
+
+    def __init__(self, defaults=None):
+        self.defaults = defaults or {}
+        self.fields = {}
+        self.widen = 1
+        self._last = {}  # tsl id -> (value, ticks_ms) of the last report
+        self.load()
+
+    def load(self, overrides=None):
+        """Rebuild the table from ``defaults`` updated by ``overrides`` (e.g. app.config), ids may be strings"""
+        table = {}
+        for tsl_id, entry in self.defaults.items():
+            table[int(tsl_id)] = dict(entry)
+        for tsl_id, entry in (overrides or {}).items():
+            table.setdefault(int(tsl_id), {}).update(entry)
+        fields = {}
+        for tsl_id, entry in table.items():
+            fields[tsl_id] = FieldPolicy(**entry)
+        self.fields = fields
+
+    def get(self, tsl_id):
+        policy = self.fields.get(tsl_id)
+        if policy is None:
+            policy = self.fields[tsl_id] = FieldPolicy()
+        return policy
+
+    def last(self, tsl_id):
+        last = self._last.get(tsl_id)
+        return None if last is None else last[0]
+
+    def offer(self, tsl_id, value, now=None):
+        """Return the quantized value to report, or None when the policy suppresses it"""
+        if now is None:
+            now = utime.ticks_ms()
+        policy = self.get(tsl_id)
+        last = self._last.get(tsl_id)
+        if last is not None:
+            elapsed = utime.ticks_diff(now, last[1])
+            if elapsed < policy.min_interval_ms:
+                return None
+            heartbeat = policy.max_interval_ms > 0 and elapsed >= policy.max_interval_ms
+            if not heartbeat and not policy.changed(last[0], value, self.widen):
+                return None
+        self._last[tsl_id] = (value, now)
+        return policy.quantize(value)
+
+    def reset(self, tsl_id=None):
+        """Forget last reports, so the next sample of every (or one) id is reported"""
+        if tsl_id is None:
+            self._last.clear()
+        else:
+            self._last.pop(tsl_id, None)
+
+
+class Accumulator(object):
+    """Running min/max/sum/last/count of a scalar or a fixed-length vector, no per-sample storage"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.min = None
+        self.max = None
+        self.sum = None
+        self.last = None
+
+    def add(self, value):
+        if not isinstance(value, (tuple, list)):
+            value = (value,)
+        if self.count == 0:
+            self.min = list(value)
+            self.max = list(value)
+            self.sum = list(value)
+        else:
+            lo, hi, total = self.min, self.max, self.sum
+            for i, v in enumerate(value):
+                if v < lo[i]:
+                    lo[i] = v
+                elif v > hi[i]:
+                    hi[i] = v
+                total[i] += v
+        self.last = value
+        self.count += 1
+
+    def summary(self, quantize=None):
+        """TSL struct: members 1-4 min/max/mean/last of the first component, 5-8 of the second
+        and so on, then the sample count"""
+        if quantize is None:
+            quantize = lambda v: v
+        struct = {}
+        member = 1
+        for i in range(len(self.min)):
+            struct[member] = quantize(self.min[i])
+            struct[member + 1] = quantize(self.max[i])
+            struct[member + 2] = quantize(self.sum[i] / self.count)
+            struct[member + 3] = quantize(self.last[i])
+            member += 4
+        struct[member] = self.count
+        return struct
+
+
+class Aggregator(object):
+    """Folds samples of selected TSL ids into accumulators, flushed as one summary per interval.
+
+    ``fields`` maps a sampled TSL id to the (struct) TSL id its summary is reported under.
+    """
+
+    def __init__(self, fields=None, interval_s=60):
+        self.fields = {}
+        self.interval_s = interval_s
+        self._acc = {}
+        self.load(fields, interval_s)
+
+    def load(self, fields=None, interval_s=None):
+        """Replace the field mapping (ids may be strings), accumulators of kept ids survive"""
+        mapping = {}
+        for tsl_id, summary_id in (fields or {}).items():
+            mapping[int(tsl_id)] = int(summary_id)
+        for tsl_id in list(self._acc):
+            if tsl_id not in mapping:
+                del self._acc[tsl_id]
+        self.fields = mapping
+        if interval_s is not None:
+            self.interval_s = interval_s
+
+    def wants(self, tsl_id):
+        return tsl_id in self.fields
+
+    def add(self, tsl_id, value):
+        acc = self._acc.get(tsl_id)
+        if acc is None:
+            acc = self._acc[tsl_id] = Accumulator()
+        acc.add(value)
+
+    def flush(self, policy=None):
+        """Return {summary id: struct} of every field with samples and start a new interval.
+        ``policy`` (ReportPolicy) supplies the per-field quantization."""
+        data = {}
+        for tsl_id, acc in self._acc.items():
+            if acc.count == 0:
+                continue
+            quantize = None
+            if policy is not None:
+                scale = policy.get(tsl_id).scale
+                quantize = lambda v, scale=scale: FieldPolicy._quantize(v, scale)
+            data[self.fields[tsl_id]] = acc.summary(quantize)
+            acc.reset()
+        return data
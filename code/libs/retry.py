@@ -0,0 +1,68 @@
+import utime
+import urandom
+
+
+class Backoff(object):
+    """Exponential retry delay with jitter: each failure doubles (``factor``) the ceiling up to
+    ``max_ms``, the returned delay is drawn from [ceiling * (1 - jitter), ceiling] so that
+    devices losing coverage together do not retry in lockstep."""
+
+    def __init__(self, base_ms=1000, max_ms=5 * 60 * 1000, factor=2, jitter=0.5):
+        self.base_ms = base_ms
+        self.max_ms = max_ms
+        self.factor = factor
+        self.jitter = jitter
+        self.attempts = 0
+
+    def reset(self):
+        self.attempts = 0
+
+    def next_delay_ms(self):
+        ceiling = min(self.max_ms, self.base_ms * self.factor ** self.attempts)
+        if ceiling < self.max_ms:
+            self.attempts += 1
+        spread = int(ceiling * self.jitter)
+        if spread <= 0:
+            return int(ceiling)
+        return int(ceiling) - urandom.randint(0, spread)
+
+
+class CircuitBreaker(object):
+    """Stops calls after ``failure_threshold`` consecutive failures, lets a single probe through
+    once ``reset_timeout_ms`` passed, and closes again on its success."""
+
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+    def __init__(self, failure_threshold=3, reset_timeout_ms=30 * 1000):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_ms = reset_timeout_ms
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_ms = None
+
+    def allow(self):
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and utime.ticks_diff(utime.ticks_ms(), self.opened_ms) >= self.reset_timeout_ms:
+            self.state = self.HALF_OPEN
+            return True
+        return False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_ms = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self):
+        self.state = self.OPEN
+        self.opened_ms = utime.ticks_ms()
+
+    def reset(self):
+        self.record_success()
@@ -0,0 +1,81 @@
+import utime
+
+
+class _Task(object):
+
+    def __init__(self, name, period_ms, callback, deadline):
+        self.name = name
+        self.period_ms = period_ms
+        self.callback = callback
+        self.deadline = deadline
+
+    def __repr__(self):
+        return '{}(name={}, period_ms={})'.format(type(self).__name__, self.name, self.period_ms)
+
+
+class RateScheduler(object):
+    """Periodic tasks run on the caller's thread in deadline order.
+
+    ``run_pending`` executes every due task back to back and returns the time to the next
+    deadline, so the caller only sleeps while nothing is due. Deadlines use ticks arithmetic
+    and survive the ticks_ms wrap.
+    """
+
+    def __init__(self):
+        self.__tasks = []
+
+    def __iter__(self):
+        return iter(self.__tasks)
+
+    def get(self, name):
+        for task in self.__tasks:
+            if task.name == name:
+                return task
+
+    def add(self, name, period_ms, callback, delay_ms=0):
+        if period_ms <= 0:
+            raise ValueError('`period_ms` should be greater than 0')
+        self.remove(name)
+        self.__tasks.append(_Task(name, period_ms, callback, utime.ticks_add(utime.ticks_ms(), delay_ms)))
+
+    def remove(self, name):
+        task = self.get(name)
+        if task is not None:
+            self.__tasks.remove(task)
+
+    def set_period(self, name, period_ms):
+        """Change a task's period, a shorter period takes effect immediately"""
+        task = self.get(name)
+        if task is None or period_ms <= 0 or period_ms == task.period_ms:
+            return False
+        now = utime.ticks_ms()
+        if utime.ticks_diff(task.deadline, now) > period_ms:
+            task.deadline = utime.ticks_add(now, period_ms)
+        task.period_ms = period_ms
+        return True
+
+    def next_due(self, now=None):
+        """Return (task, ms until its deadline) for the earliest task, (None, None) when empty"""
+        if now is None:
+            now = utime.ticks_ms()
+        earliest = None
+        wait = None
+        for task in self.__tasks:
+            diff = utime.ticks_diff(task.deadline, now)
+            if earliest is None or diff < wait:
+                earliest = task
+                wait = diff
+        return earliest, wait
+
+    def run_pending(self):
+        """Run all due tasks, return ms until the next deadline (None when there are no tasks)"""
+        while True:
+            now = utime.ticks_ms()
+            task, wait = self.next_due(now)
+            if task is None or wait > 0:
+                return wait
+            task.deadline = utime.ticks_add(task.deadline, task.period_ms)
+            # overran by more than a period: skip the missed runs instead of bursting
+            if utime.ticks_diff(task.deadline, now) <= 0:
+                task.deadline = utime.ticks_add(now, task.period_ms)
+            task.callback()
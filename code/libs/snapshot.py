@@ -0,0 +1,62 @@
+import utime
+
+
+class Snapshot(object):
+    """Latest value and sample time per TSL id, one writer and any number of readers.
+
+    The writer fills the back buffer and swaps it in with a single assignment, so readers
+    see either the previous or the new sample set, never half of one. Readers take no
+    lock. ``_seq`` is odd while a write is in progress, a reader retries if the buffer it
+    read from was reused by a later write meanwhile.
+    """
+
+    READ_RETRIES = 3
+
+    def __init__(self):
+        self.__buffers = ({}, {})
+        self.__front = 0
+        self._seq = 0
+
+    def __len__(self):
+        return len(self.__buffers[self.__front])
+
+    def update(self, values, now=None):
+        """Store ``{tsl_id: value}`` of one sample, all stamped with the same time"""
+        if not values:
+            return
+        if now is None:
+            now = utime.ticks_ms()
+        self._seq += 1
+        front = self.__buffers[self.__front]
+        back = self.__buffers[self.__front ^ 1]
+        back.clear()
+        back.update(front)
+        for tsl_id, value in values.items():
+            back[tsl_id] = (value, now)
+        self.__front ^= 1
+        self._seq += 1
+
+    def get(self, tsl_id):
+        """Return (value, ticks_ms) or None"""
+        return self.__buffers[self.__front].get(tsl_id)
+
+    def read(self, ids=None, max_age_ms=None, now=None):
+        """Return {tsl_id: value} of ``ids`` (all when None) sampled within ``max_age_ms``,
+        missing and stale ids are left out"""
+        for _ in range(self.READ_RETRIES):
+            seq = self._seq
+            buffer = self.__buffers[self.__front]
+            if now is None:
+                now = utime.ticks_ms()
+            values = {}
+            for tsl_id in (list(buffer) if ids is None else ids):
+                entry = buffer.get(tsl_id)
+                if entry is None:
+                    continue
+                if max_age_ms is not None and utime.ticks_diff(now, entry[1]) > max_age_ms:
+                    continue
+                values[tsl_id] = entry[0]
+            # the buffer is rewritten by the write after the one that retired it
+            if self._seq <= (seq | 1) + 1:
+                return values
+        return values
@@ -0,0 +1,234 @@
+"""Declared TSL model and compact payload encoders.
+
+A ``TslField`` states what an id carries: a scalar or a struct of members 1..n, and the
+fixed-point ``scale`` its values are sent with (``round(value * scale)``, a power of ten).
+
+``BinaryEncoder`` frames a report as::
+
+    version(1) count(1) { id(1) value }*
+
+where a scalar value is a big endian signed integer of the field's ``width`` bytes and a
+struct value is its member count(1) followed by one such integer per member. ``JsonEncoder``
+writes the same report as compact JSON, values rounded to the field scale. Both fill a buffer allocated
+once and return a memoryview into it, valid until the next ``encode``. ``decode`` reverses
+the binary frame and runs unchanged on a host.
+"""
+
+TSL_SCALAR = 'scalar'
+TSL_STRUCT = 'struct'
+
+TSL_BINARY_VERSION = 1
+
+
+class TslField(object):
+
+    def __init__(self, id, name, type=TSL_SCALAR, scale=1, width=2, members=None, unit=''):
+        """
+        :param width: bytes per (member) value in the binary frame, 1, 2 or 4
+        :param members: member names of a struct, None when the member count varies
+        """
+        if type not in (TSL_SCALAR, TSL_STRUCT):
+            raise ValueError('unknown TSL type: {}'.format(type))
+        if width not in (1, 2, 4):
+            raise ValueError('unsupported width: {}'.format(width))
+        if not 0 < id < 256:
+            raise ValueError('TSL id out of range: {}'.format(id))
+        self.id = id
+        self.name = name
+        self.type = type
+        self.scale = scale
+        self.width = width
+        self.members = members
+        self.unit = unit
+        self.decimals = len(str(scale)) - 1
+        self.limit = 1 << (8 * width - 1)
+
+    def __repr__(self):
+        return '{}(id={}, name={}, type={}, scale={})'.format(type(self).__name__, self.id, self.name, self.type, self.scale)
+
+    def fixed(self, value):
+        """``value`` as a fixed-point integer, ValueError when it does not fit ``width``"""
+        n = value * self.scale
+        n = int(n + 0.5) if n >= 0 else -int(0.5 - n)
+        if not -self.limit <= n < self.limit:
+            raise ValueError('TSL {} value {} exceeds {} bytes'.format(self.id, value, self.width))
+        return n
+
+
+class TslModel(object):
+
+    def __init__(self, fields=()):
+        self.__fields = {}
+        for field in fields:
+            self.register(field)
+
+    def __iter__(self):
+        return iter(self.__fields.values())
+
+    def __contains__(self, tsl_id):
+        return tsl_id in self.__fields
+
+    def register(self, field):
+        if field.id in self.__fields:
+            raise ValueError('TSL id {} already declared'.format(field.id))
+        self.__fields[field.id] = field
+
+    def get(self, tsl_id):
+        return self.__fields.get(tsl_id)
+
+    def covers(self, data):
+        """True when every id of a report is declared"""
+        for tsl_id in data:
+            if tsl_id not in self.__fields:
+                return False
+        return True
+
+
+class BinaryEncoder(object):
+
+    def __init__(self, model, size=256):
+        self.model = model
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+
+    def __put(self, pos, n, width):
+        buffer = self.buffer
+        if pos + width > len(buffer):
+            raise ValueError('report exceeds {} bytes'.format(len(buffer)))
+        shift = 8 * (width - 1)
+        while shift >= 0:
+            buffer[pos] = (n >> shift) & 0xFF
+            pos += 1
+            shift -= 8
+        return pos
+
+    def encode(self, data):
+        """Frame ``{tsl_id: value}``, KeyError for undeclared ids, ValueError on overflow"""
+        if len(data) > 255:
+            raise ValueError('too many fields: {}'.format(len(data)))
+        pos = self.__put(0, TSL_BINARY_VERSION, 1)
+        pos = self.__put(pos, len(data), 1)
+        for tsl_id, value in data.items():
+            field = self.model.get(tsl_id)
+            if field is None:
+                raise KeyError(tsl_id)
+            pos = self.__put(pos, tsl_id, 1)
+            if field.type == TSL_STRUCT:
+                count = len(value)
+                pos = self.__put(pos, count, 1)
+                for member in range(1, count + 1):
+                    pos = self.__put(pos, field.fixed(value[member]), field.width)
+            else:
+                pos = self.__put(pos, field.fixed(value), field.width)
+        return self.view[:pos]
+
+
+class JsonEncoder(object):
+
+    def __init__(self, model, size=512):
+        self.model = model
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.__digits = bytearray(12)
+        # '"<id>":' of every declared field, built once
+        self.__keys = {}
+        for field in model:
+            self.__keys[field.id] = '"{}":'.format(field.id).encode()
+        self.__members = [b''] + ['"{}":'.format(i).encode() for i in range(1, 33)]
+
+    def __put(self, pos, data):
+        end = pos + len(data)
+        if end > len(self.buffer):
+            raise ValueError('report exceeds {} bytes'.format(len(self.buffer)))
+        self.buffer[pos:end] = data
+        return end
+
+    def __put_fixed(self, pos, n, decimals):
+        """Write integer ``n`` / 10**decimals without building a string, trailing zeros dropped"""
+        digits = self.__digits
+        count = 0
+        negative = n < 0
+        if negative:
+            n = -n
+        while n or count <= decimals:
+            digits[count] = 0x30 + n % 10
+            n //= 10
+            count += 1
+        skip = 0
+        while skip < decimals and digits[skip] == 0x30:
+            skip += 1
+        if pos + count + 2 > len(self.buffer):
+            raise ValueError('report exceeds {} bytes'.format(len(self.buffer)))
+        buffer = self.buffer
+        if negative:
+            buffer[pos] = 0x2D
+            pos += 1
+        while count > skip:
+            count -= 1
+            buffer[pos] = digits[count]
+            pos += 1
+            if count == decimals and count > skip:
+                buffer[pos] = 0x2E
+                pos += 1
+        return pos
+
+    def encode(self, data):
+        """Same contract as BinaryEncoder.encode, output is a JSON object"""
+        pos = self.__put(0, b'{')
+        first = True
+        for tsl_id, value in data.items():
+            field = self.model.get(tsl_id)
+            if field is None:
+                raise KeyError(tsl_id)
+            if not first:
+                pos = self.__put(pos, b',')
+            first = False
+            pos = self.__put(pos, self.__keys[tsl_id])
+            if field.type == TSL_STRUCT:
+                pos = self.__put(pos, b'{')
+                for member in range(1, len(value) + 1):
+                    if member > 1:
+                        pos = self.__put(pos, b',')
+                    pos = self.__put(pos, self.__members[member] if member < len(self.__members) else '"{}":'.format(member).encode())
+                    pos = self.__put_fixed(pos, field.fixed(value[member]), field.decimals)
+                pos = self.__put(pos, b'}')
+            else:
+                pos = self.__put_fixed(pos, field.fixed(value), field.decimals)
+        pos = self.__put(pos, b'}')
+        return self.view[:pos]
+
+
+def _unfixed(field, data, pos):
+    n = 0
+    for i in range(field.width):
+        n = (n << 8) | data[pos + i]
+    if n & field.limit:
+        n -= field.limit << 1
+    return n if field.scale == 1 else n / field.scale
+
+
+def decode(model, data):
+    """Binary frame back to ``{tsl_id: value}``, structs as ``{member: value}``"""
+    if not data or data[0] != TSL_BINARY_VERSION:
+        raise ValueError('unsupported TSL frame version')
+    count = data[1]
+    pos = 2
+    result = {}
+    for _ in range(count):
+        tsl_id = data[pos]
+        pos += 1
+        field = model.get(tsl_id)
+        if field is None:
+            raise ValueError('undeclared TSL id {}'.format(tsl_id))
+        if field.type == TSL_STRUCT:
+            members = data[pos]
+            pos += 1
+            value = {}
+            for member in range(1, members + 1):
+                value[member] = _unfixed(field, data, pos)
+                pos += field.width
+        else:
+            value = _unfixed(field, data, pos)
+            pos += field.width
+        result[tsl_id] = value
+    return result
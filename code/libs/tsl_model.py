@@ -0,0 +1,26 @@
+from usr.libs.tsl import TslModel, TslField, TSL_STRUCT
+
+
+# TSL ids of the sensor hub product model
+TSL_TEMP1 = 3       # SHTC3
+TSL_HUMI = 4
+TSL_TEMP2 = 5       # LPS22HB
+TSL_PRESS = 6
+TSL_RGB = 7         # TCS34725
+TSL_GYRO = 9        # ICM20948
+TSL_ACCEL = 10
+TSL_VIBRATION = 11  # ICM20948 FIFO window features
+
+XYZ = ('x', 'y', 'z')
+
+MODEL = TslModel((
+    TslField(TSL_TEMP1, 'temp1', scale=100, unit='°C'),
+    TslField(TSL_HUMI, 'humi', scale=100, unit='%RH'),
+    TslField(TSL_TEMP2, 'temp2', scale=100, unit='°C'),
+    TslField(TSL_PRESS, 'press', scale=100, width=4, unit='hPa'),
+    TslField(TSL_RGB, 'rgb', TSL_STRUCT, members=('r', 'g', 'b')),
+    TslField(TSL_GYRO, 'gyro', TSL_STRUCT, scale=1000, members=XYZ, unit='rad/s'),
+    TslField(TSL_ACCEL, 'accel', TSL_STRUCT, scale=1000, members=XYZ, unit='m/s²'),
+    # rms x/y/z, peak, crest factor, then frequency/amplitude pairs
+    TslField(TSL_VIBRATION, 'vibration', TSL_STRUCT, scale=10000, width=4),
+))
@@ -0,0 +1,132 @@
+"""Aligned transmission windows: queued uplink data is released together, so the radio wakes
+once per window instead of once per producer.
+
+Windows start every ``period_ms`` on a grid shifted by ``offset_ms`` and stay open ``open_ms``,
+the time the radio stays connected after a send anyway (RRC inactivity / PSM active timer);
+data queued while a window is open goes out at once. With eDRX or PSM the period is rounded up
+to a multiple of the paging cycle / TAU, so windows fall on wake-ups the modem does anyway.
+
+Every record carries an urgency::
+
+    TX_URGENT      opens a window immediately, everything pending goes along
+    TX_NORMAL      waits for the next window
+    TX_BACKGROUND  rides along with normal data, opens a window on its own only after
+                   waiting ``background_hold_ms``
+"""
+
+import utime
+
+
+TX_URGENT = 0
+TX_NORMAL = 1
+TX_BACKGROUND = 2
+
+
+class TxWindow(object):
+
+    def __init__(self, period_ms, offset_ms=0, open_ms=0, now=None):
+        if period_ms <= 0:
+            raise ValueError('window period must be positive')
+        self.period_ms = period_ms
+        self.offset_ms = offset_ms % period_ms
+        self.open_ms = min(open_ms, period_ms)
+        self._epoch = utime.ticks_ms() if now is None else now
+        self._forced_ms = None
+
+    @classmethod
+    def from_config(cls, period_s, offset_s=0, open_s=0, edrx_cycle_s=0, psm_tau_s=0, now=None):
+        """Period rounded up to a multiple of the radio's own cycle, eDRX first as it is shorter"""
+        cycle_ms = int((edrx_cycle_s or psm_tau_s) * 1000)
+        period_ms = int(period_s * 1000)
+        if cycle_ms > 0:
+            period_ms = max(1, (period_ms + cycle_ms - 1) // cycle_ms) * cycle_ms
+        return cls(period_ms, int(offset_s * 1000), int(open_s * 1000), now)
+
+    def _phase(self, now):
+        elapsed = utime.ticks_diff(now, self._epoch)
+        # keep the epoch recent, ticks differences only hold for half the wrap period
+        if elapsed >= self.period_ms:
+            self._epoch = utime.ticks_add(self._epoch, elapsed - elapsed % self.period_ms)
+            elapsed %= self.period_ms
+        return (elapsed - self.offset_ms) % self.period_ms
+
+    def open(self, now=None):
+        """Start a window out of schedule, e.g. for urgent data or a fresh connection"""
+        self._forced_ms = utime.ticks_ms() if now is None else now
+
+    def forced(self, now=None):
+        """True while a window started by ``open`` lasts"""
+        if self._forced_ms is not None:
+            if utime.ticks_diff(utime.ticks_ms() if now is None else now, self._forced_ms) < max(1, self.open_ms):
+                return True
+            self._forced_ms = None
+        return False
+
+    def is_open(self, now=None):
+        if now is None:
+            now = utime.ticks_ms()
+        return self.forced(now) or self._phase(now) < max(1, self.open_ms)
+
+    def wait_ms(self, now=None):
+        """ms until the next window opens, 0 while one is open"""
+        if now is None:
+            now = utime.ticks_ms()
+        if self.is_open(now):
+            return 0
+        return self.period_ms - self._phase(now)
+
+
+class TxScheduler(object):
+    """Decides when queued records are released to the radio"""
+
+    def __init__(self, window, background_hold_ms=0):
+        self.window = window
+        self.background_hold_ms = background_hold_ms
+        self._normal = False
+        self._background_ms = None  # queued time of the oldest held background record
+
+    def pending(self):
+        return self._normal or self._background_ms is not None
+
+    def queued(self, urgency, now=None):
+        """Note a record waiting for release"""
+        if now is None:
+            now = utime.ticks_ms()
+        if urgency == TX_URGENT:
+            self._normal = True
+            self.window.open(now)
+        elif urgency == TX_BACKGROUND:
+            if self._background_ms is None:
+                self._background_ms = now
+        else:
+            self._normal = True
+
+    def released(self):
+        """Everything queued so far went out"""
+        self._normal = False
+        self._background_ms = None
+
+    def __background_due(self, now):
+        return self._background_ms is not None and \
+            utime.ticks_diff(now, self._background_ms) >= self.background_hold_ms
+
+    def due(self, now=None):
+        """True when pending records should be sent now"""
+        if now is None:
+            now = utime.ticks_ms()
+        if not self.pending() or not self.window.is_open(now):
+            return False
+        return self._normal or self.__background_due(now) or self.window.forced(now)
+
+    def wait_ms(self, now=None):
+        """ms until ``due`` may turn true, None when nothing is pending"""
+        if now is None:
+            now = utime.ticks_ms()
+        if not self.pending():
+            return None
+        if not self._normal:
+            hold_ms = self.background_hold_ms - utime.ticks_diff(now, self._background_ms)
+            if hold_ms > 0 and not self.window.forced(now):
+                # the first window after the hold expires
+                return hold_ms + self.window.wait_ms(utime.ticks_add(now, hold_ms))
+        return self.window.wait_ms(now)
@@ -0,0 +1,140 @@
+"""Vibration feature extraction over fixed-size accelerometer windows.
+
+Buffers are allocated once per analyzer; a window is reduced to per-axis RMS, peak and
+crest factor plus the dominant spectral peaks of the strongest axis, so the uplink size
+does not depend on the sample rate.
+"""
+
+import math
+from array import array
+
+
+def fft(re, im):
+    """In-place iterative radix-2 FFT, ``len(re)`` must be a power of two."""
+    n = len(re)
+    # bit reversal permutation
+    j = 0
+    for i in range(1, n):
+        bit = n >> 1
+        while j & bit:
+            j ^= bit
+            bit >>= 1
+        j |= bit
+        if i < j:
+            re[i], re[j] = re[j], re[i]
+            im[i], im[j] = im[j], im[i]
+    size = 2
+    while size <= n:
+        half = size >> 1
+        step = -2 * math.pi / size
+        wr_step = math.cos(step)
+        wi_step = math.sin(step)
+        wr = 1.0
+        wi = 0.0
+        for k in range(half):
+            for start in range(k, n, size):
+                m = start + half
+                tr = wr * re[m] - wi * im[m]
+                ti = wr * im[m] + wi * re[m]
+                re[m] = re[start] - tr
+                im[m] = im[start] - ti
+                re[start] += tr
+                im[start] += ti
+            wr, wi = wr * wr_step - wi * wi_step, wr * wi_step + wi * wr_step
+        size <<= 1
+
+
+class VibrationAnalyzer(object):
+
+    def __init__(self, size=256, sample_rate=200.0, peaks=3, scale=1.0):
+        """
+        :param size: window length in samples, power of two
+        :param sample_rate: Hz
+        :param peaks: number of dominant spectral peaks to report
+        :param scale: raw sample to physical unit factor (e.g. m/s² per LSB)
+        """
+        if size < 4 or size & (size - 1):
+            raise ValueError('window size must be a power of two, got {}'.format(size))
+        self.size = size
+        self.sample_rate = sample_rate
+        self.peaks = peaks
+        self.scale = scale
+        self.re = array('f', [0.0] * size)
+        self.im = array('f', [0.0] * size)
+        # Hann window, coherent gain 0.5
+        self.window = array('f', [0.5 - 0.5 * math.cos(2 * math.pi * i / (size - 1)) for i in range(size)])
+
+    def axis_stats(self, samples, axis, count):
+        """Return (mean, rms, peak) of the AC part of one axis of interleaved xyz ``samples``."""
+        total = 0
+        for j in range(axis, count * 3, 3):
+            total += samples[j]
+        mean = total / count
+        sq = 0.0
+        peak = 0.0
+        for j in range(axis, count * 3, 3):
+            v = samples[j] - mean
+            sq += v * v
+            if v > peak:
+                peak = v
+            elif -v > peak:
+                peak = -v
+        return mean, math.sqrt(sq / count), peak
+
+    def spectrum_peaks(self, samples, axis, mean):
+        """FFT one axis of a full window, return [(freq Hz, amplitude)] of the strongest local maxima."""
+        size = self.size
+        re = self.re
+        im = self.im
+        window = self.window
+        j = axis
+        for i in range(size):
+            re[i] = (samples[j] - mean) * window[i]
+            im[i] = 0.0
+            j += 3
+        fft(re, im)
+        amp_scale = 4.0 / size * self.scale  # 2/N single-sided, / 0.5 Hann coherent gain
+        bin_hz = self.sample_rate / size
+        top = []
+        prev = 0.0
+        curr = math.sqrt(re[1] * re[1] + im[1] * im[1])
+        for k in range(1, size // 2):
+            nxt = math.sqrt(re[k + 1] * re[k + 1] + im[k + 1] * im[k + 1])
+            if curr >= prev and curr > nxt:
+                if len(top) < self.peaks:
+                    top.append((curr, k))
+                    top.sort(reverse=True)
+                elif curr > top[-1][0]:
+                    top[-1] = (curr, k)
+                    top.sort(reverse=True)
+            prev = curr
+            curr = nxt
+        return [(k * bin_hz, a * amp_scale) for a, k in top]
+
+    def compute(self, samples, count=None):
+        """Features of one window of interleaved xyz ``samples``.
+
+        Returns a TSL struct dict: 1-3 RMS x/y/z, 4 peak and 5 crest factor of the strongest
+        axis, then frequency/amplitude pairs of its dominant spectral peaks from member 6 on.
+        Spectral members are only present for a full window.
+        """
+        if count is None:
+            count = len(samples) // 3
+        scale = self.scale
+        features = {}
+        best = None
+        for axis in range(3):
+            mean, rms, peak = self.axis_stats(samples, axis, count)
+            features[axis + 1] = round(rms * scale, 4)
+            if best is None or rms > best[2]:
+                best = (axis, mean, rms, peak)
+        axis, mean, rms, peak = best
+        features[4] = round(peak * scale, 4)
+        features[5] = round(peak / rms, 3) if rms > 0 else 0.0
+        if count >= self.size:
+            member = 6
+            for freq, amp in self.spectrum_peaks(samples, axis, mean):
+                features[member] = round(freq, 2)
+                features[member + 1] = round(amp, 4)
+                member += 2
+        return features
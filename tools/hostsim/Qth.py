@@ -0,0 +1,90 @@
+"""Host replacement for the device-only ``usr.Qth`` SDK, backed by a ``Broker``.
+
+Installed as ``usr.Qth`` by ``hostsim.install``. Payloads are serialized the way they go on
+the wire (TSL as JSON keyed by id) so the broker can account bytes.
+"""
+
+import json
+
+from .broker import Broker
+
+
+_broker = Broker()
+_product = {}
+_callbacks = {}
+
+
+def attach(broker):
+    global _broker
+    _broker = broker
+    _broker.bind(_callbacks)
+
+
+def broker():
+    return _broker
+
+
+def init():
+    return True
+
+
+def setProductInfo(pk, ps):
+    _product['pk'] = pk
+    _product['ps'] = ps
+    return True
+
+
+def setServer(url):
+    _product['server'] = url
+    return True
+
+
+def setEventCb(callbacks):
+    _callbacks.clear()
+    _callbacks.update(callbacks)
+    _broker.bind(_callbacks)
+    return True
+
+
+def start():
+    _broker.start()
+    return True
+
+
+def stop():
+    _broker.stop()
+    return True
+
+
+def state():
+    return _broker.connected()
+
+
+def _encode(value):
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+def sendTsl(mode, value):
+    return _broker.publish('tsl', value, _encode(value))
+
+
+def sendTrans(mode, value):
+    body = bytes(value) if isinstance(value, (bytes, bytearray, memoryview)) else str(value).encode()
+    return _broker.publish('trans', body, body)
+
+
+def sendOutsideLocation(data):
+    return _broker.publish('location', data, str(data).encode())
+
+
+def ackTsl(mode, value, pkgId):
+    _broker.ack(pkgId, value)
+    return _broker.publish('tsl/ack', value, _encode(value))
+
+
+def ackTslServer(mode, serverId, value, pkgId):
+    return _broker.publish('tsl/server', value, _encode(value))
+
+
+def otaRequest(*args):
+    return True
@@ -0,0 +1,24 @@
+"""Run the application's uplink path on a Linux host.
+
+``install()`` registers CPython stand-ins for the QuecPython modules, an emulated sensor
+bus and a ``Qth`` replacement backed by an in-process ``Broker``; afterwards ``usr.*``
+imports the unmodified ``code/`` tree. ``bench`` drives the whole application through it.
+"""
+
+import os
+import sys
+
+from . import shims, i2c
+
+
+CODE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'code')
+
+
+def install(root, code_dir=CODE_DIR, drift=1.0, track=None):
+    """Make ``usr`` importable, files the application writes below ``/usr`` land in ``root``"""
+    shims.install(code_dir, root, i2c.I2C, track)
+    i2c.I2C.attach(i2c.Shtc3(drift), i2c.Lps22hb(drift), i2c.Tcs34725(drift))
+    from . import Qth
+    sys.modules['usr.Qth'] = Qth
+    sys.modules['usr'].Qth = Qth
+    return Qth
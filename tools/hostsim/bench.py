@@ -0,0 +1,207 @@
+"""Uplink benchmark: the whole application against an in-process broker.
+
+    python -m tools.hostsim.bench --duration 60 --latency 20,80 --loss 0.02 --outage 20:10
+
+Sensor, GNSS and LBS services produce through ``QthClient`` exactly as on the device. The
+report lists delivered messages/s, p50/p99 of the blocking send call and of the end-to-end
+delay (queued by a service -> acknowledged by the broker), and bytes on the wire.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+from . import install
+from .broker import Broker
+
+
+OUTBOX_TSL = 1  # QthClient record kinds
+OUTBOX_LBS = 2
+OUTBOX_GNSS = 3
+
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q / 100.0 * (len(values) - 1)))))
+    return values[index]
+
+
+def parse_outage(text):
+    start, duration = text.split(':')
+    return float(start), float(duration)
+
+
+class Recorder(object):
+    """Stamps every record a service queues, matched against broker deliveries afterwards"""
+
+    def __init__(self, client):
+        self.lock = threading.Lock()
+        self.queued = {OUTBOX_TSL: 0, OUTBOX_LBS: 0, OUTBOX_GNSS: 0}
+        self.tsl = {}  # tsl id -> [queued at]
+        self.other = {OUTBOX_LBS: [], OUTBOX_GNSS: []}
+        enqueue = client._enqueue
+
+        def stamped(kind, payload, *args):
+            now = time.monotonic()
+            with self.lock:
+                self.queued[kind] += 1
+                if kind == OUTBOX_TSL:
+                    for tsl_id in payload:
+                        self.tsl.setdefault(int(tsl_id), []).append(now)
+                else:
+                    self.other[kind].append(now)
+            return enqueue(kind, payload, *args)
+
+        client._enqueue = stamped
+
+    def delays(self, deliveries, decode):
+        """End-to-end seconds per queued value; a TSL value superseded before upload counts
+        until the delivery of its id that replaced it"""
+        delays = []
+        for delivery in deliveries:
+            if delivery.topic in ('tsl', 'trans'):
+                payload = delivery.payload if delivery.topic == 'tsl' else decode(delivery.payload)
+                for tsl_id in payload:
+                    stamps = self.tsl.get(int(tsl_id), [])
+                    while stamps and stamps[0] <= delivery.delivered:
+                        delays.append(delivery.delivered - stamps.pop(0))
+            elif delivery.topic == 'location':
+                kind = OUTBOX_LBS if str(delivery.payload).startswith('$LBS') else OUTBOX_GNSS
+                stamps = self.other[kind]
+                if stamps and stamps[0] <= delivery.delivered:
+                    delays.append(delivery.delivered - stamps.pop(0))
+        return delays
+
+
+def wakeups(deliveries, tail_s):
+    """Sends that found the radio idle, i.e. more than the RRC tail after the previous one"""
+    count = 0
+    awake_until = None
+    for delivery in sorted(deliveries, key=lambda d: d.sent):
+        if awake_until is None or delivery.sent > awake_until:
+            count += 1
+        awake_until = max(awake_until or 0, delivery.delivered + tail_s)
+    return count
+
+
+def run(args):
+    root = tempfile.mkdtemp(prefix='hostsim-')
+    try:
+        Qth = install(root, drift=args.drift)
+        broker = Broker(
+            latency_ms=args.latency,
+            loss=args.loss,
+            outages=args.outage,
+            seed=args.seed,
+        )
+        Qth.attach(broker)
+
+        config = {
+            'QTH_PRODUCT_KEY': 'host',
+            'QTH_PRODUCT_SECRET': 'host',
+            'QTH_SERVER': 'mqtt://127.0.0.1:1883',
+            'OUTBOX_PATH': os.path.join(root, 'outbox'),
+            'SENSOR_RATES_HZ': {name: hz * args.rate for name, hz in
+                                (('lps22hb', 1), ('tcs34725', 1), ('shtc3', 0.1))},
+        }
+        for item in args.config:
+            key, value = item.split('=', 1)
+            config[key] = json.loads(value)
+        os.makedirs(os.path.join(root, 'usr'), exist_ok=True)
+        with open(os.path.join(root, 'usr', 'config.json'), 'w') as f:
+            json.dump(config, f)
+
+        from usr.libs.logging import BasicConfig
+        BasicConfig.update(debug=False, level=args.log_level)
+        import usr.main
+        app = usr.main.create_app(name='hostsim', config_path='/usr/config.json')
+        client = app.qth_client
+        recorder = Recorder(client)
+        app.run()
+
+        started = time.monotonic()
+        next_lbs = started + args.lbs_period if args.lbs_period else None
+        next_read = started + args.read_period if args.read_period else None
+        while time.monotonic() - started < args.duration:
+            time.sleep(0.1)
+            now = time.monotonic()
+            if next_lbs is not None and now >= next_lbs:
+                app.lbs_service.refresh()
+                next_lbs += args.lbs_period
+            if next_read is not None and now >= next_read:
+                broker.read_tsl([3, 4, 5, 6, 7])
+                next_read += args.read_period
+        elapsed = time.monotonic() - started
+
+        from usr.libs import tsl
+        from usr.libs.tsl_model import MODEL
+
+        def decode(frame):
+            # sendTrans carries either encoding of the TSL model
+            if frame[:1] == b'{':
+                return json.loads(frame)
+            return tsl.decode(MODEL, frame)
+
+        report(args, broker, client, recorder, elapsed, decode)
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def report(args, broker, client, recorder, elapsed, decode):
+    deliveries = list(broker.delivered)
+    uplink = [d for d in deliveries if d.topic in ('tsl', 'trans', 'location')]
+    payload = sum([d.size for d in uplink])
+    delays = [d * 1000 for d in recorder.delays(uplink, decode)]
+    queued = recorder.queued
+    print('duration          {:.1f} s, latency {}-{} ms, loss {:.1%}, outages {}'.format(
+        elapsed, args.latency[0], args.latency[1], args.loss, args.outage or 'none'))
+    print('queued records    tsl {}, lbs {}, gnss {}'.format(queued[OUTBOX_TSL], queued[OUTBOX_LBS], queued[OUTBOX_GNSS]))
+    print('uplink messages   {} ({:.2f} msg/s)'.format(len(uplink), len(uplink) / elapsed))
+    print('wire bytes        {} ({:.1f} B/msg, {:.1f} B/s)'.format(
+        payload, payload / len(uplink) if uplink else 0, payload / elapsed))
+    print('radio wake-ups    {} ({:.1f}/h, {:.0f} s RRC tail)'.format(
+        wakeups(uplink, args.rrc_tail), wakeups(uplink, args.rrc_tail) * 3600 / elapsed, args.rrc_tail))
+    print('send call ms      p50 {:.1f}, p99 {:.1f} over {} calls'.format(
+        percentile(broker.send_ms, 50), percentile(broker.send_ms, 99), len(broker.send_ms)))
+    print('end-to-end ms     p50 {:.1f}, p99 {:.1f} over {} values'.format(
+        percentile(delays, 50), percentile(delays, 99), len(delays)))
+    print('send failures     {} while disconnected, {} lost'.format(broker.rejected, broker.failed))
+    print('outbox            {} records left, {} dropped'.format(len(client.outbox), client.outbox.dropped))
+    if broker.acks:
+        answered = [a[1] * 1000 for a in broker.acks]
+        print('readTsl           {} answered, p50 {:.1f} ms, p99 {:.1f} ms'.format(
+            len(answered), percentile(answered, 50), percentile(answered, 99)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run')
+    parser.add_argument('--latency', type=lambda s: tuple(float(v) for v in s.split(',')), default=(20, 80),
+                        help='min,max ms a send blocks for')
+    parser.add_argument('--loss', type=float, default=0.0, help='probability a connected send fails')
+    parser.add_argument('--outage', type=parse_outage, action='append', default=[],
+                        help='START:DURATION seconds without connection, repeatable')
+    parser.add_argument('--rate', type=float, default=1.0, help='multiplier on the default sensor rates')
+    parser.add_argument('--drift', type=float, default=1.0, help='random walk step of emulated sensor values')
+    parser.add_argument('--lbs-period', type=float, default=0, help='seconds between LBS refresh requests')
+    parser.add_argument('--read-period', type=float, default=0, help='seconds between cloud readTsl requests')
+    parser.add_argument('--rrc-tail', type=float, default=5, help='seconds the radio stays up after a send')
+    parser.add_argument('--config', action='append', default=[], help='KEY=JSON app.config override, repeatable')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--log-level', default='ERROR')
+    args = parser.parse_args(argv)
+    run(args)
+    sys.stdout.flush()
+    # application threads never exit
+    os._exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""In-process stand-in for the Qth cloud connection.
+
+``Broker`` decides per publish whether the link is up (``outages`` schedule), how long the
+acknowledged send takes (``latency_ms``) and whether it fails (``loss``), and records every
+delivered message with its wire size. An event driver thread replays the connection state
+as ``devEvent`` callbacks and can issue cloud-side ``readTsl`` requests.
+"""
+
+import time
+import random
+import threading
+
+
+# devEvent codes as sent by the module SDK
+EVENT_ACCESS = 2
+EVENT_SEND = 4
+EVENT_LOGOUT = 6
+
+# MQTT fixed header (2), topic length (2), packet id (2) of a QoS 1 PUBLISH
+MQTT_PUBLISH_OVERHEAD = 6
+
+
+class Delivery(object):
+    __slots__ = ('topic', 'payload', 'size', 'sent', 'delivered')
+
+    def __init__(self, topic, payload, size, sent, delivered):
+        self.topic = topic
+        self.payload = payload
+        self.size = size
+        self.sent = sent
+        self.delivered = delivered
+
+
+class Broker(object):
+
+    def __init__(self, latency_ms=(20, 80), loss=0.0, outages=(), connect_delay_s=0.5, seed=None):
+        """
+        :param latency_ms: (min, max) of the uniformly drawn time a send blocks for
+        :param loss: probability a send fails while connected
+        :param outages: [(start_s, duration_s)] relative to ``start()``
+        """
+        self.latency_ms = latency_ms
+        self.loss = loss
+        self.outages = sorted(outages)
+        self.connect_delay_s = connect_delay_s
+        self.random = random.Random(seed)
+        self.delivered = []
+        self.send_ms = []  # duration of every send call, failed ones included
+        self.rejected = 0  # sends while disconnected
+        self.failed = 0  # sends lost while connected
+        self.acks = []  # (pkgId, answered after s, value) of readTsl requests
+        self.__lock = threading.Lock()
+        self.__callbacks = {}
+        self.__started = None
+        self.__reads = {}
+        self.__pkg_id = 0
+        self.__stop = threading.Event()
+
+    def bind(self, callbacks):
+        self.__callbacks = callbacks
+
+    def start(self):
+        self.__started = time.monotonic()
+        thread = threading.Thread(target=self.__drive, name='broker-events')
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.__stop.set()
+
+    def elapsed(self):
+        return 0 if self.__started is None else time.monotonic() - self.__started
+
+    def connected(self):
+        if self.__started is None:
+            return False
+        now = self.elapsed()
+        if now < self.connect_delay_s:
+            return False
+        for start, duration in self.outages:
+            if start <= now < start + duration:
+                return False
+        return True
+
+    def publish(self, topic, payload, body):
+        """Blocking acknowledged send of ``body`` (bytes), True once the cloud has it"""
+        started = time.monotonic()
+        if not self.connected():
+            with self.__lock:
+                self.rejected += 1
+                self.send_ms.append(0.0)
+            return False
+        time.sleep(self.random.uniform(*self.latency_ms) / 1000.0)
+        done = time.monotonic()
+        with self.__lock:
+            self.send_ms.append((done - started) * 1000)
+            if self.random.random() < self.loss:
+                self.failed += 1
+                return False
+            size = MQTT_PUBLISH_OVERHEAD + len(topic) + len(body)
+            self.delivered.append(Delivery(topic, payload, size, started, done))
+        return True
+
+    def read_tsl(self, ids, pkg_id=None):
+        """Cloud-side property read, answered through ``ack``"""
+        callback = self.__callbacks.get('readTsl')
+        if callback is None or not self.connected():
+            return
+        if pkg_id is None:
+            self.__pkg_id += 1
+            pkg_id = self.__pkg_id
+        self.__reads[pkg_id] = time.monotonic()
+        callback(list(ids), pkg_id)
+
+    def ack(self, pkg_id, value):
+        asked = self.__reads.pop(pkg_id, None)
+        if asked is not None:
+            self.acks.append((pkg_id, time.monotonic() - asked, value))
+
+    def event(self, event, result):
+        callback = self.__callbacks.get('devEvent')
+        if callback is not None:
+            callback(event, result)
+
+    def __drive(self):
+        state = False
+        while not self.__stop.wait(0.05):
+            up = self.connected()
+            if up != state:
+                state = up
+                if up:
+                    self.event(EVENT_ACCESS, 0)
+                else:
+                    self.event(EVENT_LOGOUT, 0)
@@ -0,0 +1,148 @@
+"""Emulated I2C bus with the SHTC3, LPS22HB and TCS34725 of the sensor hub.
+
+Each device answers its chip-ID probe, reports conversions as complete and returns values
+drifting by a random walk, so the report policy has something to report. The ICM20948 is
+not emulated and NACKs like an unplugged board.
+"""
+
+import random
+import threading
+
+
+def _crc8(data):
+    crc = 0xFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x31) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+    return crc
+
+
+class _Walk(object):
+
+    def __init__(self, value, step, low, high):
+        self.value = value
+        self.step = step
+        self.low = low
+        self.high = high
+
+    def next(self):
+        self.value = min(self.high, max(self.low, self.value + random.uniform(-self.step, self.step)))
+        return self.value
+
+
+class Shtc3(object):
+    address = 0x70
+
+    def __init__(self, drift=1.0):
+        self.temp = _Walk(25.0, 0.5 * drift, -20, 60)
+        self.humi = _Walk(50.0, 1.0 * drift, 0, 100)
+
+    def read(self, addr, size):
+        if addr == b'\xEF\xC8':
+            return bytes([0x08, 0x07])
+        if addr == b'' and size == 6:
+            t = int((self.temp.next() + 45) * 65536 / 175)
+            h = int(self.humi.next() * 65536 / 100)
+            t = [t >> 8, t & 0xFF]
+            h = [h >> 8, h & 0xFF]
+            return bytes(t + [_crc8(t)] + h + [_crc8(h)])
+        return None
+
+    def write(self, addr, data):
+        return True
+
+
+class Lps22hb(object):
+    address = 0x5C
+
+    def __init__(self, drift=1.0):
+        self.press = _Walk(1013.0, 0.5 * drift, 900, 1100)
+        self.temp = _Walk(24.0, 0.5 * drift, -20, 60)
+        self.regs = {}
+
+    def read(self, addr, size):
+        reg = addr[0]
+        if reg == 0x0F:
+            return bytes([0xB1])
+        if reg == 0x11:
+            return bytes([0])  # reset and one-shot complete at once
+        if reg == 0x25:
+            return bytes([0x04])  # pressure interrupt active, every sample is read
+        if reg == 0x27:
+            return bytes([0x03])
+        if reg == 0x28:
+            p = int(self.press.next() * 4096)
+            t = int(self.temp.next() * 100) & 0xFFFF
+            return bytes([p & 0xFF, (p >> 8) & 0xFF, (p >> 16) & 0xFF, t & 0xFF, t >> 8])[:size]
+        return bytes([self.regs.get(reg + i, 0) for i in range(size)])
+
+    def write(self, addr, data):
+        for i, byte in enumerate(data):
+            self.regs[addr[0] + i] = byte
+        return True
+
+
+class Tcs34725(object):
+    address = 0x29
+
+    def __init__(self, drift=1.0):
+        self.channels = [_Walk(v, 400 * drift, 100, 30000) for v in (20000, 9000, 7000, 4000)]
+        self.regs = {}
+
+    def read(self, addr, size):
+        reg = addr[0] & 0x1F
+        if reg == 0x12:
+            return bytes([0x44])
+        if reg == 0x13:
+            return bytes([0x01])
+        if reg == 0x14:
+            data = []
+            for channel in self.channels:
+                value = int(channel.next())
+                data += [value & 0xFF, value >> 8]
+            return bytes(data[:size])
+        return bytes([self.regs.get(reg + i, 0) for i in range(size)])
+
+    def write(self, addr, data):
+        if addr and data:
+            self.regs[addr[0] & 0x1F] = data[0]
+        return True
+
+
+class I2C(object):
+    """machine.I2C replacement, ``devices`` are shared by every instance"""
+    I2C0 = 0
+    I2C1 = 1
+    STANDARD_MODE = 0
+    FAST_MODE = 1
+
+    devices = {}
+    lock = threading.Lock()
+
+    def __init__(self, *args):
+        pass
+
+    @classmethod
+    def attach(cls, *devices):
+        for device in devices:
+            cls.devices[device.address] = device
+
+    def read(self, slave, addr, addr_len, buf, size, delay=0):
+        device = self.devices.get(slave)
+        if device is None:
+            return 1
+        with self.lock:
+            data = device.read(bytes(addr), size)
+        if data is None:
+            return 1
+        for i in range(min(size, len(data))):
+            buf[i] = data[i]
+        return 0
+
+    def write(self, slave, addr, addr_len, data, data_len):
+        device = self.devices.get(slave)
+        if device is None:
+            return 1
+        with self.lock:
+            return 0 if device.write(bytes(addr), bytes(data)) else 1
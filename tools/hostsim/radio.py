@@ -0,0 +1,171 @@
+"""Radio wake-ups per hour on a simulated clock, the former send path vs aligned windows.
+
+    python -m tools.hostsim.radio --hours 1 --config 'TX_WINDOW={"period_s": 60, "edrx_cycle_s": 20.48}'
+    python -m tools.hostsim.radio --check
+
+Producers follow the services' own cadence: sensor uploads checked every second, GNSS every
+3 s, vibration features every 60 s, LBS every 1800 s plus cloud-requested (urgent) refreshes.
+A send wakes the radio unless one happened within the RRC tail (``open_s``) before it. The
+former run is the sender before TX_WINDOW: TSL merged for UPLINK_MAX_LATENCY_MS, any other
+record flushing it and going out at once. The windowed run drives ``usr.libs.txwindow`` with
+the configuration QthClient would use.
+
+``--check`` exits non-zero unless aligned windows wake the radio less often than the former
+sender and every urgent record still goes out on the step it was queued.
+"""
+
+import sys
+import json
+import random
+import argparse
+import tempfile
+
+from . import install
+
+
+STEP_MS = 100
+
+
+def producers(args, rng, hours):
+    """Sorted (ms, kind, urgency name) of every record the services would queue"""
+    end = int(hours * 3600 * 1000)
+    events = []
+    for ms in range(1000, end, 1000):
+        if rng.random() < args.sensor_change:
+            events.append((ms, 'tsl', 'normal'))
+    for ms in range(3000, end, 3000):
+        if rng.random() < args.gnss_move:
+            events.append((ms, 'gnss', 'normal'))
+    if args.vibration:
+        for ms in range(60 * 1000, end, 60 * 1000):
+            events.append((ms, 'tsl', 'background'))
+    for ms in range(0, end, 1800 * 1000):
+        events.append((ms, 'lbs', 'normal'))
+    if args.urgent_period:
+        ms = int(rng.expovariate(1.0 / args.urgent_period) * 1000)
+        while ms < end:
+            events.append((ms, 'lbs', 'urgent'))
+            ms += int(rng.expovariate(1.0 / args.urgent_period) * 1000)
+    events.sort()
+    return events, end
+
+
+def count_wakeups(sends, tail_ms):
+    wakeups = 0
+    awake_until = None
+    for ms in sends:
+        if awake_until is None or ms > awake_until:
+            wakeups += 1
+        awake_until = ms + tail_ms
+    return wakeups
+
+
+def former(events, latency_ms):
+    """Send times of the sender before TX_WINDOW"""
+    sends = []
+    tsl_ms = None  # first TSL field of the merge window
+    for ms, kind, _ in events:
+        if tsl_ms is not None and ms - tsl_ms >= latency_ms:
+            sends.append(tsl_ms + latency_ms)
+            tsl_ms = None
+        if kind == 'tsl':
+            if tsl_ms is None:
+                tsl_ms = ms
+        else:
+            # queued in order behind the pending TSL, both drained at once
+            tsl_ms = None
+            sends.append(ms)
+    if tsl_ms is not None:
+        sends.append(tsl_ms + latency_ms)
+    return sorted(set(sends))
+
+
+def windowed(events, end, tx_config):
+    """Send times and {urgency name: [delay ms]} with ``usr.libs.txwindow``"""
+    from usr.libs.txwindow import TxWindow, TxScheduler, TX_URGENT, TX_NORMAL, TX_BACKGROUND
+    urgencies = {'urgent': TX_URGENT, 'normal': TX_NORMAL, 'background': TX_BACKGROUND}
+    window = TxWindow.from_config(
+        tx_config['period_s'], tx_config.get('offset_s', 0), tx_config.get('open_s', 0),
+        tx_config.get('edrx_cycle_s', 0), tx_config.get('psm_tau_s', 0), now=0
+    )
+    tx = TxScheduler(window, int(tx_config.get('background_hold_s', 0) * 1000))
+    sends = []
+    delays = dict([(name, []) for name in urgencies])
+    waiting = []
+    index = 0
+    for ms in range(0, end + STEP_MS, STEP_MS):
+        while index < len(events) and events[index][0] <= ms:
+            queued, _, urgency = events[index]
+            tx.queued(urgencies[urgency], ms)
+            waiting.append((queued, urgency))
+            index += 1
+        if tx.due(ms):
+            sends.append(ms)
+            for queued, urgency in waiting:
+                delays[urgency].append(ms - queued)
+            waiting = []
+            tx.released()
+    return sends, delays
+
+
+def check(before_wakeups, after_wakeups, delays):
+    """Failed expectations, empty when aligned windows pay off"""
+    failures = []
+    if after_wakeups >= before_wakeups:
+        failures.append('aligned windows wake the radio {} times, not fewer than {} before'.format(
+            after_wakeups, before_wakeups))
+    late = [delay for delay in delays['urgent'] if delay >= STEP_MS]
+    if late:
+        failures.append('{} urgent records held back, up to {:.1f} s'.format(len(late), max(late) / 1000))
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--hours', type=float, default=1)
+    parser.add_argument('--sensor-change', type=float, default=0.3, help='probability a 1 s upload carries a change')
+    parser.add_argument('--gnss-move', type=float, default=0.1, help='probability a 3 s GNSS check moved 50 m')
+    parser.add_argument('--vibration', action='store_true', help='VIBRATION_ENABLE, background features every 60 s')
+    parser.add_argument('--urgent-period', type=float, default=900, help='mean seconds between urgent records, 0 for none')
+    parser.add_argument('--config', action='append', default=[], help='KEY=JSON, TX_WINDOW overrides single keys')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--check', action='store_true', help='exit 1 unless wake-ups drop and urgent records are not delayed')
+    args = parser.parse_args(argv)
+
+    install(tempfile.mkdtemp(prefix='hostsim-'))
+    from usr.extensions.qth_client import TX_WINDOW, UPLINK_MAX_LATENCY_MS
+    tx_config = dict(TX_WINDOW)
+    latency_ms = UPLINK_MAX_LATENCY_MS
+    for item in args.config:
+        key, value = item.split('=', 1)
+        if key == 'TX_WINDOW':
+            tx_config.update(json.loads(value))
+        elif key == 'UPLINK_MAX_LATENCY_MS':
+            latency_ms = json.loads(value)
+        else:
+            parser.error('only TX_WINDOW and UPLINK_MAX_LATENCY_MS are simulated')
+
+    events, end = producers(args, random.Random(args.seed), args.hours)
+    tail_ms = int(tx_config.get('open_s', 0) * 1000)
+    before = former(events, latency_ms)
+    after, delays = windowed(events, end, tx_config)
+    before_wakeups = count_wakeups(before, tail_ms)
+    after_wakeups = count_wakeups(after, tail_ms)
+    print('TX_WINDOW          {}'.format(tx_config))
+    print('records queued     {} over {} h, seed {}'.format(len(events), args.hours, args.seed))
+    print('former sender      {} sends, {:.1f} wake-ups/h'.format(len(before), before_wakeups / args.hours))
+    print('aligned windows    {} sends, {:.1f} wake-ups/h'.format(len(after), after_wakeups / args.hours))
+    for urgency in ('urgent', 'normal', 'background'):
+        values = sorted(delays[urgency])
+        if values:
+            print('{:<18} p50 {:.1f} s, max {:.1f} s added'.format(
+                urgency, values[len(values) // 2] / 1000, values[-1] / 1000))
+    failures = check(before_wakeups, after_wakeups, delays) if args.check else []
+    for failure in failures:
+        print('FAIL               {}'.format(failure))
+    sys.stdout.flush()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""CPython stand-ins for the QuecPython modules the application imports.
+
+Only what ``code/`` actually calls is provided. Device paths under ``/usr`` handed to
+``ql_fs`` are redirected into a host directory.
+"""
+
+import os
+import sys
+import json
+import time
+import types
+import random
+import struct
+import threading
+import traceback
+import _thread
+
+
+TICKS_PERIOD = 1 << 30  # ticks_ms wraps like on the module, exercises ticks_diff/ticks_add
+
+
+def _make_utime(offset_ms=0):
+    utime = types.ModuleType('utime')
+    start = time.monotonic()
+
+    def ticks_ms():
+        return (int((time.monotonic() - start) * 1000) + offset_ms) & (TICKS_PERIOD - 1)
+
+    def ticks_us():
+        return (int((time.monotonic() - start) * 1000000) + offset_ms * 1000) & (TICKS_PERIOD - 1)
+
+    def ticks_add(ticks, delta):
+        return (ticks + delta) & (TICKS_PERIOD - 1)
+
+    def ticks_diff(a, b):
+        diff = (a - b) & (TICKS_PERIOD - 1)
+        return diff - TICKS_PERIOD if diff >= TICKS_PERIOD // 2 else diff
+
+    utime.ticks_ms = ticks_ms
+    utime.ticks_us = ticks_us
+    utime.ticks_add = ticks_add
+    utime.ticks_diff = ticks_diff
+    utime.sleep = time.sleep
+    utime.sleep_ms = lambda ms: time.sleep(ms / 1000.0)
+    utime.sleep_us = lambda us: time.sleep(us / 1000000.0)
+    utime.time = lambda: int(time.time())
+    utime.localtime = time.localtime
+    return utime
+
+
+class _OsTimer(object):
+
+    def __init__(self):
+        self.__timer = None
+
+    def start(self, period_ms, repeat, callback):
+        def fire():
+            callback(None)
+            if repeat:
+                self.start(period_ms, repeat, callback)
+        self.__timer = threading.Timer(period_ms / 1000.0, fire)
+        self.__timer.daemon = True
+        self.__timer.start()
+        return 0
+
+    def stop(self):
+        if self.__timer is not None:
+            self.__timer.cancel()
+        return 0
+
+
+def _make_ql_fs(root):
+
+    def host(path):
+        return os.path.join(root, path.lstrip('/')) if path.startswith('/usr') else path
+
+    def path_exists(path):
+        return os.path.exists(host(path))
+
+    def mkdirs(path):
+        os.makedirs(host(path), exist_ok=True)
+
+    def touch(path, data):
+        path = host(path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        return 0
+
+    def read_json(path):
+        with open(host(path)) as f:
+            return json.load(f)
+
+    ql_fs = types.ModuleType('ql_fs')
+    ql_fs.path_exists = path_exists
+    ql_fs.mkdirs = mkdirs
+    ql_fs.touch = touch
+    ql_fs.read_json = read_json
+    return ql_fs
+
+
+class _ExtInt(object):
+    GPIO29 = 29
+    IRQ_FALLING = 1
+    IRQ_RISING = 0
+    PULL_PU = 1
+    PULL_PD = 2
+    PULL_DISABLE = 0
+
+    # active-low interrupt lines read as asserted, the emulated sensors always "changed"
+    level = 0
+
+    def __init__(self, *args):
+        pass
+
+    def enable(self):
+        return 0
+
+    def disable(self):
+        return 0
+
+    def read_level(self):
+        return self.level
+
+
+def _make_quecgnss(track):
+    quecgnss = types.ModuleType('quecgnss')
+    quecgnss.init = lambda: 0
+    quecgnss.get_state = lambda: 2
+    quecgnss.gnssEnable = lambda flag: 0
+    quecgnss.configSet = lambda *args: 0
+
+    def read(size=4096):
+        data = track.next_nmea()
+        return len(data), data
+
+    quecgnss.read = read
+    return quecgnss
+
+
+class GnssTrack(object):
+    """Straight-line drive emitting one valid $GNRMC per read"""
+
+    def __init__(self, lat=31.8, lng=117.2, step_m=80):
+        self.lat = lat
+        self.lng = lng
+        self.step_deg = step_m / 111000.0
+
+    @staticmethod
+    def _checksum(body):
+        crc = 0
+        for c in body:
+            crc ^= ord(c)
+        return crc
+
+    def next_nmea(self):
+        self.lat += self.step_deg
+        lat_deg = int(self.lat)
+        lng_deg = int(self.lng)
+        body = 'GNRMC,{},A,{:02d}{:09.6f},N,{:03d}{:09.6f},E,30.0,0.0,{},,,A'.format(
+            time.strftime('%H%M%S.00', time.gmtime()),
+            lat_deg, (self.lat - lat_deg) * 60,
+            lng_deg, (self.lng - lng_deg) * 60,
+            time.strftime('%d%m%y', time.gmtime()),
+        )
+        return '${}*{:02X}\r\n'.format(body, self._checksum(body))
+
+
+def _make_net():
+    net = types.ModuleType('net')
+    # (gsm, umts, lte) cell lists, LbsService reads the first LTE cell
+    net.getCellInfo = lambda: ([], [], [(0, 0x1A2B3C, 460, 0, 123, 4567, 0, -85)])
+    net.getState = lambda: ([0, 0, 0, 0, 0, 0], [1, 0, 0, 0, 0, 0])
+    return net
+
+
+def install(code_dir, root, i2c_class, track=None):
+    """Register the host modules in ``sys.modules`` and map package ``usr`` to ``code_dir``.
+    ``root`` receives everything the application writes below ``/usr``."""
+    os.makedirs(root, exist_ok=True)
+    modules = {
+        'utime': _make_utime(),
+        'ujson': json,
+        'uos': os,
+        'ustruct': struct,
+        'uio': __import__('io'),
+        'ql_fs': _make_ql_fs(root),
+        'quecgnss': _make_quecgnss(track or GnssTrack()),
+        'net': _make_net(),
+    }
+    urandom = types.ModuleType('urandom')
+    urandom.randint = random.randint
+    urandom.getrandbits = random.getrandbits
+    urandom.random = random.random
+    modules['urandom'] = urandom
+
+    machine = types.ModuleType('machine')
+    machine.I2C = i2c_class
+    machine.ExtInt = _ExtInt
+    modules['machine'] = machine
+
+    sim = types.ModuleType('sim')
+    sim.getStatus = lambda: 1
+    sim.vsim = types.ModuleType('sim.vsim')
+    sim.vsim.enable = lambda: 0
+    sim.vsim.queryState = lambda: 1
+    modules['sim'] = sim
+    modem = types.ModuleType('modem')
+    modem.getDevFwVersion = lambda: 'HOST'
+    modem.getDevImei = lambda: '000000000000000'
+    modules['modem'] = modem
+    misc = types.ModuleType('misc')
+    misc.Power = type('Power', (object,), {'powerOnReason': staticmethod(lambda: 1)})
+    modules['misc'] = misc
+    modules['dataCall'] = types.ModuleType('dataCall')
+    modules['osTimer'] = _OsTimer
+
+    usr = types.ModuleType('usr')
+    usr.__path__ = [code_dir]
+    modules['usr'] = usr
+    sys.modules.update(modules)
+
+    # MicroPython built-ins the application relies on
+    if not hasattr(sys, 'print_exception'):
+        sys.print_exception = lambda e: traceback.print_exception(type(e), e, e.__traceback__)
+    if not hasattr(_thread, 'threadIsRunning'):
+        _thread.threadIsRunning = lambda ident: True
+    return modules